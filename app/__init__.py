@@ -1,10 +1,23 @@
-from flask import Flask
+from flask import Flask, Request, current_app
+import tempfile
 from .services.db_service import init_db
 from .services.blob_service import init_blob_service
+from .services.search_service import init_search_service
+from .services.suggest_service import init_suggest_service
+from .services.promotion_service import init_promotion_scheduler
+from .services.ingestion_service import init_ingestion_recovery
 from .routes import register_routes
 
+class SpooledRequest(Request):
+    """Request whose uploaded files stay in memory only up to UPLOAD_SPOOL_MAX_MEMORY."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_memory = current_app.config.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024)
+        return tempfile.SpooledTemporaryFile(max_size=max_memory, mode='rb+')
+
 def create_app():
     app = Flask(__name__)
+    app.request_class = SpooledRequest
     
     # Cargar configuración
     app.config.from_object('app.config.Config')
@@ -14,6 +27,13 @@ def create_app():
     try:
         init_db(app)
         print("Base de datos inicializada")
+        init_search_service(app)
+        if app.config.get('SUGGEST_ENABLED', True):
+            init_suggest_service(app)
+        if app.config.get('PROMOTION_SCHEDULER_ENABLED', True):
+            init_promotion_scheduler(app)
+        if app.config.get('INGESTION_RECOVERY_ENABLED', True):
+            init_ingestion_recovery(app)
         # init_blob_service(app)  # Comentado temporalmente
     except Exception as e:
         print(f"Error al inicializar servicios: {str(e)}")
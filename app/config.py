@@ -9,15 +9,89 @@ class Config:
     MONGO_URI = os.environ.get('COSMOS_DB_CONNECTION_STRING')
     MONGO_DB_NAME = os.environ.get('COSMOS_DB_NAME')
     
+    # Pool de conexiones MongoDB (un cliente por proceso worker)
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 120000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    
     # Azure Blob Storage config
     AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
     AZURE_STORAGE_CONTAINER_NAME = os.environ.get('AZURE_STORAGE_CONTAINER_NAME')
     
+    # Subida de PDFs por bloques en paralelo
+    BLOB_UPLOAD_STREAMING = os.environ.get('BLOB_UPLOAD_STREAMING', 'true').lower() == 'true'
+    BLOB_UPLOAD_CHUNK_SIZE = int(os.environ.get('BLOB_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+    BLOB_UPLOAD_MAX_CONCURRENCY = int(os.environ.get('BLOB_UPLOAD_MAX_CONCURRENCY', 4))
+    
+    # Cuerpo de las peticiones: límite total y memoria máxima antes de volcar a disco
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024))
+    UPLOAD_SPOOL_MAX_MEMORY = int(os.environ.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024))
+    
+    # Límites de extracción de texto por PDF
+    PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 50))
+    PDF_MAX_SECONDS = int(os.environ.get('PDF_MAX_SECONDS', 20))
+    PDF_MAX_TEXT_CHARS = int(os.environ.get('PDF_MAX_TEXT_CHARS', 500000))
+    PDF_MAX_PAGE_CHARS = int(os.environ.get('PDF_MAX_PAGE_CHARS', 50000))  # se comprueba durante la maquetación de la página
+    PDF_EARLY_STOP_PAGES = int(os.environ.get('PDF_EARLY_STOP_PAGES', 2))  # páginas seguidas sin platos para dejar de leer (0 = todas)
+    
+    # Procesamiento asíncrono de menús subidos
+    INGESTION_ASYNC = os.environ.get('INGESTION_ASYNC', 'true').lower() == 'true'
+    INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', 2))
+    INGESTION_MAX_ATTEMPTS = int(os.environ.get('INGESTION_MAX_ATTEMPTS', 3))
+    INGESTION_RETRY_DELAY_SECONDS = int(os.environ.get('INGESTION_RETRY_DELAY_SECONDS', 10))
+    INGESTION_HEARTBEAT_SECONDS = int(os.environ.get('INGESTION_HEARTBEAT_SECONDS', 30))  # latido de los trabajos en curso
+    INGESTION_STALE_SECONDS = int(os.environ.get('INGESTION_STALE_SECONDS', 180))  # sin latido más tiempo = proceso caído
+    # Recuperación periódica de trabajos abandonados o con el reintento perdido
+    INGESTION_RECOVERY_ENABLED = os.environ.get('INGESTION_RECOVERY_ENABLED', 'true').lower() == 'true'
+    INGESTION_RECOVERY_SECONDS = int(os.environ.get('INGESTION_RECOVERY_SECONDS', 60))
+    
     # Azure Search config
     AZURE_SEARCH_SERVICE_NAME = os.environ.get('AZURE_SEARCH_SERVICE_NAME')
     AZURE_SEARCH_ADMIN_KEY = os.environ.get('AZURE_SEARCH_ADMIN_KEY')
     AZURE_SEARCH_INDEX_NAME = os.environ.get('AZURE_SEARCH_INDEX_NAME') or 'lacuchara-index'
+    SEARCH_SCHEMA_VERSION = int(os.environ.get('SEARCH_SCHEMA_VERSION', 1))  # versión (1 o 2) de los índices nuevos; se escribe en la del índice existente
+    
+    # Motor de búsqueda: 'azure' (Azure AI Search) o 'local' (índice en memoria)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'azure')
+    LOCAL_SEARCH_INDEX_PATH = os.environ.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl')
+    LOCAL_SEARCH_SAVE_INTERVAL = int(os.environ.get('LOCAL_SEARCH_SAVE_INTERVAL', 30))
+    
+    # Conexiones HTTP compartidas con Azure Search
+    SEARCH_HTTP_POOL_SIZE = int(os.environ.get('SEARCH_HTTP_POOL_SIZE', 20))
+    SEARCH_HTTP_CONNECTION_TIMEOUT = int(os.environ.get('SEARCH_HTTP_CONNECTION_TIMEOUT', 5))
+    SEARCH_HTTP_READ_TIMEOUT = int(os.environ.get('SEARCH_HTTP_READ_TIMEOUT', 30))
+    SEARCH_QUERY_TIMEOUT = float(os.environ.get('SEARCH_QUERY_TIMEOUT', 3.0))  # por consulta en multi_search
+    
+    # Caché de resultados de búsqueda
+    SEARCH_CACHE_MAX_SIZE = int(os.environ.get('SEARCH_CACHE_MAX_SIZE', 1000))
+    SEARCH_CACHE_TTL_SECONDS = int(os.environ.get('SEARCH_CACHE_TTL_SECONDS', 60))
+    
+    # Caché de restaurantes, platos y menús leídos por id
+    ENTITY_CACHE_ENABLED = os.environ.get('ENTITY_CACHE_ENABLED', 'true').lower() == 'true'
+    ENTITY_CACHE_MAX_SIZE = int(os.environ.get('ENTITY_CACHE_MAX_SIZE', 5000))
+    ENTITY_CACHE_TTL_SECONDS = int(os.environ.get('ENTITY_CACHE_TTL_SECONDS', 30))
+    
+    # Indexación en segundo plano por lotes
+    SEARCH_INDEXER_ASYNC = os.environ.get('SEARCH_INDEXER_ASYNC', 'true').lower() == 'true'
+    SEARCH_INDEXER_BATCH_SIZE = int(os.environ.get('SEARCH_INDEXER_BATCH_SIZE', 500))
+    SEARCH_INDEXER_FLUSH_INTERVAL = float(os.environ.get('SEARCH_INDEXER_FLUSH_INTERVAL', 2.0))
+    SEARCH_INDEXER_MAX_RETRIES = int(os.environ.get('SEARCH_INDEXER_MAX_RETRIES', 3))
+    
+    # Autocompletado (trie en memoria por proceso)
+    SUGGEST_ENABLED = os.environ.get('SUGGEST_ENABLED', 'true').lower() == 'true'
+    SUGGEST_REBUILD_SECONDS = int(os.environ.get('SUGGEST_REBUILD_SECONDS', 600))
+    
+    # Activación y expiración periódica de promociones
+    PROMOTION_SCHEDULER_ENABLED = os.environ.get('PROMOTION_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    PROMOTION_SCHEDULER_SECONDS = int(os.environ.get('PROMOTION_SCHEDULER_SECONDS', 60))
+    
+    # Reindexado completo desde MongoDB (python -m app.services.reindex_service)
+    REINDEX_BATCH_SIZE = int(os.environ.get('REINDEX_BATCH_SIZE', 1000))
+    REINDEX_WORKERS = int(os.environ.get('REINDEX_WORKERS', 4))
+    REINDEX_CHECKPOINT_PATH = os.environ.get('REINDEX_CHECKPOINT_PATH', 'instance/reindex_checkpoint.json')
     
     # Application config
     MENUS_PER_PAGE = 10
-    DEFAULT_SEARCH_RADIUS_KM = 5
\ No newline at end of file
+    DEFAULT_SEARCH_RADIUS_KM = 5
+    MAX_SEARCH_RADIUS_KM = 50
\ No newline at end of file
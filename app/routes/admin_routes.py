@@ -1,31 +1,61 @@
 from flask import Blueprint, request, jsonify
 from app.services.db_service import (
-    get_restaurants, 
+    get_restaurants_page,
+    get_restaurant,
     update_restaurant,
     delete_restaurant,
-    get_restaurant_dishes,
+    get_restaurant_dishes_page,
+    get_restaurant_menus_page,
+    get_dish,
     update_dish,
     delete_dish,
-    deactivate_expired_promotions
+    reconcile_rating_aggregates,
+    get_entity_cache_stats
 )
 from app.services.search_service import (
     index_restaurant,
     index_dish,
-    delete_document
+    delete_document,
+    get_indexer_stats,
+    get_query_cache_stats
 )
+from app.services.blob_service import backfill_menu_catalog
+from app.services.suggest_service import get_suggest_stats
+from app.services.promotion_service import run_promotion_schedule
 from datetime import datetime
+import json
 
 admin_bp = Blueprint('admin', __name__)
 
+def _filters_arg():
+    """Mongo filters passed as JSON in the 'filters' query parameter."""
+    filters = request.args.get('filters')
+    if not filters:
+        return {}
+    filters = json.loads(filters)
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be a JSON object")
+    return filters
+
+def _page_response(page):
+    """JSON listing page: items with string ids and the cursor of the next page."""
+    items = [dict(item, _id=str(item["_id"])) for item in page["items"]]
+    return jsonify({"items": items, "next_cursor": page["next_cursor"]})
+
 @admin_bp.route('/admin/restaurants', methods=['GET'])
 def list_restaurants():
-    filters = request.args.get('filters', {})
-    sort = request.args.get('sort')
-    limit = int(request.args.get('limit', 20))
-    skip = int(request.args.get('skip', 0))
-    
-    restaurants = get_restaurants(filters, sort, limit, skip)
-    return jsonify(restaurants)
+    # Paginación por cursor: 'cursor' es el next_cursor de la página anterior
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        page = get_restaurants_page(
+            _filters_arg(),
+            request.args.get('sort', 'name'),
+            limit,
+            request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(page)
 
 @admin_bp.route('/admin/restaurants/<restaurant_id>', methods=['PUT'])
 def update_restaurant_status(restaurant_id):
@@ -36,7 +66,7 @@ def update_restaurant_status(restaurant_id):
     
     if success:
         # Reindexar en Azure Search
-        restaurant_data = get_restaurants({"_id": restaurant_id})[0]
+        restaurant_data = get_restaurant(restaurant_id, fresh=True)
         index_restaurant(restaurant_data)
         
         return jsonify({"message": "Restaurante actualizado exitosamente"})
@@ -54,9 +84,33 @@ def remove_restaurant(restaurant_id):
 
 @admin_bp.route('/admin/restaurants/<restaurant_id>/dishes', methods=['GET'])
 def list_restaurant_dishes(restaurant_id):
-    filters = request.args.get('filters', {})
-    dishes = get_restaurant_dishes(restaurant_id, filters)
-    return jsonify(dishes)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
+        page = get_restaurant_dishes_page(
+            restaurant_id,
+            _filters_arg(),
+            request.args.get('sort', 'name'),
+            limit,
+            request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(page)
+
+@admin_bp.route('/admin/restaurants/<restaurant_id>/menus', methods=['GET'])
+def list_restaurant_menus(restaurant_id):
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        page = get_restaurant_menus_page(
+            restaurant_id,
+            request.args.get('menu_type'),
+            request.args.get('sort', 'date'),
+            limit,
+            request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(page)
 
 @admin_bp.route('/admin/dishes/<dish_id>', methods=['PUT'])
 def update_dish_status(dish_id):
@@ -67,8 +121,8 @@ def update_dish_status(dish_id):
     
     if success:
         # Reindexar en Azure Search
-        dish_data = get_restaurant_dishes({"_id": dish_id})[0]
-        index_dish(dish_data)
+        dish_data = get_dish(dish_id, fresh=True)
+        index_dish(dish_data, get_restaurant(dish_data["restaurant_id"], fresh=True))
         
         return jsonify({"message": "Plato actualizado exitosamente"})
     return jsonify({"error": "Error al actualizar el plato"}), 400
@@ -85,8 +139,36 @@ def remove_dish(dish_id):
 
 @admin_bp.route('/admin/promotions/cleanup', methods=['POST'])
 def cleanup_expired_promotions():
-    count = deactivate_expired_promotions()
+    # El planificador lo hace cada PROMOTION_SCHEDULER_SECONDS; esto fuerza una pasada
+    result = run_promotion_schedule()
     return jsonify({
-        "message": f"Se desactivaron {count} promociones expiradas",
-        "deactivated_count": count
+        "message": f"Se desactivaron {result['deactivated']} promociones expiradas",
+        "deactivated_count": result["deactivated"],
+        "activated_count": result["activated"],
+        "dishes_updated": result["dishes_updated"]
     })
+
+@admin_bp.route('/admin/ratings/reconcile', methods=['POST'])
+def reconcile_ratings():
+    report = reconcile_rating_aggregates()
+    return jsonify(report)
+
+@admin_bp.route('/admin/menu-catalog/backfill', methods=['POST'])
+def backfill_catalog():
+    return jsonify({"registered": backfill_menu_catalog()})
+
+@admin_bp.route('/admin/stats/search-indexer', methods=['GET'])
+def search_indexer_stats():
+    return jsonify(get_indexer_stats())
+
+@admin_bp.route('/admin/stats/search-cache', methods=['GET'])
+def search_cache_stats():
+    return jsonify(get_query_cache_stats())
+
+@admin_bp.route('/admin/stats/suggest', methods=['GET'])
+def suggest_stats():
+    return jsonify(get_suggest_stats())
+
+@admin_bp.route('/admin/stats/entity-cache', methods=['GET'])
+def entity_cache_stats():
+    return jsonify(get_entity_cache_stats())
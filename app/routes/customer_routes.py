@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, render_template
-from app.services.db_service import get_db
-from app.services.search_service import search_restaurants_and_dishes
-from app.services.blob_service import list_pdf_files
+from app.services.db_service import (
+    get_db, get_menu_catalog_page, count_menu_catalog, find_restaurants_near, nearby_filters
+)
+from app.services.search_service import search_all, build_facet_filter, SEARCH_TYPES
+from app.services.async_search_service import multi_search, section_query
+from app.services.suggest_service import suggest as get_suggestions
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -9,34 +12,109 @@ customer_bp = Blueprint('customer', __name__)
 @customer_bp.route('/index')
 def index():
     """Página de inicio del cliente."""
-    # Obtener la lista de archivos PDF de los restaurantes
-    restaurant_pdfs = list_pdf_files()
-    
-    # Paginación
-    page = request.args.get('page', 1, type=int)
     per_page = 9
-    total = len(restaurant_pdfs)  # Asegúrate de que total esté definido
-    start = (page - 1) * per_page
-    end = start + per_page
-    pdf_files_paginated = restaurant_pdfs[start:end]
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = request.args.get('after')
+    before = request.args.get('before')
     
-    # Extraer nombres de restaurantes sin carpeta ni ".pdf"
-    all_restaurants_paginated = [pdf.split('/')[-1].rsplit('.', 1)[0] for pdf in pdf_files_paginated]
+    # Una sola consulta indexada: con cursor (anterior/siguiente) no hay skip;
+    # solo los saltos directos a un número de página usan offset.
+    catalog_page = get_menu_catalog_page(
+        per_page=per_page,
+        after=after,
+        before=before,
+        skip=0 if (after or before) else (page - 1) * per_page
+    )
+    total = count_menu_catalog()
+    total_pages = max((total + per_page - 1) // per_page, 1)
     
     return render_template(
         'index.html',
-        restaurant_pdfs=pdf_files_paginated, 
-        total=total, 
-        page=page, 
-        per_page=per_page, 
-        all_restaurants=all_restaurants_paginated  # Lista paginada
+        menus=catalog_page["entries"],
+        total=total,
+        page=page,
+        per_page=per_page,
+        total_pages=total_pages,
+        page_window=_page_window(page, total_pages),
+        next_cursor=catalog_page["next_cursor"],
+        prev_cursor=catalog_page["prev_cursor"]
     )
 
+def _page_window(page, total_pages, radius=2):
+    """Page numbers shown around the current page in the paginator."""
+    first = max(page - radius, 1)
+    last = min(page + radius, total_pages)
+    return list(range(first, last + 1))
+
 @customer_bp.route('/search')
 def search():
     query = request.args.get('q', '')
-    results = search_restaurants_and_dishes(query) if query else []
-    return render_template('search.html', query=query, results=results)
+    promoted = request.args.get('promoted')
+    selected = {
+        "cuisine_types": request.args.getlist('cuisine'),
+        "restrictions": request.args.getlist('restriction'),
+        "menu_type": request.args.get('menu_type'),
+        "is_promoted": None if promoted is None else promoted == 'true',
+        "price_min": request.args.get('price_min', type=float),
+        "price_max": request.args.get('price_max', type=float),
+    }
+    
+    # Una sola consulta devuelve resultados de todos los tipos y las facetas
+    search = None
+    if query:
+        try:
+            search = search_all(query, filters=build_facet_filter(**selected))
+        except Exception as e:
+            print(f"Error en la búsqueda: {str(e)}")
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(search or {})
+    return render_template('search.html', query=query, search=search, selected=selected)
+
+@customer_bp.route('/api/restaurants/near')
+def restaurants_near():
+    """Restaurantes cercanos a una posición, del más cercano al más lejano."""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat y lon son obligatorios"}), 400
+    
+    filters = nearby_filters(
+        cuisine_types=request.args.getlist('cuisine'),
+        max_price=request.args.get('max_price', type=int),
+        min_rating=request.args.get('min_rating', type=float)
+    )
+    try:
+        page = find_restaurants_near(
+            lat,
+            lon,
+            radius_km=request.args.get('radius_km', type=float),
+            filters=filters,
+            limit=max(1, min(request.args.get('limit', 20, type=int), 100)),
+            after=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    items = [dict(item, _id=str(item["_id"])) for item in page["items"]]
+    return jsonify({"items": items, "next_cursor": page["next_cursor"]})
+
+@customer_bp.route('/api/search')
+def search_sections():
+    """Una sección por tipo, cada una con su propia consulta, lanzadas en paralelo."""
+    query = request.args.get('q', '*')
+    top = min(request.args.get('top', 10, type=int), 50)
+    sections = [s for s in request.args.getlist('section') if s in SEARCH_TYPES] or list(SEARCH_TYPES)
+    queries = {doc_type: section_query(doc_type, query, top=top) for doc_type in sections}
+    return jsonify(multi_search(queries))
+
+@customer_bp.route('/search/suggest')
+def suggest():
+    """Autocompletado: sugerencias en memoria, sin consultar el buscador."""
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 10)
+    kinds = request.args.getlist('type') or None
+    return jsonify({"query": prefix, "suggestions": get_suggestions(prefix, limit, kinds)})
 
 @customer_bp.route('/restaurant/<restaurant_id>')
 def restaurant_profile(restaurant_id):
@@ -2,10 +2,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app.services.db_service import (
     get_restaurant, get_restaurants, create_restaurant, update_restaurant,
     get_restaurant_menus, create_menu, get_restaurant_dishes, create_dish,
-    get_active_promotions
+    get_active_promotions, get_ingestion_job, count_menu_catalog
 )
-from app.services.blob_service import upload_pdf, list_pdf_files
-from app.services.pdf_service import extract_menu_from_pdf
+from app.services.blob_service import upload_pdf, list_pdf_files, compute_content_hash
+from app.services.ingestion_service import enqueue_menu_ingestion
 from app.services.search_service import index_restaurant, index_menu, index_dish
 from datetime import datetime
 from bson.objectid import ObjectId
@@ -16,16 +16,11 @@ restaurant_bp = Blueprint('restaurant', __name__, url_prefix='/restaurant')
 @restaurant_bp.route('/')
 def index():
     """Restaurant dashboard landing page."""
-    # Obtener la lista de archivos PDF de los restaurantes
-    restaurant_pdfs = list_pdf_files()
-    
-    # Paginación
-    page = request.args.get('page', 1, type=int)
+    # Paginación: solo se leen del catálogo los archivos PDF de la página
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10
-    total = len(restaurant_pdfs)
-    start = (page - 1) * per_page
-    end = start + per_page
-    pdf_files_paginated = restaurant_pdfs[start:end]
+    total = count_menu_catalog()
+    pdf_files_paginated = list_pdf_files(skip=(page - 1) * per_page, limit=per_page)
     
     return render_template('restaurant/dashboard.html', restaurant_pdfs=pdf_files_paginated, total=total, page=page, per_page=per_page)
 
@@ -86,12 +81,14 @@ def profile():
             
             flash('Restaurante registrado con éxito', 'success')
         
-        return redirect(url_for('restaurant.profile', id=restaurant_id))
+        # 'updated' hace que la vista lea el perfil recién guardado aunque la
+        # atienda otro worker con el restaurante aún en su caché
+        return redirect(url_for('restaurant.profile', id=restaurant_id, updated=1))
     
     # GET request - show form
     restaurant = None
     if restaurant_id:
-        restaurant = get_restaurant(restaurant_id)
+        restaurant = get_restaurant(restaurant_id, fresh=request.args.get('updated') == '1')
     
     return render_template('restaurant/profile.html', restaurant=restaurant)
 
@@ -128,67 +125,52 @@ def upload_menu():
                 if not menu_date:
                     menu_date = datetime.now().strftime('%Y-%m-%d')
             
-            # Process the PDF to extract menu items
-            try:
-                extracted_menu = extract_menu_from_pdf(file)
-            except Exception as e:
-                current_app.logger.error(f"Error extracting menu: {str(e)}")
-                extracted_menu = {"dishes": [], "menu_restrictions": []}
+            # El hash identifica subidas repetidas del mismo PDF
+            content_hash = compute_content_hash(file)
             
             # Upload the file to Azure Blob Storage
-            pdf_url = upload_pdf(file, restaurant_id, menu_date)
-            
-            # Create menu in database
-            menu_data = {
-                "restaurant_id": restaurant_id,
-                "menu_type": menu_type,
-                "date": menu_date,
-                "pdf_url": pdf_url,
-                "menu_restrictions": extracted_menu.get("menu_restrictions", []),
-                "price": float(request.form.get('price')) if request.form.get('price') else None
-            }
-            
-            menu_id = create_menu(menu_data)
-            
-            # Create dishes from extracted menu
-            dish_ids = []
-            restaurant_data = get_restaurant(restaurant_id)
+            pdf_url = upload_pdf(file, restaurant_id, menu_date, content_hash=content_hash)
             
-            for dish_info in extracted_menu.get("dishes", []):
-                dish_data = {
-                    "restaurant_id": restaurant_id,
-                    "name": dish_info.get("name"),
-                    "description": "",
-                    "price": dish_info.get("price"),
-                    "category": dish_info.get("category"),
-                    "restrictions": extracted_menu.get("menu_restrictions", []),
-                    "is_promoted": False,
-                    "promotion_level": 0
-                }
-                
-                dish_id = create_dish(dish_data)
-                dish_ids.append(dish_id)
-                
-                # Index dish in search
-                dish_data['_id'] = ObjectId(dish_id)
-                index_dish(dish_data, restaurant_data)
+            # La extracción, los platos y la indexación se hacen en segundo plano
+            job_id = enqueue_menu_ingestion(
+                restaurant_id,
+                pdf_url,
+                content_hash,
+                menu_type=menu_type,
+                menu_date=menu_date,
+                price=float(request.form.get('price')) if request.form.get('price') else None
+            )
             
-            # Update menu with dish IDs
-            update_menu = {
-                "dishes": dish_ids
-            }
-            update_restaurant_menu(menu_id, update_menu)
-            
-            # Index menu in search
-            menu_data['_id'] = ObjectId(menu_id)
-            index_menu(menu_data, restaurant_data)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({
+                    "job_id": job_id,
+                    "status_url": url_for('restaurant.menu_job_status', job_id=job_id)
+                }), 202
             
-            flash('Menú subido con éxito', 'success')
+            flash('Menú subido con éxito, se está procesando', 'success')
             return redirect(url_for('restaurant.menus', id=restaurant_id))
     
     restaurant = get_restaurant(restaurant_id)
     return render_template('restaurant/upload_menu.html', restaurant=restaurant)
 
+@restaurant_bp.route('/menu/jobs/<job_id>')
+def menu_job_status(job_id):
+    """Status of a menu ingestion job."""
+    job = get_ingestion_job(job_id)
+    
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    return jsonify({
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job.get("error"),
+        "result": job.get("result"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    })
+
 @restaurant_bp.route('/menus')
 def menus():
     """List all menus for a restaurant."""
@@ -232,7 +214,7 @@ def dishes():
         
         # Index in search
         dish_data['_id'] = ObjectId(dish_id)
-        restaurant_data = get_restaurant(restaurant_id)
+        restaurant_data = get_restaurant(restaurant_id, fresh=True)
         index_dish(dish_data, restaurant_data)
         
         flash('Plato creado con éxito', 'success')
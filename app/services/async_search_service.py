@@ -0,0 +1,216 @@
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from flask import current_app
+import aiohttp
+import asyncio
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+
+from app.services.search_service import (
+    _use_local_backend, _execute_search, validate_select, get_query_cache, normalize_query, LIST_VIEW_FIELDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Bucle de eventos por proceso en un hilo propio: la sesión HTTP y los
+# clientes asíncronos viven en él y las rutas (síncronas) le envían consultas.
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_session = None
+_clients = {}
+
+def _get_loop():
+    """Return this process' search event loop, starting its thread if needed."""
+    global _loop, _loop_pid, _session, _clients
+    pid = os.getpid()
+    if _loop is not None and _loop_pid == pid:
+        return _loop
+    
+    with _loop_lock:
+        if _loop is None or _loop_pid != pid:
+            # Tras un fork el hilo del bucle no existe en el hijo: empezamos de cero
+            _loop = asyncio.new_event_loop()
+            _loop_pid = pid
+            _session = None
+            _clients = {}
+            threading.Thread(target=_loop.run_forever, name="search-aio", daemon=True).start()
+    return _loop
+
+async def _get_client(config, index_name=None):
+    """Return the async client for an index; all clients share one aiohttp session."""
+    global _session
+    index_name = index_name or config['AZURE_SEARCH_INDEX_NAME']
+    client = _clients.get(index_name)
+    if client is None:
+        if _session is None:
+            _session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=config.get('SEARCH_HTTP_POOL_SIZE', 20)),
+                timeout=aiohttp.ClientTimeout(
+                    connect=config.get('SEARCH_HTTP_CONNECTION_TIMEOUT', 5),
+                    total=config.get('SEARCH_HTTP_READ_TIMEOUT', 30)
+                )
+            )
+        client = AsyncSearchClient(
+            endpoint=f"https://{config['AZURE_SEARCH_SERVICE_NAME']}.search.windows.net",
+            index_name=index_name,
+            credential=AzureKeyCredential(config['AZURE_SEARCH_ADMIN_KEY']),
+            transport=AioHttpTransport(session=_session, session_owner=False)
+        )
+        _clients[index_name] = client
+    return client
+
+async def search_async(config, search_text="*", filter=None, order_by=None, top=50, skip=0,
+                       include_total_count=False, select=None, facets=None):
+    """
+    Run one query with the asyncio client.
+    
+    Args:
+        config: Application config (routes pass current_app.config)
+        (the rest as in search_service._execute_search)
+    
+    Returns:
+        A dictionary with results, total and facets
+    """
+    client = await _get_client(config)
+    results = await client.search(
+        search_text=search_text,
+        filter=filter,
+        order_by=order_by,
+        top=top,
+        skip=skip,
+        include_total_count=include_total_count,
+        select=select,
+        facets=facets
+    )
+    documents = [document async for document in results]
+    return {
+        "results": documents,
+        "total": await results.get_count() if include_total_count else None,
+        "facets": await results.get_facets() if facets else None
+    }
+
+async def multi_search_async(config, queries, timeout=None):
+    """
+    Run several queries concurrently, each with its own timeout.
+    
+    Args:
+        config: Application config
+        queries: Dictionary name -> query keyword arguments (see search_async)
+        timeout: Seconds each query may take
+    
+    Returns:
+        Dictionary name -> result, or {"error": ...} for queries that failed or timed out
+    """
+    async def run(query):
+        try:
+            return await asyncio.wait_for(search_async(config, **query), timeout)
+        except asyncio.TimeoutError:
+            return {"error": "timeout"}
+        except Exception as e:
+            logger.error(f"Error in search query: {str(e)}")
+            return {"error": str(e)}
+    
+    names = list(queries)
+    results = await asyncio.gather(*(run(queries[name]) for name in names))
+    return dict(zip(names, results))
+
+def _query_cache_key(query):
+    """Cache key of a multi_search query: the normalized text and the other arguments."""
+    query = dict(query)
+    text = normalize_query(query.pop("search_text", "*"))
+    return ("query", text, json.dumps(query, sort_keys=True, default=str))
+
+def _run_queries(config, queries, timeout):
+    if _use_local_backend():
+        # El motor local responde en memoria: no hay latencia que solapar
+        results = {}
+        for name, query in queries.items():
+            query = dict(query)
+            documents, total, facets = _execute_search(query.pop("search_text", "*"), **query)
+            results[name] = {"results": documents, "total": total, "facets": facets}
+        return results
+    
+    future = asyncio.run_coroutine_threadsafe(
+        multi_search_async(config, queries, timeout), _get_loop()
+    )
+    return future.result(timeout + 1)
+
+def multi_search(queries, timeout=None):
+    """
+    Synchronous facade for the routes: run the queries concurrently and wait.
+    
+    The page costs the slowest query instead of the sum of all of them.
+    Results go through the search result cache (see search_service.get_query_cache):
+    only the queries missing from it are sent, and failed ones are not cached.
+    
+    Args:
+        queries: Dictionary name -> query keyword arguments (see section_query)
+        timeout: Seconds each query may take (default: SEARCH_QUERY_TIMEOUT)
+    
+    Returns:
+        Dictionary name -> {"results", "total", "facets"} or {"error": ...}
+    """
+    config = current_app.config
+    timeout = timeout or config.get('SEARCH_QUERY_TIMEOUT', 3.0)
+    keys = {name: _query_cache_key(query) for name, query in queries.items()}
+    fetched = {}
+    
+    def load(missing):
+        pending = {name: query for name, query in queries.items() if keys[name] in missing}
+        fetched.update(_run_queries(config, pending, timeout))
+        return {keys[name]: result for name, result in fetched.items() if "error" not in result}
+    
+    cached = get_query_cache().get_many_or_load(list(keys.values()), load)
+    # Como en search_all: el llamador puede modificar el resultado
+    return {
+        name: copy.deepcopy(cached[keys[name]]) if keys[name] in cached else fetched[name]
+        for name in queries
+    }
+
+def section_query(doc_type, query_text="*", filters=None, sort=None, top=10, skip=0, select=None):
+    """
+    Query arguments for one type, as search_restaurants/search_dishes/search_menus build them.
+    
+    Returns:
+        Keyword arguments for multi_search
+    """
+    if filters:
+        filters = f"type eq '{doc_type}' and ({filters})"
+    else:
+        filters = f"type eq '{doc_type}'"
+    return {
+        "search_text": query_text,
+        "filter": filters,
+        "order_by": sort,
+        "top": top,
+        "skip": skip,
+        "include_total_count": True,
+        "select": validate_select(select or LIST_VIEW_FIELDS[doc_type])
+    }
+
+async def _close():
+    global _session
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+def close_async_search():
+    """Close the async clients and their session (registered with atexit)."""
+    if _loop is None or _loop_pid != os.getpid() or not _loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close(), _loop).result(5)
+    except Exception as e:
+        logger.error(f"Error closing async search clients: {str(e)}")
+    _loop.call_soon_threadsafe(_loop.stop)
+
+atexit.register(close_async_search)
@@ -1,13 +1,26 @@
 from azure.storage.blob import BlobServiceClient, ContentSettings
-from flask import current_app, g
-import uuid
+from flask import Flask, current_app, g
+from app.services.db_service import (
+    add_menu_catalog_entry, remove_menu_catalog_entry, get_menu_catalog_entry, count_pdf_references,
+    get_menu_catalog_blob_names
+)
+import argparse
+import hashlib
+import tempfile
+import time
 import os
 
 def get_blob_service():
     """Return a handle to the Azure Blob Storage service."""
     if 'blob_service' not in g:
         conn_str = current_app.config['AZURE_STORAGE_CONNECTION_STRING']
-        g.blob_service = BlobServiceClient.from_connection_string(conn_str)
+        chunk_size = current_app.config.get('BLOB_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024)
+        # Por encima de max_single_put_size el SDK sube el fichero en bloques
+        g.blob_service = BlobServiceClient.from_connection_string(
+            conn_str,
+            max_block_size=chunk_size,
+            max_single_put_size=chunk_size
+        )
     return g.blob_service
 
 def close_blob_service(e=None):
@@ -31,49 +44,143 @@ def init_blob_service(app):
         
         app.teardown_appcontext(close_blob_service)
 
-def upload_pdf(file_data, restaurant_id, menu_date=None):
+def compute_content_hash(file_data, chunk_size=1024 * 1024):
     """
-    Upload a PDF file to Azure Blob Storage.
+    Return the SHA-256 hex digest of a file-like object.
+    
+    The file is read in chunks and rewound afterwards so it can be reused.
+    """
+    stream = getattr(file_data, 'stream', file_data)
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def upload_pdf(file_data, restaurant_id, menu_date=None, display_name=None, content_hash=None):
+    """
+    Upload a PDF file to Azure Blob Storage and register it in the menu catalog.
+    
+    Blobs are named after the content hash, so uploading the same bytes again
+    for a restaurant reuses the existing blob instead of storing a copy.
     
     Args:
         file_data: The file data to upload
         restaurant_id: The ID of the restaurant
-        menu_date: Optional date string for daily menus
+        menu_date: Optional date string for daily menus (stored as blob metadata)
+        display_name: Optional name shown on the home page (defaults to the blob name)
+        content_hash: Optional precomputed SHA-256 of the file
     
     Returns:
         The URL of the uploaded file
     """
+    content_hash = content_hash or compute_content_hash(file_data)
+    blob_name = f"{restaurant_id}_{content_hash}.pdf"
+    
+    existing = get_menu_catalog_entry(blob_name)
+    if existing:
+        # Mismo contenido: solo refrescamos la entrada del catálogo
+        add_menu_catalog_entry(blob_name, existing["pdf_url"], restaurant_id,
+                               display_name or existing.get("display_name"))
+        return existing["pdf_url"]
+    
     blob_service = get_blob_service()
     container_name = current_app.config['AZURE_STORAGE_CONTAINER_NAME']
     container_client = blob_service.get_container_client(container_name)
     
-    # Generate a unique blob name
-    date_part = f"_{menu_date}" if menu_date else ""
-    blob_name = f"{restaurant_id}{date_part}_{uuid.uuid4()}.pdf"
-    
     # Upload the file
     blob_client = container_client.get_blob_client(blob_name)
+    metadata = {"content_sha256": content_hash}
+    if menu_date:
+        metadata["menu_date"] = menu_date
+    _upload_stream(blob_client, file_data, metadata)
+    
+    add_menu_catalog_entry(blob_name, blob_client.url, restaurant_id, display_name)
+    
+    # Return the URL
+    return blob_client.url
+
+def _upload_stream(blob_client, file_data, metadata=None):
+    """
+    Upload a (possibly spooled) file object without reading it into memory.
+    
+    In streaming mode the blob is staged in BLOB_UPLOAD_CHUNK_SIZE blocks,
+    BLOB_UPLOAD_MAX_CONCURRENCY at a time, straight from the stream.
+    """
+    stream = getattr(file_data, 'stream', file_data)
     content_settings = ContentSettings(content_type='application/pdf')
+    upload_kwargs = {}
+    
+    # Otros lectores (p. ej. la extracción del PDF) pueden haber movido el cursor
+    length = None
+    if hasattr(stream, 'seek'):
+        stream.seek(0, os.SEEK_END)
+        length = stream.tell()
+        stream.seek(0)
+    
+    if current_app.config.get('BLOB_UPLOAD_STREAMING', True):
+        upload_kwargs['max_concurrency'] = current_app.config.get('BLOB_UPLOAD_MAX_CONCURRENCY', 4)
     
+    start = time.perf_counter()
     blob_client.upload_blob(
-        file_data,
+        stream,
+        length=length,
         content_settings=content_settings,
-        overwrite=True
+        metadata=metadata,
+        overwrite=True,
+        **upload_kwargs
     )
+    elapsed = time.perf_counter() - start
     
-    # Return the URL
-    return blob_client.url
+    if length:
+        current_app.logger.info(
+            f"Uploaded {blob_client.blob_name}: {length} bytes in {elapsed:.2f}s "
+            f"({length / max(elapsed, 1e-6) / 1024:.0f} KiB/s)"
+        )
+
+def open_pdf(blob_url):
+    """
+    Download a PDF from Azure Blob Storage into a spooled temporary file.
+    
+    Args:
+        blob_url: The URL of the blob to download
+    
+    Returns:
+        A file-like object positioned at the start of the PDF
+    """
+    blob_service = get_blob_service()
+    container_name = current_app.config['AZURE_STORAGE_CONTAINER_NAME']
+    container_client = blob_service.get_container_client(container_name)
+    
+    blob_name = blob_url.split('/')[-1]
+    blob_client = container_client.get_blob_client(blob_name)
+    
+    max_memory = current_app.config.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024)
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+    blob_client.download_blob(
+        max_concurrency=current_app.config.get('BLOB_UPLOAD_MAX_CONCURRENCY', 4)
+    ).readinto(pdf_file)
+    pdf_file.seek(0)
+    return pdf_file
 
 def delete_pdf(blob_url):
     """
     Delete a PDF file from Azure Blob Storage.
     
+    Identical uploads share one blob (see upload_pdf): the blob and its
+    catalog entry are kept while an active menu or a pending ingestion job
+    still uses them, so delete (deactivate) the menu first.
+    
     Args:
         blob_url: The URL of the blob to delete
     
     Returns:
-        Boolean indicating success
+        True if the blob was deleted, False if it is still in use
     """
+    if count_pdf_references(blob_url):
+        return False
+    
     blob_service = get_blob_service()
     container_name = current_app.config['AZURE_STORAGE_CONTAINER_NAME']
     container_client = blob_service.get_container_client(container_name)
@@ -84,22 +191,64 @@ def delete_pdf(blob_url):
     # Delete the blob
     blob_client = container_client.get_blob_client(blob_name)
     blob_client.delete_blob()
+    remove_menu_catalog_entry(blob_name)
     
     return True
 
-def list_pdf_files():
-    """List all PDF files in the Azure Blob Storage container."""
-    blob_service = get_blob_service()
-    container_name = current_app.config['AZURE_STORAGE_CONTAINER_NAME']
-    container_client = blob_service.get_container_client(container_name)
+def list_pdf_files(skip=0, limit=None):
+    """
+    List the PDF files of the menu catalog, by blob name.
+    
+    Reads the ``menu_catalog`` collection (kept up to date by upload_pdf and
+    delete_pdf) instead of enumerating the container.
     
-    pdf_files = []
+    Args:
+        skip: Number of files to skip
+        limit: Maximum number of files (None for all)
+    """
     try:
-        blobs = container_client.list_blobs()
-        for blob in blobs:
-            if blob.name.endswith('.pdf'):
-                pdf_files.append(blob.name)
+        return get_menu_catalog_blob_names(skip=skip, limit=limit)
     except Exception as e:
         current_app.logger.error(f"Error listing PDF files: {str(e)}")
+        return []
+
+def backfill_menu_catalog():
+    """
+    Register every PDF already in the container in the menu catalog.
+    
+    Only needed once for blobs uploaded before the catalog existed (run
+    ``python -m app.services.blob_service --backfill`` when deploying). Safe
+    to run again: entries already in the catalog are left untouched.
+    
+    Returns:
+        The number of blobs registered
+    """
+    blob_service = get_blob_service()
+    container_name = current_app.config['AZURE_STORAGE_CONTAINER_NAME']
+    container_client = blob_service.get_container_client(container_name)
+    
+    count = 0
+    for blob in container_client.list_blobs():
+        if not blob.name.endswith('.pdf'):
+            continue
+        blob_client = container_client.get_blob_client(blob.name)
+        restaurant_id = blob.name.split('/')[-1].split('_', 1)[0]
+        uploaded_at = blob.creation_time.replace(tzinfo=None) if blob.creation_time else None
+        add_menu_catalog_entry(blob.name, blob_client.url, restaurant_id, uploaded_at=uploaded_at,
+                               overwrite=False)
+        count += 1
     
-    return pdf_files
\ No newline at end of file
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blob storage maintenance")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Register the PDFs already in the container in the menu catalog")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (use --backfill)")
+    
+    app = Flask('app')
+    app.config.from_object('app.config.Config')
+    with app.app_context():
+        print(f"{backfill_menu_catalog()} PDFs registered in the menu catalog")
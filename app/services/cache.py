@@ -0,0 +1,186 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+def approximate_size(value):
+    """Approximate memory (bytes) of a document made of dicts, lists and scalars."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+    
+    Keeps hit/miss counters and, for lookups going through ``get_or_load``,
+    the time spent loading misses so the latency saved by hits can be estimated.
+    
+    A value loaded by ``get_or_load`` or ``get_many_or_load`` is not stored
+    if the key was deleted (or the cache cleared) while the loader ran: it
+    may have been read before the write that caused the invalidation.
+    
+    Args:
+        max_size: Maximum number of entries (least recently used are evicted)
+        ttl: Seconds an entry stays valid
+        sizeof: Optional function estimating the bytes of a value; when given,
+            the memory used by the entries is reported in stats()
+    """
+    
+    def __init__(self, max_size=1000, ttl=300, sizeof=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._loading = {}          # key -> {load token: invalidated while loading}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "loads": 0,
+            "total_load_ms": 0.0,
+        }
+    
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._data[key]
+                self._bytes -= entry[2]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return default
+    
+    def set(self, key, value):
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            self._store(key, value, size)
+    
+    def _store(self, key, value, size):
+        previous = self._data.get(key)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._data[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted[2]
+            self._stats["evictions"] += 1
+    
+    def get_or_load(self, key, loader, refresh=False):
+        """
+        Return the cached value for key, calling loader() and caching its result on a miss.
+        
+        With ``refresh`` the cached value is ignored and replaced by a new load.
+        """
+        missing = object()
+        if not refresh:
+            value = self.get(key, missing)
+            if value is not missing:
+                return value
+        return self._load([key], lambda keys: {key: loader()})[key]
+    
+    def get_many_or_load(self, keys, loader):
+        """
+        Return the values of several keys, loading all the missing ones with a single call.
+        
+        ``loader(missing_keys)`` returns a dict key -> value. Only the keys it
+        returns are cached (and returned), so it can leave out failed loads.
+        
+        Returns:
+            A dict key -> value with the cached and the loaded values
+        """
+        missing = object()
+        values = {}
+        for key in dict.fromkeys(keys):
+            value = self.get(key, missing)
+            if value is not missing:
+                values[key] = value
+        pending = [key for key in dict.fromkeys(keys) if key not in values]
+        if pending:
+            values.update(self._load(pending, loader))
+        return values
+    
+    def _load(self, keys, loader):
+        token = object()
+        with self._lock:
+            for key in keys:
+                self._loading.setdefault(key, {})[token] = False
+        
+        start = time.perf_counter()
+        invalidated = set()
+        try:
+            values = loader(keys)
+        finally:
+            with self._lock:
+                for key in keys:
+                    loads = self._loading[key]
+                    if loads.pop(token):
+                        invalidated.add(key)
+                    if not loads:
+                        del self._loading[key]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        sizes = {key: self.sizeof(value) if self.sizeof else 0 for key, value in values.items()}
+        with self._lock:
+            # Las claves de una misma carga se piden a la vez: cada una cuenta el tiempo total
+            self._stats["loads"] += len(values)
+            self._stats["total_load_ms"] += elapsed_ms * len(values)
+            for key, value in values.items():
+                # Invalidada mientras se cargaba: el valor puede ser anterior a la escritura
+                if key not in invalidated:
+                    self._store(key, value, sizes[key])
+        return values
+    
+    def _invalidate_loads(self, keys):
+        for key in keys:
+            loads = self._loading.get(key)
+            if loads:
+                for token in loads:
+                    loads[token] = True
+    
+    def delete(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+                self._stats["invalidations"] += 1
+            self._invalidate_loads([key])
+    
+    def clear(self):
+        with self._lock:
+            self._stats["invalidations"] += len(self._data)
+            self._data.clear()
+            self._bytes = 0
+            self._invalidate_loads(list(self._loading))
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+            if self.sizeof:
+                stats["memory_bytes"] = self._bytes
+        stats["max_size"] = self.max_size
+        stats["ttl"] = self.ttl
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+        avg_load_ms = stats["total_load_ms"] / stats["loads"] if stats["loads"] else None
+        stats["avg_load_ms"] = avg_load_ms
+        stats["estimated_saved_ms"] = stats["hits"] * avg_load_ms if avg_load_ms is not None else 0
+        return stats
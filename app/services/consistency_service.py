@@ -0,0 +1,159 @@
+from flask import Flask, current_app
+import argparse
+import json
+import logging
+import time
+
+from app.services.db_service import iter_collection_batches
+from app.services.reindex_service import COLLECTIONS, ACTIVE_QUERY, RestaurantLookup, build_documents
+from app.services.search_service import (
+    document_digest, iter_search, index_documents, delete_documents, flush_index_queue,
+    init_search_service, get_live_index_field
+)
+
+logger = logging.getLogger(__name__)
+
+# Tipo de documento del índice para cada colección
+DOCUMENT_TYPES = {"restaurants": "restaurant", "dishes": "dish", "menus": "menu"}
+
+# Ids de ejemplo que se incluyen en el informe por cada tipo de diferencia
+SAMPLE_SIZE = 20
+
+_NOT_INDEXED = object()
+
+def _check_index_fields():
+    """
+    Fail early if the index cannot be compared by id and digest.
+    
+    Indexes of schema version 1 have an ``id`` that is neither sortable nor
+    filterable and no ``content_digest``; Azure cannot change the attributes
+    of a field in place, so they have to be rebuilt with schema version 2
+    (reindex_service) first.
+    
+    Raises:
+        RuntimeError: If the index lacks what the check needs
+    """
+    id_field = get_live_index_field("id")
+    if id_field is None:
+        # Backend local o índice sin comprobar al arrancar
+        return
+    if not (id_field.sortable and id_field.filterable):
+        raise RuntimeError("The search index id field is not sortable and filterable; rebuild it with "
+                           "python -m app.services.reindex_service --schema-version 2 --alias <alias>")
+    if get_live_index_field("content_digest") is None:
+        raise RuntimeError("The search index has no content_digest field; restart the application "
+                           "so it is added, or rebuild the index with reindex_service --schema-version 2")
+
+def _index_digests(doc_type, page_size):
+    """Map id -> content_digest for every document of a type in the index (ids and digests only)."""
+    results = iter_search("*", doc_type=doc_type, select=["id", "content_digest"],
+                          sort=["id asc"], page_size=page_size)
+    return {result["id"]: result.get("content_digest") for result in results}
+
+def check_collection(collection, repair=False, batch_size=1000, lookup=None):
+    """
+    Compare one collection with the search index.
+    
+    Reads the stored digests of the index first, then streams Mongo, builds
+    each search document and compares digests. With ``repair`` only the
+    missing or stale documents are uploaded and the orphaned ones deleted.
+    
+    Args:
+        collection: 'restaurants', 'dishes' or 'menus'
+        repair: Fix the differences found
+        batch_size: Mongo batch and index page size
+        lookup: Optional RestaurantLookup shared between collections
+    
+    Returns:
+        A dictionary with the counts and sample ids of each kind of drift
+    """
+    start = time.perf_counter()
+    lookup = lookup or RestaurantLookup()
+    indexed = _index_digests(DOCUMENT_TYPES[collection], batch_size)
+    report = {
+        "indexed": len(indexed),
+        "checked": 0,
+        "missing": 0,
+        "stale": 0,
+        "orphaned": 0,
+        "repaired": 0,
+        "samples": {"missing": [], "stale": [], "orphaned": []}
+    }
+    
+    def record(kind, doc_id):
+        report[kind] += 1
+        if len(report["samples"][kind]) < SAMPLE_SIZE:
+            report["samples"][kind].append(doc_id)
+    
+    for batch in iter_collection_batches(collection, batch_size=batch_size, query=ACTIVE_QUERY):
+        to_repair = []
+        for document in build_documents(collection, batch, lookup):
+            report["checked"] += 1
+            stored = indexed.pop(document["id"], _NOT_INDEXED)
+            if stored is _NOT_INDEXED:
+                record("missing", document["id"])
+            elif stored != document_digest(document):
+                # Incluye los documentos indexados antes de existir content_digest
+                record("stale", document["id"])
+            else:
+                continue
+            to_repair.append(document)
+        
+        if repair and to_repair:
+            index_documents(to_repair)
+            report["repaired"] += len(to_repair)
+    
+    # Lo que queda en el índice ya no existe (o está inactivo) en Mongo
+    orphaned = list(indexed)
+    for doc_id in orphaned:
+        record("orphaned", doc_id)
+    if repair and orphaned:
+        delete_documents(orphaned)
+        report["repaired"] += len(orphaned)
+    
+    report["elapsed_seconds"] = time.perf_counter() - start
+    return report
+
+def check_consistency(repair=False, collections=COLLECTIONS, batch_size=None):
+    """
+    Compare Mongo with the search index and optionally repair the drift.
+    
+    Args:
+        repair: Upload missing or stale documents and delete orphaned ones
+        collections: Collections to check
+        batch_size: Mongo batch and index page size (default: REINDEX_BATCH_SIZE)
+    
+    Returns:
+        A dictionary collection -> report (see check_collection)
+    
+    Raises:
+        RuntimeError: If the index does not support the check (see _check_index_fields)
+    """
+    _check_index_fields()
+    batch_size = batch_size or current_app.config.get('REINDEX_BATCH_SIZE', 1000)
+    lookup = RestaurantLookup()
+    reports = {}
+    for collection in collections:
+        reports[collection] = check_collection(collection, repair, batch_size, lookup)
+        drift = sum(reports[collection][kind] for kind in ("missing", "stale", "orphaned"))
+        if drift:
+            logger.warning(f"Search index drift in {collection}: {drift} documents")
+    
+    if repair:
+        flush_index_queue()
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare MongoDB with the search index")
+    parser.add_argument("--repair", action="store_true", help="Fix the documents that differ")
+    parser.add_argument("--collection", action="append", choices=COLLECTIONS,
+                        help="Collection to check (default: all)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    app = Flask('app')
+    app.config.from_object('app.config.Config')
+    init_search_service(app)
+    with app.app_context():
+        result = check_consistency(args.repair, args.collection or COLLECTIONS)
+        print(json.dumps(result, indent=2, default=str))
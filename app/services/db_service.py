@@ -1,27 +1,74 @@
-from pymongo import MongoClient, GEOSPHERE
+from pymongo import MongoClient, GEOSPHERE, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from flask import current_app, g
 from bson.objectid import ObjectId
+from app.services.cache import TTLCache, approximate_size
+import base64
+import copy
 import datetime
+import json
+import math
+import os
+import threading
+
+# Un único MongoClient por proceso. Se crea de forma perezosa en el primer
+# uso para que cada worker de gunicorn abra su propio pool tras el fork.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _reset_client():
+    """Forget the inherited client in a forked child (never close it there)."""
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_client)
+
+def get_client(config=None):
+    """Return the process-wide pooled MongoClient, creating it if needed."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    
+    config = config or current_app.config
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            # Ajustamos las opciones del cliente para Cosmos DB
+            client_options = {
+                "retryWrites": False,  # Cosmos DB no soporta retryWrites
+                "serverSelectionTimeoutMS": 5000,
+                "socketTimeoutMS": 10000,
+                "connectTimeoutMS": 10000,
+                "maxPoolSize": config.get('MONGO_MAX_POOL_SIZE', 50),
+                "minPoolSize": config.get('MONGO_MIN_POOL_SIZE', 0),
+                "maxIdleTimeMS": config.get('MONGO_MAX_IDLE_TIME_MS', 120000),
+                "waitQueueTimeoutMS": config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000),
+            }
+            _client = MongoClient(config['MONGO_URI'], connect=False, **client_options)
+            _client_pid = pid
+    return _client
 
 def get_db():
     """Return a handle to the MongoDB database."""
     if 'db' not in g:
-        # Ajustamos las opciones del cliente para Cosmos DB
-        client_options = {
-            "retryWrites": False,  # Cosmos DB no soporta retryWrites
-            "serverSelectionTimeoutMS": 5000,
-            "socketTimeoutMS": 10000,
-            "connectTimeoutMS": 10000,
-        }
-        g.client = MongoClient(current_app.config['MONGO_URI'], **client_options)
-        g.db = g.client[current_app.config['MONGO_DB_NAME']]
+        g.db = get_client()[current_app.config['MONGO_DB_NAME']]
     return g.db
 
 def close_db(e=None):
-    """Close the MongoDB connection."""
-    client = g.pop('client', None)
-    if client is not None:
-        client.close()
+    """Release the request's database handle (the pooled client stays open)."""
+    g.pop('db', None)
+
+def shutdown_client():
+    """Close the process-wide client, e.g. from a gunicorn worker_exit hook."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
 
 def init_db(app):
     """Initialize the database."""
@@ -32,23 +79,99 @@ def init_db(app):
             # Creamos los índices sin la opción partitionKey
             db.restaurants.create_index([("location", GEOSPHERE)])
             db.restaurants.create_index([("name", 1)])
+            # Índices compuestos de los listados paginados (Cosmos los exige para ordenar por varios campos)
+            db.restaurants.create_index([("name", 1), ("_id", 1)])
+            db.restaurants.create_index([("created_at", -1), ("_id", -1)])
+            db.restaurants.create_index([("avg_rating", -1), ("_id", -1)])
+            db.dishes.create_index([("restaurant_id", 1), ("name", 1), ("_id", 1)])
+            db.dishes.create_index([("restaurant_id", 1), ("created_at", -1), ("_id", -1)])
+            db.menus.create_index([("restaurant_id", 1), ("date", -1), ("_id", -1)])
             db.dishes.create_index([("name", 1)])
             db.dishes.create_index([("restaurant_id", 1)])
             db.dishes.create_index([("is_promoted", 1)])
             db.menus.create_index([("restaurant_id", 1), ("date", -1)])
+            db.menu_catalog.create_index([("uploaded_at", -1), ("_id", -1)])
+            db.menu_catalog.create_index([("blob_name", 1)], unique=True)
+            db.ingestion_jobs.create_index([("status", 1), ("next_attempt_at", 1)])
+            db.menus.create_index([("ingestion_job_id", 1)], sparse=True)
+            db.menus.create_index([("pdf_url", 1)])
+            db.ingestion_jobs.create_index([("restaurant_id", 1), ("content_hash", 1)])
+            db.dishes.create_index([("ingestion_job_id", 1)], sparse=True)
             db.ratings.create_index([("restaurant_id", 1), ("dish_id", 1)])
+            db.ratings.create_index([("dish_id", 1)])
             db.promotions.create_index([("dish_id", 1), ("is_active", 1)])
+            db.promotions.create_index([("is_active", 1), ("end_date", 1)])
+            db.promotions.create_index([("is_active", 1), ("started", 1), ("start_date", 1)])
             
             print("Índices creados exitosamente")
         except Exception as e:
             print(f"Error al crear índices: {str(e)}")
-            
+        
         app.teardown_appcontext(close_db)
 
+# Caché por proceso de restaurantes, platos y menús leídos por id. Las
+# escrituras de este proceso invalidan la entrada; las de otros workers se
+# ven al caducar (ENTITY_CACHE_TTL_SECONDS). Dentro de una petición el mismo
+# id devuelve siempre el mismo documento sin volver a la caché.
+_entity_cache = None
+_entity_cache_lock = threading.Lock()
+
+def get_entity_cache():
+    """Return this process' restaurant/dish/menu cache."""
+    global _entity_cache
+    if _entity_cache is None:
+        with _entity_cache_lock:
+            if _entity_cache is None:
+                _entity_cache = TTLCache(
+                    max_size=current_app.config.get('ENTITY_CACHE_MAX_SIZE', 5000),
+                    ttl=current_app.config.get('ENTITY_CACHE_TTL_SECONDS', 30),
+                    sizeof=approximate_size
+                )
+    return _entity_cache
+
+def _get_cached(collection_name, doc_id, fresh=False):
+    """
+    Read a document by id through the per-request memo and the process cache.
+    
+    The cache of each process only forgets its own writes, so a document
+    written by another worker can be served stale for up to
+    ENTITY_CACHE_TTL seconds. Read-modify-write paths (edit forms, reindexing
+    after an update) pass ``fresh=True`` to read Mongo and refresh the cache;
+    display pages read through the cache. Within a request the memo already
+    holds the latest version.
+    """
+    key = (collection_name, str(doc_id))
+    memo = g.setdefault('entity_memo', {})
+    if key in memo:
+        return memo[key]
+    
+    def load():
+        return get_db()[collection_name].find_one({"_id": ObjectId(doc_id)})
+    
+    if current_app.config.get('ENTITY_CACHE_ENABLED', True):
+        # Los llamadores pueden modificar el documento: nunca se entrega el de la caché
+        document = copy.deepcopy(get_entity_cache().get_or_load(key, load, refresh=fresh))
+    else:
+        document = load()
+    memo[key] = document
+    return document
+
+def invalidate_entities(collection_name, doc_ids):
+    """Forget cached documents after writing them (restaurants, dishes or menus)."""
+    memo = g.get('entity_memo') or {}
+    for doc_id in doc_ids:
+        key = (collection_name, str(doc_id))
+        memo.pop(key, None)
+        if _entity_cache is not None:
+            _entity_cache.delete(key)
+
+def get_entity_cache_stats():
+    """Return hit ratio and approximate memory of the restaurant/dish/menu cache."""
+    return get_entity_cache().stats()
+
 # Restaurant operations
-def get_restaurant(restaurant_id):
-    db = get_db()
-    return db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
+def get_restaurant(restaurant_id, fresh=False):
+    return _get_cached("restaurants", restaurant_id, fresh)
 
 def get_restaurants(filters=None, sort=None, limit=20, skip=0):
     db = get_db()
@@ -60,6 +183,114 @@ def get_restaurants(filters=None, sort=None, limit=20, skip=0):
     
     return list(cursor.skip(skip).limit(limit))
 
+# Órdenes estables para los listados paginados (ver _keyset_page)
+RESTAURANT_SORTS = {
+    "name": [("name", 1), ("_id", 1)],
+    "newest": [("created_at", -1), ("_id", -1)],
+    "rating": [("avg_rating", -1), ("_id", -1)],
+}
+
+def get_restaurants_page(filters=None, sort="name", limit=20, after=None):
+    """
+    Return one page of restaurants (see _keyset_page).
+    
+    Args:
+        filters: Optional Mongo query
+        sort: One of RESTAURANT_SORTS
+        limit: Restaurants per page
+        after: Continuation token of the previous page
+    """
+    return _keyset_page("restaurants", filters or {}, RESTAURANT_SORTS, sort, limit, after)
+
+# Campos devueltos por la búsqueda de restaurantes cercanos
+NEARBY_FIELDS = {
+    "name": 1, "address": 1, "cuisine_type": 1, "price_range": 1,
+    "avg_rating": 1, "rating_count": 1, "location": 1, "has_daily_menu": 1,
+}
+
+def nearby_filters(cuisine_types=None, max_price=None, min_rating=None):
+    """Mongo query for the filters of the nearby search (cuisine, price range 1-5, rating)."""
+    query = {}
+    if cuisine_types:
+        query["cuisine_type"] = {"$in": list(cuisine_types)}
+    if max_price is not None:
+        query["price_range"] = {"$lte": max_price}
+    if min_rating is not None:
+        query["avg_rating"] = {"$gte": min_rating}
+    return query
+
+def find_restaurants_near(lat, lon, radius_km=None, filters=None, limit=20, after=None):
+    """
+    Active restaurants within a radius, nearest first, with their distance.
+    
+    Uses $geoNear on the 2dsphere index of restaurants.location; the filters
+    are applied by the same stage, so only restaurants inside the radius
+    are read. Pages continue from the distance of the last result
+    (minDistance) instead of skipping the previous ones.
+    
+    Args:
+        lat: Latitude of the user
+        lon: Longitude of the user
+        radius_km: Search radius (default: DEFAULT_SEARCH_RADIUS_KM, at most MAX_SEARCH_RADIUS_KM)
+        filters: Optional Mongo query (see nearby_filters)
+        limit: Restaurants per page
+        after: Continuation token of the previous page
+    
+    Returns:
+        A dictionary with the items (each with distance_km) and the token of the next page
+    
+    Raises:
+        ValueError: If the coordinates, radius, limit or token are not valid
+    """
+    config = current_app.config
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Invalid coordinates")
+    if radius_km is not None and not radius_km > 0:
+        raise ValueError("radius_km must be positive")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    radius_km = min(radius_km or config.get('DEFAULT_SEARCH_RADIUS_KM', 5),
+                    config.get('MAX_SEARCH_RADIUS_KM', 50))
+    
+    query = dict(filters or {}, active={"$ne": False})
+    min_distance = 0
+    excluded = []
+    if after:
+        values = _decode_cursor(after)
+        if not values or len(values) < 5 or values[:4] != ["near", lat, lon, radius_km]:
+            raise ValueError("Invalid continuation token")
+        # Los empatados a la distancia del último resultado que ya se devolvieron
+        min_distance, excluded = values[4], values[5:]
+        query["_id"] = {"$nin": excluded}
+    
+    db = get_db()
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lon, lat]},
+            "distanceField": "distance",
+            "minDistance": min_distance,
+            "maxDistance": radius_km * 1000,
+            "query": query,
+            "spherical": True
+        }},
+        {"$limit": limit + 1},
+        {"$project": dict(NEARBY_FIELDS, distance=1)}
+    ]
+    items = list(db.restaurants.aggregate(pipeline))
+    has_more = len(items) > limit
+    items = items[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = items[-1]["distance"]
+        ties = [item["_id"] for item in items if item["distance"] == last]
+        if min_distance == last:
+            ties += excluded
+        next_cursor = _encode_cursor(["near", lat, lon, radius_km, last] + ties)
+    for item in items:
+        item["distance_km"] = round(item.pop("distance") / 1000, 3)
+    return {"items": items, "next_cursor": next_cursor}
+
 def create_restaurant(restaurant_data):
     db = get_db()
     restaurant_data["created_at"] = datetime.datetime.utcnow()
@@ -74,6 +305,7 @@ def update_restaurant(restaurant_id, restaurant_data):
         {"_id": ObjectId(restaurant_id)},
         {"$set": restaurant_data}
     )
+    invalidate_entities("restaurants", [restaurant_id])
     return True
 
 def delete_restaurant(restaurant_id):
@@ -82,12 +314,12 @@ def delete_restaurant(restaurant_id):
         {"_id": ObjectId(restaurant_id)},
         {"$set": {"active": False, "updated_at": datetime.datetime.utcnow()}}
     )
+    invalidate_entities("restaurants", [restaurant_id])
     return True
 
 # Menu operations
-def get_menu(menu_id):
-    db = get_db()
-    return db.menus.find_one({"_id": ObjectId(menu_id)})
+def get_menu(menu_id, fresh=False):
+    return _get_cached("menus", menu_id, fresh)
 
 def get_restaurant_menus(restaurant_id, menu_type=None, date=None):
     db = get_db()
@@ -101,6 +333,17 @@ def get_restaurant_menus(restaurant_id, menu_type=None, date=None):
     
     return list(db.menus.find(query).sort("date", -1))
 
+MENU_SORTS = {
+    "date": [("date", -1), ("_id", -1)],
+}
+
+def get_restaurant_menus_page(restaurant_id, menu_type=None, sort="date", limit=20, after=None):
+    """Return one page of the active menus of a restaurant, newest first (see _keyset_page)."""
+    query = {"restaurant_id": restaurant_id, "active": True}
+    if menu_type:
+        query["menu_type"] = menu_type
+    return _keyset_page("menus", query, MENU_SORTS, sort, limit, after)
+
 def create_menu(menu_data):
     db = get_db()
     menu_data["created_at"] = datetime.datetime.utcnow()
@@ -115,6 +358,7 @@ def update_menu(menu_id, menu_data):
         {"_id": ObjectId(menu_id)},
         {"$set": menu_data}
     )
+    invalidate_entities("menus", [menu_id])
     return True
 
 def delete_menu(menu_id):
@@ -123,12 +367,381 @@ def delete_menu(menu_id):
         {"_id": ObjectId(menu_id)},
         {"$set": {"active": False, "updated_at": datetime.datetime.utcnow()}}
     )
+    invalidate_entities("menus", [menu_id])
     return True
 
-# Dish operations
-def get_dish(dish_id):
+def count_pdf_references(pdf_url):
+    """
+    Active menus and pending ingestion jobs using a PDF blob.
+    
+    Identical uploads of a restaurant share one blob, so it can only be
+    deleted when nothing references it any more.
+    """
+    db = get_db()
+    menus = db.menus.count_documents({"pdf_url": pdf_url, "active": {"$ne": False}})
+    jobs = db.ingestion_jobs.count_documents({"pdf_url": pdf_url, "status": {"$in": ["queued", "running"]}})
+    return menus + jobs
+
+# Menu catalog operations (listado de PDFs de la portada)
+def _encode_cursor(values):
+    """Encode the sort key of a document into an opaque continuation token."""
+    payload = []
+    for value in values:
+        if isinstance(value, ObjectId):
+            payload.append({"oid": str(value)})
+        elif isinstance(value, datetime.datetime):
+            payload.append({"dt": value.isoformat()})
+        else:
+            payload.append({"v": value})
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(token):
+    """Decode a continuation token produced by _encode_cursor (None if invalid)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = []
+        for item in json.loads(raw):
+            if "oid" in item:
+                values.append(ObjectId(item["oid"]))
+            elif "dt" in item:
+                values.append(datetime.datetime.fromisoformat(item["dt"]))
+            else:
+                values.append(item["v"])
+        return values
+    except Exception:
+        return None
+
+def _keyset_clauses(sort, values):
+    """
+    Conditions matching the documents after a sort key, in Mongo sort order.
+    
+    Mongo sorts missing and null values first in ascending order and last in
+    descending order; the conditions follow the same rule.
+    """
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        equal = {f: v for (f, _), v in zip(sort[:position], values[:position])}
+        value = values[position]
+        if value is None:
+            if direction > 0:
+                clauses.append(dict(equal, **{field: {"$ne": None}}))
+        elif direction > 0:
+            clauses.append(dict(equal, **{field: {"$gt": value}}))
+        else:
+            clauses.append(dict(equal, **{field: {"$lt": value}}))
+            clauses.append(dict(equal, **{field: None}))
+    return clauses
+
+def _keyset_page(collection_name, query, sorts, sort_name, limit, after=None):
+    """
+    Return one page of a collection in a stable order, using keyset pagination.
+    
+    Every sort ends in _id, so the position of the last document of a page
+    identifies where the next one starts and no page needs to skip the
+    preceding documents.
+    
+    Args:
+        collection_name: Collection to read
+        query: Mongo query of the listing
+        sorts: Dictionary sort name -> list of (field, direction) ending in _id
+        sort_name: Sort to use
+        limit: Documents per page
+        after: Continuation token of the previous page
+    
+    Returns:
+        A dictionary with the items and the token of the next page (None on the last page)
+    
+    Raises:
+        ValueError: If the sort is unknown, the limit is not positive or the
+            token does not belong to the sort
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if sort_name not in sorts:
+        raise ValueError(f"Unknown sort: {sort_name}")
+    sort = sorts[sort_name]
+    
+    if after:
+        values = _decode_cursor(after)
+        if not values or values[0] != sort_name or len(values) != len(sort) + 1:
+            raise ValueError("Invalid continuation token")
+        query = {"$and": [query, {"$or": _keyset_clauses(sort, values[1:])}]}
+    
+    db = get_db()
+    # Pedimos un elemento extra para saber si hay más páginas
+    items = list(db[collection_name].find(query).sort(sort).limit(limit + 1))
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "next_cursor": _encode_cursor([sort_name] + [items[-1].get(field) for field, _ in sort]) if has_more else None
+    }
+
+def add_menu_catalog_entry(blob_name, pdf_url, restaurant_id, display_name=None, uploaded_at=None,
+                           overwrite=True):
+    """Register a PDF in the menu catalog; with overwrite=False an existing entry is left as is."""
+    db = get_db()
+    entry = {
+        "blob_name": blob_name,
+        "pdf_url": pdf_url,
+        "restaurant_id": restaurant_id,
+        "display_name": display_name or blob_name.rsplit('.', 1)[0],
+        "uploaded_at": uploaded_at or datetime.datetime.utcnow()
+    }
+    db.menu_catalog.update_one({"blob_name": blob_name}, {"$set" if overwrite else "$setOnInsert": entry}, upsert=True)
+    return True
+
+def get_menu_catalog_entry(blob_name):
+    db = get_db()
+    return db.menu_catalog.find_one({"blob_name": blob_name})
+
+def remove_menu_catalog_entry(blob_name):
+    db = get_db()
+    db.menu_catalog.delete_one({"blob_name": blob_name})
+    return True
+
+def get_menu_catalog_blob_names(skip=0, limit=None):
+    """Blob names of the catalog entries in name order (served by the blob_name index)."""
+    db = get_db()
+    cursor = db.menu_catalog.find({}, {"blob_name": 1, "_id": 0}).sort("blob_name", 1).skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [entry["blob_name"] for entry in cursor]
+
+def count_menu_catalog():
+    """Approximate number of catalog entries (metadata only, no scan)."""
+    db = get_db()
+    return db.menu_catalog.estimated_document_count()
+
+def get_menu_catalog_page(per_page=9, after=None, before=None, skip=0):
+    """
+    Return one page of the menu catalog, newest first, using keyset pagination.
+    
+    Args:
+        per_page: Number of entries per page
+        after: Continuation token of the last entry of the previous page
+        before: Continuation token of the first entry of the next page
+        skip: Offset used only when no token is given (jumps to a page number)
+    
+    Returns:
+        A dictionary with the entries and the tokens for the neighbouring pages
+    """
+    db = get_db()
+    sort = [("uploaded_at", -1), ("_id", -1)]
+    query = {}
+    backwards = False
+    
+    cursor_values = _decode_cursor(after) or _decode_cursor(before)
+    if cursor_values:
+        backwards = not _decode_cursor(after)
+        uploaded_at, entry_id = cursor_values
+        op = "$gt" if backwards else "$lt"
+        query = {"$or": [
+            {"uploaded_at": {op: uploaded_at}},
+            {"uploaded_at": uploaded_at, "_id": {op: entry_id}}
+        ]}
+        if backwards:
+            sort = [("uploaded_at", 1), ("_id", 1)]
+    
+    cursor = db.menu_catalog.find(query).sort(sort)
+    if not cursor_values and skip:
+        cursor = cursor.skip(skip)
+    # Pedimos un elemento extra para saber si hay más páginas
+    entries = list(cursor.limit(per_page + 1))
+    has_more = len(entries) > per_page
+    entries = entries[:per_page]
+    if backwards:
+        entries.reverse()
+    
+    has_next = has_more if not backwards else True
+    has_prev = (has_more if backwards else bool(cursor_values or skip))
+    
+    return {
+        "entries": entries,
+        "next_cursor": _encode_cursor([entries[-1]["uploaded_at"], entries[-1]["_id"]]) if entries and has_next else None,
+        "prev_cursor": _encode_cursor([entries[0]["uploaded_at"], entries[0]["_id"]]) if entries and has_prev else None
+    }
+
+# Menu extraction cache (resultado de pdfminer por hash de contenido)
+def get_menu_extraction(content_hash, parser_version):
+    db = get_db()
+    cached = db.menu_extractions.find_one({"_id": f"{parser_version}:{content_hash}"})
+    return cached["result"] if cached else None
+
+def save_menu_extraction(content_hash, parser_version, result):
+    db = get_db()
+    db.menu_extractions.update_one(
+        {"_id": f"{parser_version}:{content_hash}"},
+        {"$set": {
+            "content_hash": content_hash,
+            "parser_version": parser_version,
+            "result": result,
+            "created_at": datetime.datetime.utcnow()
+        }},
+        upsert=True
+    )
+    return True
+
+# Ingestion job operations (procesamiento asíncrono de menús)
+def create_ingestion_job(job_data):
+    db = get_db()
+    now = datetime.datetime.utcnow()
+    job_data.update({
+        "status": "queued",
+        "attempts": 0,
+        "error": None,
+        "result": None,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    })
+    result = db.ingestion_jobs.insert_one(job_data)
+    return str(result.inserted_id)
+
+def get_ingestion_job(job_id):
+    db = get_db()
+    return db.ingestion_jobs.find_one({"_id": ObjectId(job_id)})
+
+def find_ingestion_job(restaurant_id, content_hash, menu_type=None, menu_date=None, price=None):
+    """Latest queued, running or done job for the same upload (restaurant, PDF content and menu details)."""
+    db = get_db()
+    return db.ingestion_jobs.find_one(
+        {
+            "restaurant_id": restaurant_id,
+            "content_hash": content_hash,
+            "menu_type": menu_type,
+            "menu_date": menu_date,
+            "price": price,
+            "status": {"$in": ["queued", "running", "done"]}
+        },
+        sort=[("created_at", -1)]
+    )
+
+def claim_ingestion_job(job_id=None):
+    """
+    Atomically move a queued job to 'running' and return it.
+    
+    Args:
+        job_id: Optional job to claim; otherwise the oldest due job is taken
+    """
+    db = get_db()
+    now = datetime.datetime.utcnow()
+    query = {"status": "queued", "next_attempt_at": {"$lte": now}}
+    if job_id:
+        query["_id"] = ObjectId(job_id)
+    
+    return db.ingestion_jobs.find_one_and_update(
+        query,
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def renew_ingestion_job_heartbeat(job_id, attempts):
+    """
+    Record that an attempt of a running job is still alive.
+    
+    Returns:
+        False if the job is no longer running that attempt (finished, or
+        requeued and claimed again)
+    """
+    db = get_db()
+    result = db.ingestion_jobs.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "attempts": attempts},
+        {"$set": {"heartbeat_at": datetime.datetime.utcnow()}}
+    )
+    return result.matched_count == 1
+
+def complete_ingestion_job(job_id, result):
+    db = get_db()
+    db.ingestion_jobs.update_one(
+        {"_id": ObjectId(job_id)},
+        {"$set": {
+            "status": "done",
+            "result": result,
+            "error": None,
+            "updated_at": datetime.datetime.utcnow()
+        }}
+    )
+    return True
+
+def fail_ingestion_job(job_id, error, retry_at=None):
+    """Record a failed attempt; the job is requeued when retry_at is given."""
+    db = get_db()
+    update = {
+        "status": "queued" if retry_at else "failed",
+        "error": error,
+        "updated_at": datetime.datetime.utcnow()
+    }
+    if retry_at:
+        update["next_attempt_at"] = retry_at
+    db.ingestion_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": update})
+    return True
+
+def record_ingestion_output(job_id, menu_id, dish_ids):
+    """Store on a job the menu and dishes it created, so a retry resumes from them."""
+    db = get_db()
+    db.ingestion_jobs.update_one(
+        {"_id": ObjectId(job_id)},
+        {"$set": {
+            "output": {"menu_id": menu_id, "dish_ids": dish_ids},
+            "updated_at": datetime.datetime.utcnow()
+        }}
+    )
+    return True
+
+def discard_ingestion_output(job_id):
+    """
+    Delete the menus and dishes left by an interrupted attempt of a job.
+    
+    They carry the job id in ``ingestion_job_id`` and were never indexed:
+    the job records its output (see record_ingestion_output) before indexing.
+    
+    Returns:
+        The number of menus and dishes deleted
+    """
     db = get_db()
-    return db.dishes.find_one({"_id": ObjectId(dish_id)})
+    menus = db.menus.delete_many({"ingestion_job_id": job_id})
+    dishes = db.dishes.delete_many({"ingestion_job_id": job_id})
+    return menus.deleted_count + dishes.deleted_count
+
+def get_overdue_ingestion_job_ids(grace_seconds=60, limit=100):
+    """Ids of queued jobs whose next attempt is overdue by more than grace_seconds (lost retries)."""
+    db = get_db()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=grace_seconds)
+    jobs = db.ingestion_jobs.find(
+        {"status": "queued", "next_attempt_at": {"$lt": cutoff}}, {"_id": 1}
+    ).sort("next_attempt_at", 1).limit(limit)
+    return [str(job["_id"]) for job in jobs]
+
+def requeue_stale_ingestion_jobs(older_than_seconds=180):
+    """
+    Requeue jobs left 'running' by a worker that died mid-way.
+    
+    A running job renews ``heartbeat_at`` periodically, so only jobs without
+    a heartbeat for ``older_than_seconds`` are requeued, however long they
+    have been running.
+    """
+    db = get_db()
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(seconds=older_than_seconds)
+    result = db.ingestion_jobs.update_many(
+        {"status": "running", "$or": [
+            {"heartbeat_at": {"$lt": cutoff}},
+            # Reclamados antes de existir el latido
+            {"heartbeat_at": {"$exists": False}, "started_at": {"$lt": cutoff}}
+        ]},
+        {"$set": {"status": "queued", "next_attempt_at": now, "updated_at": now}}
+    )
+    return result.modified_count
+
+# Dish operations
+def get_dish(dish_id, fresh=False):
+    return _get_cached("dishes", dish_id, fresh)
 
 def get_restaurant_dishes(restaurant_id, filters=None):
     db = get_db()
@@ -139,6 +752,18 @@ def get_restaurant_dishes(restaurant_id, filters=None):
     
     return list(db.dishes.find(query))
 
+DISH_SORTS = {
+    "name": [("name", 1), ("_id", 1)],
+    "newest": [("created_at", -1), ("_id", -1)],
+}
+
+def get_restaurant_dishes_page(restaurant_id, filters=None, sort="name", limit=50, after=None):
+    """Return one page of the active dishes of a restaurant (see _keyset_page)."""
+    query = {"restaurant_id": restaurant_id, "active": True}
+    if filters:
+        query.update(filters)
+    return _keyset_page("dishes", query, DISH_SORTS, sort, limit, after)
+
 def create_dish(dish_data):
     db = get_db()
     dish_data["created_at"] = datetime.datetime.utcnow()
@@ -146,6 +771,18 @@ def create_dish(dish_data):
     result = db.dishes.insert_one(dish_data)
     return str(result.inserted_id)
 
+def create_dishes(dishes_data):
+    """Insert several dishes with a single insert_many; returns their ids in order."""
+    if not dishes_data:
+        return []
+    db = get_db()
+    now = datetime.datetime.utcnow()
+    for dish_data in dishes_data:
+        dish_data["created_at"] = now
+        dish_data["updated_at"] = now
+    result = db.dishes.insert_many(dishes_data, ordered=True)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
 def update_dish(dish_id, dish_data):
     db = get_db()
     dish_data["updated_at"] = datetime.datetime.utcnow()
@@ -153,6 +790,7 @@ def update_dish(dish_id, dish_data):
         {"_id": ObjectId(dish_id)},
         {"$set": dish_data}
     )
+    invalidate_entities("dishes", [dish_id])
     return True
 
 def delete_dish(dish_id):
@@ -161,76 +799,293 @@ def delete_dish(dish_id):
         {"_id": ObjectId(dish_id)},
         {"$set": {"active": False, "updated_at": datetime.datetime.utcnow()}}
     )
+    invalidate_entities("dishes", [dish_id])
     return True
 
+# Lecturas por lotes (reindexado del buscador)
+def iter_collection_batches(collection_name, after_id=None, batch_size=1000, query=None, projection=None):
+    """
+    Stream a collection in _id order, one list of documents at a time.
+    
+    Args:
+        collection_name: Name of the collection
+        after_id: Resume after this _id (exclusive)
+        batch_size: Documents per list (also used as the cursor batch size)
+        query: Optional extra filter
+        projection: Optional projection
+    """
+    db = get_db()
+    query = dict(query or {})
+    if after_id is not None:
+        query["_id"] = {"$gt": ObjectId(after_id)}
+    
+    cursor = db[collection_name].find(query, projection).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _get_by_ids(collection_name, ids, projection=None):
+    object_ids = [ObjectId(doc_id) for doc_id in ids if ObjectId.is_valid(doc_id)]
+    if not object_ids:
+        return {}
+    db = get_db()
+    return {str(document["_id"]): document for document in db[collection_name].find({"_id": {"$in": object_ids}}, projection)}
+
+def get_restaurants_by_ids(restaurant_ids, projection=None):
+    """Fetch several restaurants with one query; returns a dict id -> restaurant."""
+    return _get_by_ids("restaurants", restaurant_ids, projection)
+
+def get_dishes_by_ids(dish_ids, projection=None):
+    """Fetch several dishes with one query; returns a dict id -> dish."""
+    return _get_by_ids("dishes", dish_ids, projection)
+
 # Rating operations
+
+# Cada restaurante y plato guarda la suma, el número y el histograma de sus
+# valoraciones activas; avg_rating se deriva de ellos. Una valoración nueva
+# es un $inc sobre el documento, sin recorrer las anteriores. La valoración
+# se guarda con applied=False y se marca al aplicar el $inc, para que los
+# recálculos no la cuenten dos veces (ver reconcile_rating_aggregates).
+RATING_STARS = ("1", "2", "3", "4", "5")
+RATING_RECONCILE_BATCH_SIZE = 500
+RATING_RECONCILE_SAFETY_SECONDS = 300
+
+def _rating_star(value):
+    """Histogram bucket ('1'-'5') of a rating value: rounded half up and clamped."""
+    return str(min(max(int(math.floor(value + 0.5)), 1), 5))
+
+def _rating_target(rating_data):
+    """Collection and id of the restaurant or dish a rating belongs to."""
+    if rating_data.get("dish_id"):
+        return "dishes", rating_data["dish_id"]
+    return "restaurants", rating_data["restaurant_id"]
+
+def _rating_average(rating_sum, rating_count):
+    return rating_sum / rating_count if rating_count else 0
+
 def create_rating(rating_data):
     db = get_db()
     rating_data["created_at"] = datetime.datetime.utcnow()
     rating_data["updated_at"] = datetime.datetime.utcnow()
+    rating_data.setdefault("active", True)
+    rating_data["applied"] = not rating_data["active"]
     result = db.ratings.insert_one(rating_data)
     
-    # Update restaurant average rating
-    if "dish_id" not in rating_data or not rating_data["dish_id"]:
-        # Restaurant rating
-        update_restaurant_avg_rating(rating_data["restaurant_id"])
-    else:
-        # Dish rating
-        update_dish_avg_rating(rating_data["dish_id"])
+    # Update the restaurant or dish aggregates
+    if rating_data["active"]:
+        collection_name, target_id = _rating_target(rating_data)
+        _add_rating(collection_name, target_id, rating_data["rating_value"], result.inserted_id)
     
     return str(result.inserted_id)
 
-def update_restaurant_avg_rating(restaurant_id):
+def _mark_rating_applied(rating_id):
+    get_db().ratings.update_one({"_id": rating_id}, {"$set": {"applied": True}})
+
+def _add_rating(collection_name, target_id, value, rating_id):
+    """
+    Add one rating to the running aggregates of a restaurant or dish.
+    
+    Sum, count and histogram change atomically with $inc, so the cost does
+    not depend on how many ratings the document already has. Documents
+    rated before the aggregates existed are recomputed once instead. The
+    rating is marked as applied right after its $inc; recomputations
+    only count applied ratings.
+    """
     db = get_db()
-    pipeline = [
-        {"$match": {"restaurant_id": restaurant_id, "dish_id": None, "active": True}},
-        {"$group": {"_id": "$restaurant_id", "avg_rating": {"$avg": "$rating_value"}, "count": {"$sum": 1}}}
-    ]
-    result = list(db.ratings.aggregate(pipeline))
+    now = datetime.datetime.utcnow()
+    updated = db[collection_name].find_one_and_update(
+        {"_id": ObjectId(target_id), "rating_sum": {"$exists": True}},
+        {
+            "$inc": {"rating_sum": value, "rating_count": 1, f"rating_histogram.{_rating_star(value)}": 1},
+            "$set": {"updated_at": now}
+        },
+        projection={"rating_sum": 1, "rating_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        # El recálculo ya incluye esta valoración
+        _mark_rating_applied(rating_id)
+        recompute_rating_aggregates(collection_name, target_id)
+        return
+    _mark_rating_applied(rating_id)
     
-    if result:
-        db.restaurants.update_one(
-            {"_id": ObjectId(restaurant_id)},
-            {"$set": {
-                "avg_rating": result[0]["avg_rating"],
-                "rating_count": result[0]["count"],
-                "updated_at": datetime.datetime.utcnow()
-            }}
-        )
+    # La media solo la escribe quien hizo el último $inc: si entretanto llegó
+    # otra valoración, la escritura de esa deja la media correcta
+    db[collection_name].update_one(
+        {"_id": updated["_id"], "rating_count": updated["rating_count"]},
+        {"$set": {"avg_rating": _rating_average(updated["rating_sum"], updated["rating_count"])}}
+    )
+    # Después de la media: invalidar antes dejaría cachear el documento sin ella
+    invalidate_entities(collection_name, [target_id])
 
-def update_dish_avg_rating(dish_id):
+def _aggregate_ratings(match, key):
+    """
+    Rating aggregates grouped by a field of the ratings collection.
+    
+    Returns:
+        A dict id -> {"rating_sum", "rating_count", "rating_histogram", "avg_rating"}
+    """
     db = get_db()
+    # Mismo redondeo que _rating_star
+    star = {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$rating_value", int(value) + 0.5]}, "then": value}
+            for value in RATING_STARS[:-1]
+        ],
+        "default": RATING_STARS[-1]
+    }}
+    group = {"_id": f"${key}", "rating_sum": {"$sum": "$rating_value"}, "rating_count": {"$sum": 1}}
+    for value in RATING_STARS:
+        group[f"star_{value}"] = {"$sum": {"$cond": [{"$eq": ["$star", value]}, 1, 0]}}
     pipeline = [
-        {"$match": {"dish_id": dish_id, "active": True}},
-        {"$group": {"_id": "$dish_id", "avg_rating": {"$avg": "$rating_value"}, "count": {"$sum": 1}}}
+        {"$match": match},
+        {"$project": {key: 1, "rating_value": 1, "star": star}},
+        {"$group": group}
     ]
-    result = list(db.ratings.aggregate(pipeline))
     
-    if result:
-        db.dishes.update_one(
-            {"_id": ObjectId(dish_id)},
-            {"$set": {
-                "avg_rating": result[0]["avg_rating"],
-                "rating_count": result[0]["count"],
-                "updated_at": datetime.datetime.utcnow()
-            }}
-        )
+    aggregates = {}
+    for result in db.ratings.aggregate(pipeline, allowDiskUse=True):
+        aggregates[str(result["_id"])] = {
+            "rating_sum": result["rating_sum"],
+            "rating_count": result["rating_count"],
+            "rating_histogram": {value: result[f"star_{value}"] for value in RATING_STARS},
+            "avg_rating": _rating_average(result["rating_sum"], result["rating_count"])
+        }
+    return aggregates
+
+def _empty_rating_aggregates():
+    return {
+        "rating_sum": 0,
+        "rating_count": 0,
+        "rating_histogram": {value: 0 for value in RATING_STARS},
+        "avg_rating": 0
+    }
+
+# Valoraciones que cuentan para cada colección y campo que las agrupa
+_RATING_SOURCES = {
+    "restaurants": ({"dish_id": None, "active": True}, "restaurant_id"),
+    "dishes": ({"dish_id": {"$ne": None}, "active": True}, "dish_id"),
+}
+
+# Las valoraciones anteriores a este campo no lo tienen y ya están aplicadas
+_APPLIED_RATING = {"applied": {"$ne": False}}
+
+def recompute_rating_aggregates(collection_name, target_id):
+    """Recompute the rating aggregates of one restaurant or dish from its applied ratings."""
+    db = get_db()
+    match, key = _RATING_SOURCES[collection_name]
+    aggregates = _aggregate_ratings(dict(match, **_APPLIED_RATING, **{key: target_id}), key)
+    db[collection_name].update_one(
+        {"_id": ObjectId(target_id)},
+        {"$set": dict(aggregates.get(target_id) or _empty_rating_aggregates(),
+                      updated_at=datetime.datetime.utcnow())}
+    )
+    invalidate_entities(collection_name, [target_id])
+
+def update_restaurant_avg_rating(restaurant_id):
+    recompute_rating_aggregates("restaurants", restaurant_id)
+
+def update_dish_avg_rating(dish_id):
+    recompute_rating_aggregates("dishes", dish_id)
+
+def _rating_drift(document, aggregates):
+    histogram = document.get("rating_histogram") or {}
+    return (
+        document.get("rating_count") != aggregates["rating_count"]
+        or abs((document.get("rating_sum") or 0) - aggregates["rating_sum"]) > 1e-6
+        or "rating_sum" not in document
+        or abs((document.get("avg_rating") or 0) - aggregates["avg_rating"]) > 1e-6
+        or any(histogram.get(value, 0) != aggregates["rating_histogram"][value] for value in RATING_STARS)
+    )
+
+def reconcile_rating_aggregates(batch_size=RATING_RECONCILE_BATCH_SIZE,
+                                safety_seconds=RATING_RECONCILE_SAFETY_SECONDS):
+    """
+    Recompute the rating aggregates of every restaurant and dish in bulk.
+    
+    One aggregation per collection over the ratings, then bulk writes for
+    the documents whose stored aggregates drifted. A rating is inserted
+    before its $inc, so ratings not yet marked as applied are only counted
+    once they are older than ``safety_seconds`` (their writer failed
+    between both steps), and documents changed within that window are left
+    for the next run: a rating arriving meanwhile is neither lost nor
+    counted twice.
+    
+    Args:
+        batch_size: Documents per bulk write
+        safety_seconds: Age after which an unapplied rating is counted
+    
+    Returns:
+        A dictionary collection -> {"checked", "corrected", "skipped"}
+    """
+    db = get_db()
+    report = {}
+    for collection_name, (match, key) in _RATING_SOURCES.items():
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=safety_seconds)
+        counted = {"$or": [_APPLIED_RATING, {"created_at": {"$lt": cutoff}}]}
+        expected = _aggregate_ratings(dict(match, **counted), key)
+        counts = {"checked": 0, "corrected": 0, "skipped": 0}
+        operations = []
+        corrected_ids = []
+        
+        cursor = db[collection_name].find(
+            {}, {"rating_sum": 1, "rating_count": 1, "rating_histogram": 1, "avg_rating": 1, "updated_at": 1}
+        ).batch_size(batch_size)
+        for document in cursor:
+            counts["checked"] += 1
+            aggregates = expected.get(str(document["_id"])) or _empty_rating_aggregates()
+            if not _rating_drift(document, aggregates):
+                continue
+            if document.get("updated_at") and document["updated_at"] >= cutoff:
+                counts["skipped"] += 1
+                continue
+            operations.append(UpdateOne(
+                {"_id": document["_id"], "rating_count": document.get("rating_count")},
+                {"$set": dict(aggregates, updated_at=datetime.datetime.utcnow())}
+            ))
+            corrected_ids.append(document["_id"])
+            if len(operations) >= batch_size:
+                counts["corrected"] += db[collection_name].bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            counts["corrected"] += db[collection_name].bulk_write(operations, ordered=False).modified_count
+        invalidate_entities(collection_name, corrected_ids)
+        # Ya contadas: dejan de depender de la ventana
+        db.ratings.update_many(dict(match, applied=False, created_at={"$lt": cutoff}), {"$set": {"applied": True}})
+        report[collection_name] = counts
+    return report
 
 # Promotion operations
+
+# Promociones procesadas por lote al activarlas o expirarlas
+PROMOTION_BATCH_SIZE = 500
+
 def create_promotion(promotion_data):
     db = get_db()
-    promotion_data["created_at"] = datetime.datetime.utcnow()
-    promotion_data["updated_at"] = datetime.datetime.utcnow()
+    now = datetime.datetime.utcnow()
+    promotion_data["created_at"] = now
+    promotion_data["updated_at"] = now
+    
+    # Las promociones programadas se aplican al plato cuando llega su start_date
+    start_date = promotion_data.get("start_date")
+    promotion_data["started"] = not (isinstance(start_date, datetime.datetime) and start_date > now)
     
     # Update dish promotion status
-    db.dishes.update_one(
-        {"_id": ObjectId(promotion_data["dish_id"])},
-        {"$set": {
-            "is_promoted": True,
-            "promotion_level": promotion_data["level"],
-            "updated_at": datetime.datetime.utcnow()
-        }}
-    )
+    if promotion_data["started"]:
+        db.dishes.update_one(
+            {"_id": ObjectId(promotion_data["dish_id"])},
+            {"$set": {
+                "is_promoted": True,
+                "promotion_level": promotion_data["level"],
+                "updated_at": now
+            }}
+        )
+        invalidate_entities("dishes", [promotion_data["dish_id"]])
     
     result = db.promotions.insert_one(promotion_data)
     return str(result.inserted_id)
@@ -249,31 +1104,133 @@ def get_active_promotions(restaurant_id=None):
     
     return list(db.promotions.find(query))
 
-def deactivate_expired_promotions():
-    db = get_db()
-    now = datetime.datetime.utcnow()
+def _sync_promoted_dishes(dish_ids, now):
+    """
+    Set is_promoted and promotion_level of dishes from their running promotions, in one bulk write.
     
-    # Find expired promotions
-    expired = list(db.promotions.find({
-        "is_active": True,
-        "end_date": {"$lt": now}
-    }))
-    
-    # Update promotion status
-    db.promotions.update_many(
-        {"_id": {"$in": [p["_id"] for p in expired]}},
-        {"$set": {"is_active": False, "updated_at": now}}
-    )
+    A dish keeps the highest level among its promotions that are still
+    running, so expiring one of several promotions does not unpromote it.
+    """
+    db = get_db()
+    dish_ids = [dish_id for dish_id in dish_ids if dish_id and ObjectId.is_valid(dish_id)]
+    if not dish_ids:
+        return
     
-    # Update dish promotion status
-    for promotion in expired:
-        db.dishes.update_one(
-            {"_id": ObjectId(promotion["dish_id"])},
+    running = db.promotions.aggregate([
+        {"$match": {
+            "dish_id": {"$in": dish_ids},
+            "is_active": True,
+            "started": {"$ne": False},
+            "end_date": {"$gte": now}
+        }},
+        {"$group": {"_id": "$dish_id", "level": {"$max": "$level"}}}
+    ])
+    levels = {result["_id"]: result["level"] for result in running}
+    db.dishes.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(dish_id)},
             {"$set": {
-                "is_promoted": False,
-                "promotion_level": 0,
+                "is_promoted": dish_id in levels,
+                "promotion_level": levels.get(dish_id, 0),
                 "updated_at": now
             }}
         )
+        for dish_id in dish_ids
+    ], ordered=False)
+    invalidate_entities("dishes", dish_ids)
+
+def _process_promotions(query, update, batch_size, now):
+    """Apply an update to the promotions matching query in batches; returns (count, dish ids)."""
+    db = get_db()
+    count = 0
+    dish_ids = set()
+    while True:
+        batch = list(db.promotions.find(query, {"dish_id": 1}).limit(batch_size))
+        if not batch:
+            break
+        # El filtro repite la condición: si otro proceso ya la cambió no se cuenta dos veces
+        result = db.promotions.update_many(
+            dict(query, _id={"$in": [promotion["_id"] for promotion in batch]}),
+            {"$set": dict(update, updated_at=now)}
+        )
+        count += result.modified_count
+        batch_dishes = {promotion.get("dish_id") for promotion in batch}
+        _sync_promoted_dishes(batch_dishes, now)
+        dish_ids.update(dish_id for dish_id in batch_dishes if dish_id)
+        if len(batch) < batch_size:
+            break
+    return count, dish_ids
+
+def deactivate_expired_promotions(batch_size=PROMOTION_BATCH_SIZE, now=None):
+    """
+    Deactivate the promotions whose end_date has passed and update their dishes.
     
-    return len(expired)
\ No newline at end of file
+    Returns:
+        A tuple (number of promotions deactivated, set of affected dish ids)
+    """
+    now = now or datetime.datetime.utcnow()
+    return _process_promotions(
+        {"is_active": True, "end_date": {"$lt": now}},
+        {"is_active": False},
+        batch_size,
+        now
+    )
+
+def activate_started_promotions(batch_size=PROMOTION_BATCH_SIZE, now=None):
+    """
+    Apply to their dishes the scheduled promotions whose start_date has arrived.
+    
+    Returns:
+        A tuple (number of promotions started, set of affected dish ids)
+    """
+    now = now or datetime.datetime.utcnow()
+    return _process_promotions(
+        {"is_active": True, "started": False, "start_date": {"$lte": now}},
+        {"started": True},
+        batch_size,
+        now
+    )
+
+# Locks compartidos entre procesos para tareas periódicas
+def acquire_lease(name, owner, seconds):
+    """
+    Take (or renew) a named lease for a number of seconds.
+    
+    Returns:
+        True if owner holds the lease, False if another owner does
+    """
+    db = get_db()
+    now = datetime.datetime.utcnow()
+    try:
+        db.leases.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + datetime.timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # El lease existe, no ha caducado y es de otro
+        return False
+    return True
+
+# Platos cuyo documento de búsqueda quedó sin actualizar tras un cambio de
+# promoción; el planificador los reintenta en cada pasada (ver promotion_service)
+def add_pending_dish_reindex(dish_ids):
+    """Remember dishes whose search documents still have to be refreshed."""
+    dish_ids = [dish_id for dish_id in dish_ids if dish_id]
+    if not dish_ids:
+        return
+    now = datetime.datetime.utcnow()
+    get_db().pending_dish_reindex.bulk_write([
+        UpdateOne({"_id": dish_id}, {"$setOnInsert": {"created_at": now}}, upsert=True)
+        for dish_id in dish_ids
+    ], ordered=False)
+
+def get_pending_dish_reindex():
+    """Ids of the dishes waiting to be refreshed in the search index."""
+    return {pending["_id"] for pending in get_db().pending_dish_reindex.find({}, {"_id": 1})}
+
+def clear_pending_dish_reindex(dish_ids):
+    """Forget dishes whose search documents are up to date again."""
+    dish_ids = list(dish_ids)
+    if dish_ids:
+        get_db().pending_dish_reindex.delete_many({"_id": {"$in": dish_ids}})
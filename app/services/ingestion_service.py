@@ -0,0 +1,350 @@
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, current_app
+from bson.objectid import ObjectId
+import datetime
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from app.services.db_service import (
+    get_restaurant, get_menu, get_dishes_by_ids, create_menu, update_menu, create_dishes,
+    create_ingestion_job, claim_ingestion_job, complete_ingestion_job,
+    fail_ingestion_job, requeue_stale_ingestion_jobs, record_ingestion_output,
+    discard_ingestion_output, get_overdue_ingestion_job_ids, acquire_lease, find_ingestion_job,
+    renew_ingestion_job_heartbeat
+)
+from app.services.blob_service import open_pdf
+from app.services.pdf_service import extract_menu_cached
+from app.services.search_service import (
+    index_menu_with_dishes, flush_index_queue, get_queued_document_ids, init_search_service
+)
+
+logger = logging.getLogger(__name__)
+
+_RECOVERY_LEASE_NAME = "ingestion-recovery"
+
+# Pool de procesos (uno por worker de gunicorn) y la app usada dentro de cada proceso hijo
+_executor = None
+_executor_lock = threading.Lock()
+_worker_app = None
+
+def ingest_menu(job):
+    """
+    Extract, persist and index a menu whose PDF is already in blob storage.
+    
+    Safe to retry: the menu and dishes are tagged with the job id and
+    recorded on the job before indexing. A retry after that point only
+    indexes them again; a retry before it deletes the partial writes of the
+    previous attempt and starts over.
+    
+    Args:
+        job: The ingestion job document (restaurant_id, menu_type, date, price,
+             pdf_url, content_hash and, after a previous attempt, output)
+    
+    Returns:
+        A dictionary with the created menu id and dish ids
+    
+    Raises:
+        RuntimeError: If the search indexer did not deliver the menu or its
+            dishes, so the job is retried
+    """
+    job_id = str(job["_id"])
+    restaurant_id = job["restaurant_id"]
+    restaurant_data = get_restaurant(restaurant_id, fresh=True)
+    
+    output = job.get("output")
+    if output:
+        # Un intento anterior ya guardó el menú y los platos: solo falta indexarlos
+        menu_id, dish_ids = output["menu_id"], output["dish_ids"]
+        menu_data = get_menu(menu_id)
+        if menu_data is None:
+            # Borrado entre intentos: no queda nada que indexar
+            return {"menu_id": menu_id, "dish_ids": dish_ids}
+        dishes_by_id = get_dishes_by_ids(dish_ids)
+        dishes_data = [dishes_by_id[dish_id] for dish_id in dish_ids if dish_id in dishes_by_id]
+    else:
+        menu_data, dishes_data = _store_menu(job_id, job, restaurant_id)
+        menu_id, dish_ids = str(menu_data['_id']), menu_data['dishes']
+    
+    # Index dishes and menu in a single batch
+    index_menu_with_dishes(menu_data, dishes_data, restaurant_data)
+    
+    # Los procesos del pool no ejecutan atexit: vaciamos la cola antes de terminar
+    flush_index_queue()
+    
+    # Lo que el indexador no entregó se vuelve a indexar en el reintento del trabajo
+    doc_ids = {f"menu_{menu_id}"} | {f"dish_{dish_id}" for dish_id in dish_ids}
+    undelivered = doc_ids & get_queued_document_ids()
+    if undelivered:
+        raise RuntimeError(f"{len(undelivered)} search documents of menu {menu_id} did not reach the index")
+    
+    return {"menu_id": menu_id, "dish_ids": dish_ids}
+
+def _store_menu(job_id, job, restaurant_id):
+    """Extract the PDF and create the menu and its dishes; returns (menu_data, dishes_data)."""
+    # El PDF solo se descarga si no hay extracción previa del mismo contenido
+    extracted_menu = extract_menu_cached(job["content_hash"], lambda: open_pdf(job["pdf_url"]))
+    
+    # Restos de un intento que falló antes de registrar su resultado
+    discard_ingestion_output(job_id)
+    
+    # Create menu in database
+    menu_data = {
+        "restaurant_id": restaurant_id,
+        "menu_type": job.get("menu_type"),
+        "date": job.get("menu_date"),
+        "pdf_url": job["pdf_url"],
+        "menu_restrictions": extracted_menu.get("menu_restrictions", []),
+        "price": job.get("price"),
+        "ingestion_job_id": job_id
+    }
+    
+    menu_id = create_menu(menu_data)
+    
+    # Create dishes from extracted menu
+    dishes_data = [
+        {
+            "restaurant_id": restaurant_id,
+            "name": dish_info.get("name"),
+            "description": "",
+            "price": dish_info.get("price"),
+            "category": dish_info.get("category"),
+            "restrictions": extracted_menu.get("menu_restrictions", []),
+            "is_promoted": False,
+            "promotion_level": 0,
+            "ingestion_job_id": job_id
+        }
+        for dish_info in extracted_menu.get("dishes", [])
+    ]
+    
+    # insert_many rellena el '_id' de cada plato
+    dish_ids = create_dishes(dishes_data)
+    
+    # Update menu with dish IDs
+    update_menu(menu_id, {"dishes": dish_ids})
+    record_ingestion_output(job_id, menu_id, dish_ids)
+    
+    menu_data['_id'] = ObjectId(menu_id)
+    menu_data['dishes'] = dish_ids
+    return menu_data, dishes_data
+
+def _init_worker():
+    """Process-pool initializer: import pdfminer and build the app once per process."""
+    global _worker_app
+    import pdfminer.high_level  # noqa: F401  (se importa una sola vez por proceso)
+    
+    _worker_app = Flask('app')
+    _worker_app.config.from_object('app.config.Config')
+    init_search_service(_worker_app)
+
+def run_job(job_id=None):
+    """
+    Claim and run one ingestion job inside a worker process.
+    
+    Args:
+        job_id: Optional job to run; otherwise the oldest due job is taken
+    
+    Returns:
+        A tuple (job_id, status) where status is 'done', 'queued' (retry
+        scheduled), 'failed' or None if there was nothing to run
+    """
+    if _worker_app is None:
+        _init_worker()
+    
+    with _worker_app.app_context():
+        return _process_job(job_id)
+
+def _process_job(job_id=None):
+    job = claim_ingestion_job(job_id)
+    if job is None:
+        return job_id, None
+    job_id = str(job["_id"])
+    
+    try:
+        result = _ingest_with_heartbeat(job)
+    except Exception as e:
+        error = f"{str(e)}\n{traceback.format_exc()}"
+        max_attempts = current_app.config.get('INGESTION_MAX_ATTEMPTS', 3)
+        if job["attempts"] < max_attempts:
+            # Reintento con espera exponencial
+            delay = current_app.config.get('INGESTION_RETRY_DELAY_SECONDS', 10) * 2 ** (job["attempts"] - 1)
+            retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+            fail_ingestion_job(job_id, error, retry_at)
+            return job_id, "queued"
+        fail_ingestion_job(job_id, error)
+        return job_id, "failed"
+    
+    complete_ingestion_job(job_id, result)
+    return job_id, "done"
+
+def _ingest_with_heartbeat(job):
+    """
+    Run ingest_menu while a background thread renews the job's heartbeat.
+    
+    Recovery only requeues running jobs whose heartbeat expired
+    (INGESTION_STALE_SECONDS), so a long ingestion is not run twice.
+    """
+    app = current_app._get_current_object()
+    job_id, attempts = str(job["_id"]), job["attempts"]
+    interval = app.config.get('INGESTION_HEARTBEAT_SECONDS', 30)
+    stop = threading.Event()
+    
+    def beat():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    if not renew_ingestion_job_heartbeat(job_id, attempts):
+                        return
+                except Exception as e:
+                    logger.error(f"Could not renew heartbeat of ingestion job {job_id}: {str(e)}")
+    
+    threading.Thread(target=beat, name=f"ingestion-heartbeat-{job_id}", daemon=True).start()
+    try:
+        return ingest_menu(job)
+    finally:
+        stop.set()
+
+def get_executor():
+    """Return this process' ingestion pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # 'spawn' evita heredar hilos y sockets del worker web
+                _executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('INGESTION_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+    return _executor
+
+def _submit(job_id, delay=0, retry_delay=10):
+    def submit():
+        future = get_executor().submit(run_job, job_id)
+        future.add_done_callback(lambda f: _on_job_done(f, retry_delay))
+    
+    if delay:
+        timer = threading.Timer(delay, submit)
+        timer.daemon = True
+        timer.start()
+    else:
+        submit()
+
+def _on_job_done(future, retry_delay):
+    try:
+        job_id, status = future.result()
+    except Exception:
+        # El proceso murió; recover_ingestion_jobs (o run_worker) lo recuperará
+        return
+    if status == "queued":
+        # Margen de un segundo para que next_attempt_at ya haya vencido
+        _submit(job_id, delay=retry_delay + 1, retry_delay=retry_delay * 2)
+
+def enqueue_menu_ingestion(restaurant_id, pdf_url, content_hash, menu_type=None,
+                           menu_date=None, price=None):
+    """
+    Create an ingestion job for an uploaded menu and hand it to the worker pool.
+    
+    Uploading the same PDF again with the same menu details reuses the job
+    of the previous upload while it is pending, or while the menu it
+    created still exists, instead of creating the menu and dishes twice.
+    
+    Returns:
+        The job id
+    """
+    previous = find_ingestion_job(restaurant_id, content_hash, menu_type, menu_date, price)
+    if previous is not None:
+        menu_id = (previous.get("result") or {}).get("menu_id")
+        menu_data = get_menu(menu_id, fresh=True) if menu_id else None
+        # Pendiente, o terminado con su menú aún activo: ya cubre esta subida
+        if previous["status"] != "done" or (menu_data is not None and menu_data.get("active", True)):
+            return str(previous["_id"])
+    
+    job_id = create_ingestion_job({
+        "restaurant_id": restaurant_id,
+        "pdf_url": pdf_url,
+        "content_hash": content_hash,
+        "menu_type": menu_type,
+        "menu_date": menu_date,
+        "price": price
+    })
+    
+    _dispatch(job_id)
+    return job_id
+
+def _dispatch(job_id):
+    """Run a queued job in this process' pool (or inline when INGESTION_ASYNC is off)."""
+    if current_app.config.get('INGESTION_ASYNC', True):
+        retry_delay = current_app.config.get('INGESTION_RETRY_DELAY_SECONDS', 10)
+        # get_executor necesita la app, así que se crea aquí y no en el Timer
+        get_executor()
+        _submit(job_id, retry_delay=retry_delay)
+    else:
+        _process_job(job_id)
+
+def recover_ingestion_jobs():
+    """
+    Requeue jobs abandoned by crashed processes and run the overdue ones here.
+    
+    A queued job is overdue when its retry timer died with the web worker
+    that scheduled it; claiming is atomic, so a job submitted twice runs once.
+    
+    Returns:
+        A tuple (requeued, dispatched)
+    """
+    config = current_app.config
+    requeued = requeue_stale_ingestion_jobs(config.get('INGESTION_STALE_SECONDS', 180))
+    job_ids = get_overdue_ingestion_job_ids(config.get('INGESTION_RECOVERY_SECONDS', 60))
+    for job_id in job_ids:
+        _dispatch(job_id)
+    return requeued, len(job_ids)
+
+def _run_recovery(app, interval):
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        with app.app_context():
+            try:
+                # Un solo proceso (el que tiene el lease) recupera los trabajos en cada pasada
+                if acquire_lease(_RECOVERY_LEASE_NAME, owner, interval * 2):
+                    requeued, dispatched = recover_ingestion_jobs()
+                    if requeued or dispatched:
+                        logger.info(f"Ingestion jobs: {requeued} requeued, {dispatched} dispatched")
+            except Exception as e:
+                logger.error(f"Error recovering ingestion jobs: {str(e)}")
+        time.sleep(interval)
+
+def init_ingestion_recovery(app):
+    """Recover abandoned and overdue ingestion jobs periodically in a background thread."""
+    interval = app.config.get('INGESTION_RECOVERY_SECONDS', 60)
+    threading.Thread(target=_run_recovery, args=(app, interval), name="ingestion-recovery", daemon=True).start()
+
+def shutdown_executor(wait=True):
+    """Stop the ingestion pool (e.g. from a gunicorn worker_exit hook)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+def run_worker(poll_interval=2):
+    """
+    Standalone worker loop: process due jobs until interrupted.
+    
+    Also picks up jobs whose retry was scheduled by a web worker that has
+    since exited, and requeues jobs abandoned by crashed processes.
+    """
+    _init_worker()
+    with _worker_app.app_context():
+        requeue_stale_ingestion_jobs(_worker_app.config.get('INGESTION_STALE_SECONDS', 180))
+    
+    while True:
+        _, status = run_job()
+        if status is None:
+            time.sleep(poll_interval)
+
+if __name__ == "__main__":
+    run_worker()
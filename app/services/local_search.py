@@ -0,0 +1,694 @@
+from collections import Counter
+import atexit
+import bisect
+import contextlib
+import functools
+import heapq
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un solo proceso)
+    fcntl = None
+
+# Campos de texto indexados y su peso en la puntuación
+SEARCHABLE_FIELDS = {
+    "name": 3.0,
+    "category": 1.5,
+    "cuisine_type": 1.5,
+    "ingredients": 1.0,
+    "restrictions": 1.0,
+    "description": 1.0,
+}
+
+# Campos con índice de valores para preseleccionar candidatos en los filtros
+KEYWORD_FIELDS = ("type", "restaurant_id")
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "o", "para", "por", "u", "un", "una", "unos", "unas", "y",
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# BM25
+K1 = 1.2
+B = 0.75
+
+INDEX_FORMAT_VERSION = 1
+
+def fold_text(text):
+    """Lowercase and strip accents (so 'Menú' and 'menu' are the same term)."""
+    text = unicodedata.normalize('NFKD', text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+def analyze(text):
+    """Split Spanish text into index terms: folded, without stopwords, singularized."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(fold_text(text)):
+        if token in STOPWORDS:
+            continue
+        # Plurales simples: paellas -> paella, tomates -> tomate
+        if len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+def _field_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value if v is not None)
+    return str(value)
+
+def parse_facet(expression):
+    """Split an Azure facet expression ('field,count:10', 'price,values:10|20') into (field, options)."""
+    field, *params = [part.strip() for part in expression.split(',')]
+    options = {}
+    for param in params:
+        name, _, value = param.partition(':')
+        options[name.strip()] = value.strip()
+    return field, options
+
+# --- Filtros OData (subconjunto usado por la aplicación) ---------------------
+
+_FILTER_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*')
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<comma>,)
+      | (?P<colon>:)
+      | (?P<word>[A-Za-z_][\w./]*)
+    )""", re.VERBOSE)
+
+_COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and b is not None and a > b,
+    "ge": lambda a, b: a is not None and b is not None and a >= b,
+    "lt": lambda a, b: a is not None and b is not None and a < b,
+    "le": lambda a, b: a is not None and b is not None and a <= b,
+}
+
+def _tokenize_filter(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _FILTER_TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid filter near: {expression[position:]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1].replace("''", "'")
+        elif kind == "number":
+            value = float(value) if '.' in value else int(value)
+        tokens.append((kind, value))
+        position = match.end()
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+    return tokens
+
+class _FilterParser:
+    """
+    Recursive-descent parser for OData filters into nested tuples.
+    
+    Supports ``and``/``or``/``not``, parentheses, ``eq ne gt ge lt le``,
+    ``search.in(field, 'a,b')`` and ``field/any(x: x eq 'v')``.
+    """
+    
+    def __init__(self, expression):
+        self.tokens = _tokenize_filter(expression)
+        self.position = 0
+    
+    def parse(self):
+        node = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected token in filter: {self.tokens[self.position][1]!r}")
+        return node
+    
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+    
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+    
+    def _expect(self, kind):
+        token = self._next()
+        if token[0] != kind:
+            raise ValueError(f"Expected {kind} in filter, got {token[1]!r}")
+        return token[1]
+    
+    def _keyword(self, word):
+        kind, value = self._peek()
+        if kind == "word" and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+    
+    def _or(self):
+        node = self._and()
+        while self._keyword("or"):
+            node = ("or", node, self._and())
+        return node
+    
+    def _and(self):
+        node = self._not()
+        while self._keyword("and"):
+            node = ("and", node, self._not())
+        return node
+    
+    def _not(self):
+        if self._keyword("not"):
+            return ("not", self._not())
+        return self._primary()
+    
+    def _literal(self):
+        kind, value = self._next()
+        if kind in ("string", "number"):
+            return value
+        if kind == "word" and value.lower() in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[value.lower()]
+        raise ValueError(f"Expected a literal in filter, got {value!r}")
+    
+    def _primary(self):
+        kind, value = self._peek()
+        if kind == "lparen":
+            self._next()
+            node = self._or()
+            self._expect("rparen")
+            return node
+        
+        field = self._expect("word")
+        if field.lower() == "search.in":
+            self._expect("lparen")
+            target = self._expect("word")
+            self._expect("comma")
+            values = self._expect("string")
+            separator = ","
+            if self._peek()[0] == "comma":
+                self._next()
+                separator = self._expect("string")
+            self._expect("rparen")
+            return ("in", target, {v.strip() for v in values.split(separator)})
+        
+        if field.endswith("/any") or field.endswith("/all"):
+            collection, quantifier = field.rsplit("/", 1)
+            self._expect("lparen")
+            variable = self._expect("word")
+            self._expect("colon")
+            inner = self._or()
+            self._expect("rparen")
+            return (quantifier, collection, variable, inner)
+        
+        operator = self._expect("word").lower()
+        if operator not in _COMPARISONS:
+            raise ValueError(f"Unsupported filter operator: {operator!r}")
+        return ("cmp", operator, field, self._literal())
+
+def parse_filter(expression):
+    """Parse an OData filter expression (None for no filter)."""
+    if not expression:
+        return None
+    return _FilterParser(expression).parse()
+
+def _compile(node):
+    """Turn a parsed filter into a predicate document -> bool."""
+    op = node[0]
+    if op == "and":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda document: left(document) and right(document)
+    if op == "or":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda document: left(document) or right(document)
+    if op == "not":
+        inner = _compile(node[1])
+        return lambda document: not inner(document)
+    if op == "cmp":
+        _, operator, field, literal = node
+        compare = _COMPARISONS[operator]
+        return lambda document: compare(document.get(field), literal)
+    if op == "in":
+        _, field, values = node
+        return lambda document: document.get(field) in values
+    if op in ("any", "all"):
+        _, collection, variable, inner = node
+        # Cada elemento se evalúa como un documento {variable: elemento}
+        element_check = _compile(inner)
+        check = any if op == "any" else all
+        return lambda document: check(
+            element_check({variable: item}) for item in (document.get(collection) or [])
+        )
+    raise ValueError(f"Unknown filter node: {op}")
+
+def _is_keyword_clause(node):
+    if node[0] == "cmp":
+        return node[1] == "eq" and node[2] in KEYWORD_FIELDS
+    return node[0] == "in" and node[1] in KEYWORD_FIELDS
+
+def _residual(node):
+    """Drop top-level keyword equalities, which the engine enforces through its value index."""
+    if node is None or _is_keyword_clause(node):
+        return None
+    if node[0] == "and":
+        left, right = _residual(node[1]), _residual(node[2])
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return ("and", left, right)
+    return node
+
+@functools.lru_cache(maxsize=256)
+def compile_filter(expression):
+    """
+    Parse and compile an OData filter (cached per expression).
+    
+    Returns:
+        A tuple (parsed filter, predicate for the clauses not covered by the value index)
+    """
+    node = parse_filter(expression)
+    residual = _residual(node)
+    return node, (_compile(residual) if residual is not None else None)
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock between processes on ``path`` (through a side .lock file)."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class LocalSearchEngine:
+    """
+    In-process inverted index with BM25 ranking.
+    
+    Implements the subset of Azure AI Search used by search_service:
+    merge-or-upload/delete of documents keyed by ``id``, full-text search
+    (any term matches, ``*`` matches everything) over SEARCHABLE_FIELDS,
+    OData filters, ``order_by``, paging, facets and field selection. Terms are
+    accent-folded, so 'menú' matches 'menu'.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._documents = {}      # doc number -> document
+        self._numbers = {}        # document id -> doc number
+        self._next_number = 0
+        self._postings = {}       # term -> {doc number: weighted term frequency}
+        self._doc_terms = {}      # doc number -> {term: weighted term frequency}
+        self._doc_lengths = {}    # doc number -> weighted length
+        self._total_length = 0.0
+        self._keyword_index = {field: {} for field in KEYWORD_FIELDS}
+        self._impact_cache = {}   # term -> BM25 weights (ver _impacts)
+        self.dirty = False
+        self.file_mtime = None    # mtime del fichero cargado o guardado por última vez
+        self._journal = []        # cambios desde entonces, para repetirlos sobre el fichero de otro proceso
+    
+    def __len__(self):
+        return len(self._documents)
+    
+    # Escritura -------------------------------------------------------------
+    
+    def merge_or_upload(self, documents):
+        """Insert documents or merge their fields into existing ones."""
+        with self._lock:
+            for document in documents:
+                number = self._numbers.get(document["id"])
+                if number is not None:
+                    merged = {**self._documents[number], **document}
+                    self._remove(number)
+                else:
+                    merged = dict(document)
+                    number = self._next_number
+                    self._next_number += 1
+                self._add(number, merged)
+            self._journal.append(("merge_or_upload", [dict(document) for document in documents]))
+            self.dirty = True
+    
+    def upload(self, documents):
+        """Insert or fully replace documents."""
+        with self._lock:
+            self.delete([document["id"] for document in documents])
+            self.merge_or_upload(documents)
+    
+    def delete(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                number = self._numbers.get(doc_id)
+                if number is not None:
+                    self._remove(number)
+            self._journal.append(("delete", list(doc_ids)))
+            self.dirty = True
+    
+    def _add(self, number, document):
+        terms = {}
+        for field, weight in SEARCHABLE_FIELDS.items():
+            for term in analyze(_field_text(document.get(field))):
+                terms[term] = terms.get(term, 0.0) + weight
+        
+        self._documents[number] = document
+        self._numbers[document["id"]] = number
+        self._doc_terms[number] = terms
+        length = sum(terms.values())
+        self._doc_lengths[number] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[number] = frequency
+            self._impact_cache.pop(term, None)
+        for field in KEYWORD_FIELDS:
+            value = document.get(field)
+            if value is not None:
+                self._keyword_index[field].setdefault(value, set()).add(number)
+    
+    def _remove(self, number):
+        document = self._documents.pop(number)
+        del self._numbers[document["id"]]
+        for term in self._doc_terms.pop(number):
+            self._impact_cache.pop(term, None)
+            postings = self._postings[term]
+            del postings[number]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(number)
+        for field in KEYWORD_FIELDS:
+            value = document.get(field)
+            numbers = self._keyword_index[field].get(value)
+            if numbers is not None:
+                numbers.discard(number)
+                if not numbers:
+                    del self._keyword_index[field][value]
+    
+    # Lectura ---------------------------------------------------------------
+    
+    def get_document(self, doc_id):
+        with self._lock:
+            number = self._numbers.get(doc_id)
+            return dict(self._documents[number]) if number is not None else None
+    
+    def _candidates(self, node):
+        """Doc numbers allowed by the keyword equalities of an 'and' filter (None = all)."""
+        if node is None:
+            return None
+        if node[0] == "and":
+            left, right = self._candidates(node[1]), self._candidates(node[2])
+            if left is None:
+                return right
+            if right is None:
+                return left
+            return left & right
+        if _is_keyword_clause(node):
+            index = self._keyword_index[node[1] if node[0] == "in" else node[2]]
+            if node[0] == "in":
+                return set().union(*(index.get(value, set()) for value in node[2]))
+            return index.get(node[3], set())
+        return None
+    
+    def _impacts(self, term):
+        """
+        BM25 weights of a term: (list of (weight, doc number) best first, dict doc number -> weight).
+        
+        Computed lazily and dropped whenever a document containing the term
+        changes, so single-term queries can stop after the first matches.
+        """
+        impacts = self._impact_cache.get(term)
+        if impacts is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return [], {}
+            total_docs = len(self._documents)
+            average_length = (self._total_length / total_docs) if total_docs else 1.0
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = K1 * (1 - B)
+            scale = K1 * B / average_length
+            doc_lengths = self._doc_lengths
+            weights = {
+                n: idf * f * (K1 + 1) / (f + norm + scale * doc_lengths[n])
+                for n, f in postings.items()
+            }
+            ranked = sorted(((w, n) for n, w in weights.items()), reverse=True)
+            impacts = (ranked, weights)
+            self._impact_cache[term] = impacts
+        return impacts
+    
+    def _matching(self, terms, candidates, predicate):
+        """Doc numbers containing any of the terms and passing the filter."""
+        pool = set().union(*(self._postings.get(term, {}).keys() for term in terms))
+        if candidates is not None:
+            pool &= candidates
+        if predicate is not None:
+            documents = self._documents
+            pool = {n for n in pool if predicate(documents[n])}
+        return pool
+    
+    def search(self, search_text="*", filter=None, order_by=None, top=50, skip=0,
+               include_total_count=False, select=None, facets=None):
+        """
+        Run a query against the index.
+        
+        Args:
+            search_text: Free text ('*' or empty matches every document)
+            filter: OData filter expression
+            order_by: List of 'field [asc|desc]' expressions (default: relevance)
+            top: Number of results to return
+            skip: Number of results to skip
+            include_total_count: Also count every matching document
+            select: Optional list of fields to return
+            facets: Optional list of Azure facet expressions
+        
+        Returns:
+            A tuple (results, count, facets); count and facets are None unless requested
+        """
+        node, predicate = compile_filter(filter) if filter else (None, None)
+        match_all = not search_text or search_text.strip() == "*"
+        terms = [] if match_all else list(dict.fromkeys(analyze(search_text)))
+        top = 50 if top is None else top
+        skip = skip or 0
+        wanted = skip + top
+        
+        with self._lock:
+            documents = self._documents
+            candidates = self._candidates(node)
+            count = None
+            
+            if len(terms) == 1 and not order_by:
+                # Un solo término: las entradas ya están ordenadas por relevancia
+                ranked = []
+                for weight, number in self._impacts(terms[0])[0]:
+                    if candidates is not None and number not in candidates:
+                        continue
+                    if predicate is not None and not predicate(documents[number]):
+                        continue
+                    ranked.append((number, weight))
+                    if len(ranked) >= wanted:
+                        break
+                matched = None
+                if facets or (include_total_count and (candidates is not None or predicate is not None)):
+                    matched = self._matching(terms, candidates, predicate)
+                if include_total_count:
+                    count = len(matched) if matched is not None else len(self._postings.get(terms[0], ()))
+                scores = dict(ranked)
+                ordered = [number for number, _ in ranked[skip:]]
+            else:
+                if match_all:
+                    pool = candidates if candidates is not None else documents.keys()
+                    scores = {n: 1.0 for n in pool if predicate is None or predicate(documents[n])}
+                else:
+                    scores = {}
+                    for term in terms:
+                        weights = self._impacts(term)[1]
+                        if not scores:
+                            scores = dict(weights)
+                            continue
+                        for number, weight in weights.items():
+                            scores[number] = scores.get(number, 0.0) + weight
+                    if candidates is not None or predicate is not None:
+                        allowed = self._matching(terms, candidates, predicate)
+                        scores = {n: score for n, score in scores.items() if n in allowed}
+                
+                matched = scores
+                count = len(scores) if include_total_count else None
+                if order_by:
+                    ordered = self._sorted(scores, order_by)[skip:wanted]
+                else:
+                    ordered = heapq.nlargest(wanted, scores.items(), key=lambda item: item[1])[skip:]
+                    ordered = [number for number, _ in ordered]
+            
+            results = []
+            for number in ordered:
+                document = documents[number]
+                if select:
+                    document = {field: document.get(field) for field in select}
+                else:
+                    document = dict(document)
+                document["@search.score"] = scores[number]
+                results.append(document)
+            
+            facet_results = self._facets(matched, facets) if facets else None
+        
+        return results, count, facet_results
+    
+    def _facets(self, numbers, expressions):
+        """
+        Count values of the matching documents the way Azure returns facets.
+        
+        Value facets give [{"value", "count"}] (collections count each distinct
+        value once per document); 'values:a|b' facets give range buckets
+        [{"to"}, {"from", "to"}, ..., {"from"}] with inclusive lower bounds.
+        """
+        documents = self._documents
+        facets = {}
+        for expression in expressions:
+            field, options = parse_facet(expression)
+            if "values" in options:
+                bounds = [float(value) for value in options["values"].split('|')]
+                counts = [0] * (len(bounds) + 1)
+                for number in numbers:
+                    value = documents[number].get(field)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        counts[bisect.bisect_right(bounds, value)] += 1
+                buckets = []
+                for position, count in enumerate(counts):
+                    bucket = {"count": count}
+                    if position > 0:
+                        bucket["from"] = bounds[position - 1]
+                    if position < len(bounds):
+                        bucket["to"] = bounds[position]
+                    buckets.append(bucket)
+                facets[field] = buckets
+                continue
+            
+            counter = Counter()
+            for number in numbers:
+                value = documents[number].get(field)
+                if isinstance(value, (list, tuple)):
+                    counter.update({v for v in value if v is not None})
+                elif value is not None:
+                    counter[value] += 1
+            limit = int(options.get("count", 10))
+            if options.get("sort") == "value":
+                values = sorted(counter.items())[:limit]
+            else:
+                values = counter.most_common(limit)
+            facets[field] = [{"value": value, "count": count} for value, count in values]
+        return facets
+    
+    def _sorted(self, scores, order_by):
+        numbers = list(scores)
+        # Ordenación estable: se aplica de la última clave a la primera
+        for expression in reversed(order_by):
+            parts = expression.split()
+            field = parts[0]
+            descending = len(parts) > 1 and parts[1].lower() == "desc"
+            if field == "search.score()":
+                numbers.sort(key=lambda n: scores[n], reverse=descending)
+                continue
+            documents = self._documents
+            present = [n for n in numbers if documents[n].get(field) is not None]
+            missing = [n for n in numbers if documents[n].get(field) is None]
+            present.sort(key=lambda n: documents[n][field], reverse=descending)
+            # Como en Azure, los nulos van al final en orden descendente y al principio en ascendente
+            numbers = present + missing if descending else missing + present
+        return numbers
+    
+    # Persistencia ------------------------------------------------------------
+    
+    def autosave(self, path, interval=30):
+        """Save the index every ``interval`` seconds when it changed, and at exit."""
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.dirty:
+                    self.save(path)
+        
+        threading.Thread(target=run, name="local-search-autosave", daemon=True).start()
+        atexit.register(lambda: self.dirty and self.save(path))
+    
+    def save(self, path):
+        """
+        Write the index to disk atomically.
+        
+        Several processes may share the file. If another one saved it since
+        this engine last loaded or saved it, its version is loaded and the
+        changes made here are applied on top before writing, so neither
+        process loses the other's documents.
+        """
+        with self._lock, _file_lock(path):
+            if os.path.exists(path) and os.path.getmtime(path) != self.file_mtime:
+                journal = self._journal
+                self.replace_with(LocalSearchEngine.load(path))
+                for action, arguments in journal:
+                    getattr(self, action)(arguments)
+            
+            state = {
+                "version": INDEX_FORMAT_VERSION,
+                "documents": self._documents,
+                "next_number": self._next_number,
+                "postings": self._postings,
+                "doc_terms": self._doc_terms,
+                "doc_lengths": self._doc_lengths,
+                "total_length": self._total_length,
+                "keyword_index": self._keyword_index,
+            }
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+                pickle.dump(state, temp, protocol=pickle.HIGHEST_PROTOCOL)
+                temp_name = temp.name
+            os.replace(temp_name, path)
+            self.dirty = False
+            self._journal = []
+            self.file_mtime = os.path.getmtime(path)
+    
+    def replace_with(self, other):
+        """Swap in the contents of another engine (used to pick up a reloaded index)."""
+        with self._lock:
+            for name in ("_documents", "_numbers", "_next_number", "_postings", "_doc_terms",
+                         "_doc_lengths", "_total_length", "_keyword_index", "_impact_cache",
+                         "file_mtime"):
+                setattr(self, name, getattr(other, name))
+            self.dirty = False
+            self._journal = []
+    
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save(); returns an empty engine if the file is missing or stale."""
+        engine = cls()
+        if not os.path.exists(path):
+            return engine
+        file_mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get("version") != INDEX_FORMAT_VERSION:
+            return engine
+        
+        engine._documents = state["documents"]
+        engine._numbers = {document["id"]: number for number, document in engine._documents.items()}
+        engine._next_number = state["next_number"]
+        engine._postings = state["postings"]
+        engine._doc_terms = state["doc_terms"]
+        engine._doc_lengths = state["doc_lengths"]
+        engine._total_length = state["total_length"]
+        engine._keyword_index = state["keyword_index"]
+        engine._impact_cache = {}
+        engine.file_mtime = file_mtime
+        return engine
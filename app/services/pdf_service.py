@@ -1,107 +1,293 @@
-from pdfminer.high_level import extract_text
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTContainer, LTText, LTTextBox
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
 import re
-from flask import current_app
+from flask import current_app, has_app_context
+from app.services.db_service import get_menu_extraction, save_menu_extraction
 import json
-import tempfile
+import time
 
-def extract_text_from_pdf(pdf_file):
+# Cambiar al modificar el parser para invalidar las extracciones cacheadas
+PARSER_VERSION = 2
+
+def _pdf_limit(name, value, default):
+    if value is not None:
+        return value
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+class _BudgetExceeded(Exception):
+    pass
+
+class _BudgetedAggregator(PDFPageAggregator):
     """
-    Extract text from a PDF file.
+    Layout device that aborts a page as soon as a budget runs out.
+    
+    pdfminer interprets a whole page before handing it over, so checking
+    the budget between pages lets a single huge page run unbounded. The
+    checks here run while the page is drawn: the deadline every few
+    hundred glyphs and path operations, and a cap on the glyphs of one
+    page, which also bounds the layout analysis done when the page ends.
+    """
+    
+    CHECK_EVERY = 256
+    
+    def __init__(self, resource_manager, laparams, deadline, max_page_chars):
+        super().__init__(resource_manager, laparams=laparams)
+        self.deadline = deadline
+        self.max_page_chars = max_page_chars
+        self.page_chars = 0
+        self._operations = 0
+    
+    def begin_page(self, page, ctm):
+        self.page_chars = 0
+        super().begin_page(page, ctm)
+    
+    def _check(self):
+        self._operations += 1
+        if self._operations % self.CHECK_EVERY == 0 and time.monotonic() > self.deadline:
+            raise _BudgetExceeded("time")
+    
+    def render_char(self, *args, **kwargs):
+        self.page_chars += 1
+        if self.page_chars > self.max_page_chars:
+            raise _BudgetExceeded("page characters")
+        self._check()
+        return super().render_char(*args, **kwargs)
+    
+    def paint_path(self, *args, **kwargs):
+        self._check()
+        return super().paint_path(*args, **kwargs)
+
+def _layout_text(item, parts):
+    """Collect the text of a layout item like pdfminer's TextConverter (used by extract_text)."""
+    # Recorre todo el árbol: el texto dentro de figuras (LTFigure) no está en cajas de texto
+    if isinstance(item, LTContainer):
+        for child in item:
+            _layout_text(child, parts)
+    elif isinstance(item, LTText):
+        parts.append(item.get_text())
+    if isinstance(item, LTTextBox):
+        parts.append("\n")
+
+def iter_pdf_pages(pdf_file, max_pages=None, max_seconds=None, max_chars=None, max_page_chars=None):
+    """
+    Yield the text of a PDF page by page, straight from the file object.
+    
+    Extraction stops (with a warning) once the page, time or text budget is
+    exhausted, so pathological PDFs cannot pin a worker. The time and
+    per-page budgets are also enforced while a page is being laid out; a
+    page cut short is dropped.
     
     Args:
-        pdf_file: A file-like object containing the PDF
+        pdf_file: A seekable file-like object containing the PDF
+        max_pages: Maximum number of pages to read (PDF_MAX_PAGES)
+        max_seconds: Time budget for the whole document (PDF_MAX_SECONDS)
+        max_chars: Maximum amount of extracted text (PDF_MAX_TEXT_CHARS)
+        max_page_chars: Maximum characters drawn on one page (PDF_MAX_PAGE_CHARS)
     
-    Returns:
-        The extracted text
+    Yields:
+        The text of each page, as pdfminer.high_level.extract_text lays it
+        out (ending with a form feed)
     """
-    # Create a temporary file to save the PDF
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=True) as temp:
-        # Write the PDF content to the temporary file
-        pdf_file.seek(0)
-        temp.write(pdf_file.read())
-        temp.flush()
+    max_pages = _pdf_limit('PDF_MAX_PAGES', max_pages, 50)
+    max_seconds = _pdf_limit('PDF_MAX_SECONDS', max_seconds, 20)
+    max_chars = _pdf_limit('PDF_MAX_TEXT_CHARS', max_chars, 500000)
+    max_page_chars = _pdf_limit('PDF_MAX_PAGE_CHARS', max_page_chars, 50000)
+    
+    stream = getattr(pdf_file, 'stream', pdf_file)
+    stream.seek(0)
+    
+    start = time.monotonic()
+    # Mismo recorrido que pdfminer.high_level.extract_pages, con un dispositivo que corta a mitad de página
+    resource_manager = PDFResourceManager(caching=True)
+    device = _BudgetedAggregator(resource_manager, LAParams(), start + max_seconds, max_page_chars)
+    interpreter = PDFPageInterpreter(resource_manager, device)
+    
+    total_chars = 0
+    exhausted = None
+    for page_number, page in enumerate(PDFPage.get_pages(stream, maxpages=max_pages)):
+        try:
+            interpreter.process_page(page)
+        except _BudgetExceeded as e:
+            exhausted = f"{e} budget exhausted on page {page_number + 1}"
+            break
         
-        # Extract text from the PDF
-        text = extract_text(temp.name)
+        parts = []
+        _layout_text(device.get_result(), parts)
+        parts.append("\f")
+        page_text = "".join(parts)
+        total_chars += len(page_text)
+        yield page_text
+        
+        if time.monotonic() - start > max_seconds or total_chars > max_chars:
+            exhausted = f"budget exhausted after {page_number + 1} pages"
+            break
     
-    return text
+    if exhausted and has_app_context():
+        current_app.logger.warning(
+            f"PDF extraction {exhausted} ({total_chars} chars, {time.monotonic() - start:.1f}s)"
+        )
 
-def extract_menu_from_pdf(pdf_file):
+def extract_text_from_pdf(pdf_file, max_pages=None):
     """
-    Extract menu information from a PDF file.
+    Extract text from a PDF file.
     
     Args:
         pdf_file: A file-like object containing the PDF
+        max_pages: Optional maximum number of pages to read
     
     Returns:
-        A dictionary containing menu information
+        The extracted text
     """
-    text = extract_text_from_pdf(pdf_file)
-    
-    # Dictionary to store the extracted menu
-    menu = {
-        "dishes": [],
-        "menu_restrictions": []
-    }
+    return "".join(iter_pdf_pages(pdf_file, max_pages=max_pages))
+
+# Patrones precompilados del parser de menús
+PRICE_PATTERN = re.compile(r"(\d+[.,]\d{2})[\s€$]")
+NOISE_PATTERN = re.compile(r"^[\d\s,.;:!?]+$")
+RESTRICTION_PATTERNS = {
+    "vegetarian": re.compile(r"vegetari[ao]n[ao]?s?", re.IGNORECASE),
+    "vegan": re.compile(r"vegan[ao]?s?", re.IGNORECASE),
+    "gluten-free": re.compile(r"(sin gluten|gluten[ -]free)", re.IGNORECASE),
+    "lactose-free": re.compile(r"(sin lactosa|lactose[ -]free)", re.IGNORECASE)
+}
+
+def _any_pattern(patterns):
+    """Compile a single alternation used to pre-filter lines for several patterns."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p.pattern})" for p in patterns.values()), re.IGNORECASE)
+
+def _iter_page_lines(pages):
+    """Split a stream of page texts into a list of lines per page, joining lines cut at page boundaries."""
+    pending = ""
+    for page_text in pages:
+        lines = (pending + page_text).split('\n')
+        pending = lines.pop()
+        yield lines
+    yield [pending]
+
+def parse_menu_text(pages, max_idle_pages=0):
+    """
+    Parse menu text in a single pass.
     
-    # Look for price patterns
-    price_pattern = r"(\d+[.,]\d{2})[\s€$]"
-    prices = re.findall(price_pattern, text)
+    Categories, dishes, prices and restrictions are detected in one sweep
+    over the lines; lines for the fallback (menus without prices) are
+    collected along the way instead of re-reading the text.
     
-    # Look for menu restrictions
-    restriction_patterns = {
-        "vegetarian": r"vegetari[ao]n[ao]?s?",
-        "vegan": r"vegan[ao]?s?",
-        "gluten-free": r"(sin gluten|gluten[ -]free)",
-        "lactose-free": r"(sin lactosa|lactose[ -]free)"
-    }
+    Args:
+        pages: The menu text, either a string or an iterable of page texts
+        max_idle_pages: Once dishes were found, stop reading after this many
+            consecutive pages without new dishes (0 reads every page). With
+            a lazy iterable of pages the remaining pages are never extracted
+            (restrictions mentioned only on those pages are not detected).
     
-    for restriction, pattern in restriction_patterns.items():
-        if re.search(pattern, text, re.IGNORECASE):
-            menu["menu_restrictions"].append(restriction)
+    Returns:
+        A dictionary containing menu information
+    """
+    if isinstance(pages, str):
+        pages = [pages]
     
-    # Extract dishes using some heuristics
-    lines = text.split('\n')
+    dishes = []
+    fallback_lines = []
+    pending_restrictions = dict(RESTRICTION_PATTERNS)
+    any_restriction = _any_pattern(pending_restrictions)
+    found_restrictions = set()
     current_category = None
+    price_search = PRICE_PATTERN.search
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Check if this is a category header
-        if line.isupper() or (len(line) < 30 and not re.search(price_pattern, line)):
-            current_category = line
-            continue
-        
-        # Look for dish patterns (name followed by price)
-        dish_match = re.search(r"(.*?)(\d+[.,]\d{2})[\s€$]", line)
-        if dish_match:
-            dish_name = dish_match.group(1).strip()
-            dish_price = float(dish_match.group(2).replace(',', '.'))
-            
-            # Add to dishes list
-            menu["dishes"].append({
-                "name": dish_name,
-                "price": dish_price,
-                "category": current_category
-            })
-    
-    # If no dish was found, try a more general approach
-    if not menu["dishes"]:
-        for line in lines:
+    idle_pages = 0
+    for page_lines in _iter_page_lines(pages):
+        found_before = len(dishes)
+        for line in page_lines:
             line = line.strip()
             if not line:
                 continue
             
-            # Skip very short lines and lines with only numbers or punctuation
-            if len(line) < 3 or re.match(r"^[\d\s,.;:!?]+$", line):
+            # Una sola búsqueda por línea; solo se detalla si hay coincidencia
+            if any_restriction is not None and any_restriction.search(line):
+                for restriction, pattern in list(pending_restrictions.items()):
+                    if pattern.search(line):
+                        found_restrictions.add(restriction)
+                        del pending_restrictions[restriction]
+                any_restriction = _any_pattern(pending_restrictions)
+            
+            if not dishes and len(line) >= 3:
+                fallback_lines.append(line)
+            
+            # Check if this is a category header
+            if line.isupper():
+                current_category = line
                 continue
             
-            menu["dishes"].append({
-                "name": line,
-                "price": None,
-                "category": None
+            # The first price in the line separates the dish name from its price
+            price_match = price_search(line)
+            if price_match is None:
+                if len(line) < 30:
+                    current_category = line
+                continue
+            
+            dishes.append({
+                "name": line[:price_match.start()].strip(),
+                "price": float(price_match.group(1).replace(',', '.')),
+                "category": current_category
             })
+        
+        # Menús largos: las últimas páginas suelen ser alérgenos o condiciones
+        if max_idle_pages and dishes:
+            idle_pages = 0 if len(dishes) > found_before else idle_pages + 1
+            if idle_pages >= max_idle_pages:
+                break
+    
+    # If no dish was found, use every meaningful line as a dish name
+    if not dishes:
+        dishes = [
+            {"name": line, "price": None, "category": None}
+            for line in fallback_lines if not NOISE_PATTERN.match(line)
+        ]
+    
+    return {
+        "dishes": dishes,
+        "menu_restrictions": [r for r in RESTRICTION_PATTERNS if r in found_restrictions]
+    }
+
+def extract_menu_from_pdf(pdf_file):
+    """
+    Extract menu information from a PDF file.
+    
+    Args:
+        pdf_file: A file-like object containing the PDF
+    
+    Returns:
+        A dictionary containing menu information
+    """
+    return parse_menu_text(iter_pdf_pages(pdf_file), _pdf_limit('PDF_EARLY_STOP_PAGES', None, 2))
+
+def extract_menu_cached(content_hash, open_pdf_file):
+    """
+    Extract menu information, reusing a previous result for identical bytes.
+    
+    The PDF is only opened (downloaded, for blobs) when there is no previous
+    result for its content.
+    
+    Args:
+        content_hash: SHA-256 of the file contents
+        open_pdf_file: Function returning a file-like object with the PDF;
+            the file is closed after the extraction
+    
+    Returns:
+        A dictionary containing menu information
+    """
+    cached = get_menu_extraction(content_hash, PARSER_VERSION)
+    if cached is not None:
+        return cached
     
-    return menu
\ No newline at end of file
+    pdf_file = open_pdf_file()
+    try:
+        menu = extract_menu_from_pdf(pdf_file)
+    finally:
+        pdf_file.close()
+    save_menu_extraction(content_hash, PARSER_VERSION, menu)
+    return menu
@@ -0,0 +1,93 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from app.services.db_service import (
+    PROMOTION_BATCH_SIZE, acquire_lease, activate_started_promotions,
+    deactivate_expired_promotions, get_dishes_by_ids, add_pending_dish_reindex,
+    get_pending_dish_reindex, clear_pending_dish_reindex
+)
+from app.services.reindex_service import RestaurantLookup, build_documents
+from app.services.search_service import index_documents, flush_index_queue, get_queued_document_ids
+
+logger = logging.getLogger(__name__)
+
+# Un solo proceso (el que tiene el lease) ejecuta cada pasada del planificador
+_LEASE_NAME = "promotion-scheduler"
+
+def _reindex_dishes(dish_ids, batch_size):
+    """
+    Refresh the search documents of dishes whose promotion status changed.
+    
+    Returns:
+        The ids of the dishes whose documents did not reach the index (still
+        queued in the background indexer after the flush)
+    """
+    dish_ids = list(dish_ids)
+    lookup = RestaurantLookup()
+    for start in range(0, len(dish_ids), batch_size):
+        dishes = [
+            dish for dish in get_dishes_by_ids(dish_ids[start:start + batch_size]).values()
+            if dish.get("active") is not False
+        ]
+        index_documents(build_documents("dishes", dishes, lookup))
+    flush_index_queue()
+    
+    queued = get_queued_document_ids()
+    return {dish_id for dish_id in dish_ids if f"dish_{dish_id}" in queued}
+
+def run_promotion_schedule(batch_size=PROMOTION_BATCH_SIZE):
+    """
+    Expire finished promotions, start the scheduled ones and update their dishes.
+    
+    Returns:
+        A dictionary with the number of promotions deactivated and activated,
+        the number of dishes updated, and the dishes reindexed and still
+        pending (retried on the next run)
+    """
+    start = time.perf_counter()
+    deactivated, expired_dishes = deactivate_expired_promotions(batch_size)
+    activated, started_dishes = activate_started_promotions(batch_size)
+    
+    # Se guardan antes de reindexar: si falla (o el proceso muere) la
+    # siguiente pasada los vuelve a intentar junto con los nuevos
+    dish_ids = expired_dishes | started_dishes
+    add_pending_dish_reindex(dish_ids)
+    pending = get_pending_dish_reindex()
+    failed = pending
+    if pending:
+        try:
+            failed = _reindex_dishes(pending, batch_size)
+        except Exception as e:
+            logger.error(f"Error reindexing promoted dishes: {str(e)}")
+        clear_pending_dish_reindex(pending - failed)
+    
+    return {
+        "deactivated": deactivated,
+        "activated": activated,
+        "dishes_updated": len(dish_ids),
+        "reindexed": len(pending - failed),
+        "reindex_pending": len(failed),
+        "elapsed_seconds": time.perf_counter() - start
+    }
+
+def _run(app, interval):
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        with app.app_context():
+            try:
+                if acquire_lease(_LEASE_NAME, owner, interval * 2):
+                    result = run_promotion_schedule()
+                    if result["deactivated"] or result["activated"]:
+                        logger.info(f"Promotions: {result['deactivated']} expired, "
+                                    f"{result['activated']} started")
+            except Exception as e:
+                logger.error(f"Error in promotion scheduler: {str(e)}")
+        time.sleep(interval)
+
+def init_promotion_scheduler(app):
+    """Expire and start promotions periodically in a background thread."""
+    interval = app.config.get('PROMOTION_SCHEDULER_SECONDS', 60)
+    threading.Thread(target=_run, args=(app, interval), name="promotion-scheduler", daemon=True).start()
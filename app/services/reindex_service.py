@@ -0,0 +1,296 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from flask import Flask, current_app
+import argparse
+import datetime
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.services.db_service import iter_collection_batches, get_restaurants_by_ids, get_dishes_by_ids
+from app.services.local_search import LocalSearchEngine
+from app.services.search_service import (
+    MAX_BATCH_SIZE, SCHEMA_VERSIONS, _restaurant_document, _dish_document, _menu_document,
+    _adapt_documents, _use_local_backend, get_configured_schema_version, get_search_admin_client,
+    get_search_client, create_search_index, swap_search_alias, resolve_search_alias,
+    get_index_statistics, invalidate_query_cache, init_search_service
+)
+
+logger = logging.getLogger(__name__)
+
+# Orden de reindexado: los restaurantes primero para llenar la caché de enriquecimiento
+COLLECTIONS = ("restaurants", "dishes", "menus")
+ACTIVE_QUERY = {"active": {"$ne": False}}
+RESTAURANT_LOOKUP_FIELDS = {"name": 1, "cuisine_type": 1, "location": 1}
+
+class RestaurantLookup:
+    """
+    Restaurant data used to enrich dishes and menus, loaded once per restaurant.
+    
+    Restaurants seen while reindexing their own collection are kept; the
+    ones missing for a batch of dishes or menus are fetched with one query.
+    """
+    
+    def __init__(self):
+        self._restaurants = {}
+        self.queries = 0
+    
+    def add(self, restaurant):
+        self._restaurants[str(restaurant["_id"])] = {
+            field: restaurant[field] for field in RESTAURANT_LOOKUP_FIELDS if field in restaurant
+        }
+    
+    def prefetch(self, restaurant_ids):
+        missing = {rid for rid in restaurant_ids if rid and rid not in self._restaurants}
+        if not missing:
+            return
+        self.queries += 1
+        found = get_restaurants_by_ids(missing, projection=RESTAURANT_LOOKUP_FIELDS)
+        for restaurant_id in missing:
+            self._restaurants[restaurant_id] = found.get(restaurant_id)
+    
+    def get(self, restaurant_id):
+        return self._restaurants.get(restaurant_id)
+
+def build_documents(collection, batch, lookup):
+    """Turn a batch of Mongo documents into search documents."""
+    if collection == "restaurants":
+        for restaurant in batch:
+            lookup.add(restaurant)
+        builders = [(_restaurant_document, (restaurant,)) for restaurant in batch]
+    elif collection == "dishes":
+        lookup.prefetch(dish.get("restaurant_id") for dish in batch)
+        builders = [(_dish_document, (dish, lookup.get(dish.get("restaurant_id")))) for dish in batch]
+    else:
+        lookup.prefetch(menu.get("restaurant_id") for menu in batch)
+        dish_ids = {dish_id for menu in batch for dish_id in menu.get("dishes") or []}
+        dishes = get_dishes_by_ids(dish_ids, projection={"name": 1}) if dish_ids else {}
+        builders = [
+            (_menu_document, (
+                menu,
+                lookup.get(menu.get("restaurant_id")),
+                [dishes[dish_id] for dish_id in menu.get("dishes") or [] if dish_id in dishes]
+            ))
+            for menu in batch
+        ]
+    
+    documents = []
+    for builder, args in builders:
+        try:
+            documents.append(builder(*args))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Skipping {collection} {args[0].get('_id')} in reindex: {str(e)}")
+    return documents
+
+def _upload_batch(client, documents, max_retries=3):
+    """Upload a batch, retrying only the documents that failed; returns how many were indexed."""
+    pending = documents
+    for attempt in range(max_retries):
+        try:
+            results = client.upload_documents(documents=pending)
+            failed = {r.key for r in results if not r.succeeded}
+        except Exception as e:
+            logger.error(f"Error uploading {len(pending)} documents: {str(e)}")
+            failed = {document["id"] for document in pending}
+        if not failed:
+            return len(documents)
+        pending = [document for document in pending if document["id"] in failed]
+        time.sleep(2 ** attempt)
+    raise RuntimeError(f"{len(pending)} documents could not be indexed")
+
+def _load_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically, so a crash never leaves a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(temp_name, path)
+
+def _commit(in_flight, checkpoint, path, keep):
+    """
+    Record uploaded batches in submission order.
+    
+    The position of a collection only advances past batches that (and
+    whose predecessors) reached the index, so resuming never skips data.
+    Waits until at most ``keep`` batches are still in flight.
+    """
+    while in_flight and (len(in_flight) > keep or in_flight[0][2].done()):
+        collection, last_id, future = in_flight.popleft()
+        counts = checkpoint["counts"]
+        counts[collection] = counts.get(collection, 0) + future.result()
+        checkpoint["positions"][collection] = last_id
+        if path:
+            _save_checkpoint(path, checkpoint)
+
+def _previous_statistics(alias, local):
+    """Statistics of the index being replaced (the alias target or the configured index)."""
+    try:
+        if local:
+            return get_index_statistics()
+        index_name = (resolve_search_alias(alias) if alias else None) or current_app.config['AZURE_SEARCH_INDEX_NAME']
+        return dict(get_index_statistics(index_name), index_name=index_name)
+    except Exception as e:
+        logger.warning(f"Could not read the statistics of the current index: {str(e)}")
+        return None
+
+def reindex(index_name=None, alias=None, resume=False, batch_size=None, workers=None,
+            schema_version=None):
+    """
+    Rebuild the search index from MongoDB.
+    
+    Streams restaurants, dishes and menus in _id order, enriches dishes and
+    menus through a RestaurantLookup and uploads batches from a thread pool.
+    Progress is checkpointed (REINDEX_CHECKPOINT_PATH) after every batch,
+    so an interrupted run continues with ``resume=True``. By default the
+    data goes into a new timestamped index and ``alias`` is pointed at it
+    only once everything has been uploaded.
+    
+    The new index uses ``schema_version`` (default: SEARCH_SCHEMA_VERSION),
+    which is how an index is migrated to a new schema without downtime:
+    queries keep using the old index through the alias until the swap.
+    The result includes the statistics of the replaced index and of the
+    new one, and the upload throughput.
+    
+    With the local backend the index is rebuilt in memory and saved over
+    LOCAL_SEARCH_INDEX_PATH at the end (resume does not apply).
+    
+    Args:
+        index_name: Target index (default: AZURE_SEARCH_INDEX_NAME plus a timestamp)
+        alias: Optional alias to swap to the new index when done
+        resume: Continue the run recorded in the checkpoint
+        batch_size: Documents per upload (default: REINDEX_BATCH_SIZE)
+        workers: Parallel uploads (default: REINDEX_WORKERS)
+        schema_version: Schema version of the new index
+    
+    Returns:
+        The final checkpoint (index name, counts per collection, elapsed seconds, statistics)
+    """
+    config = current_app.config
+    batch_size = min(batch_size or config.get('REINDEX_BATCH_SIZE', 1000), MAX_BATCH_SIZE)
+    workers = workers or config.get('REINDEX_WORKERS', 4)
+    local = _use_local_backend()
+    path = None if local else config.get('REINDEX_CHECKPOINT_PATH', 'instance/reindex_checkpoint.json')
+    
+    checkpoint = _load_checkpoint(path) if (resume and path) else None
+    if checkpoint is not None and checkpoint.get("completed"):
+        logger.info(f"Reindex into {checkpoint['index_name']} already completed")
+        return checkpoint
+    if checkpoint is None:
+        schema_version = schema_version or get_configured_schema_version()
+        if schema_version not in SCHEMA_VERSIONS:
+            raise ValueError(f"Unknown search schema version: {schema_version}")
+        timestamp = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        checkpoint = {
+            "index_name": index_name or f"{config['AZURE_SEARCH_INDEX_NAME']}-v{schema_version}-{timestamp}",
+            "alias": alias,
+            "schema_version": schema_version,
+            "previous_statistics": _previous_statistics(alias, local),
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "positions": {},
+            "counts": {},
+            "finished": [],
+            "elapsed_seconds": 0.0,
+            "completed": False
+        }
+    alias = alias or checkpoint.get("alias")
+    schema_version = checkpoint.get("schema_version", 1)
+    
+    if local:
+        engine = LocalSearchEngine()
+    else:
+        admin_client = get_search_admin_client()
+        try:
+            admin_client.get_index(checkpoint["index_name"])
+        except Exception:
+            create_search_index(admin_client, checkpoint["index_name"], schema_version)
+        client = get_search_client(checkpoint["index_name"])
+    
+    def upload(documents):
+        if not documents:
+            return 0
+        if local:
+            engine.upload(documents)
+            return len(documents)
+        return _upload_batch(client, _adapt_documents(documents, schema_version))
+    
+    lookup = RestaurantLookup()
+    in_flight = deque()  # (collection, last _id, future) en orden de envío
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reindex")
+    try:
+        for collection in COLLECTIONS:
+            if collection in checkpoint["finished"]:
+                continue
+            for batch in iter_collection_batches(
+                collection,
+                after_id=checkpoint["positions"].get(collection),
+                batch_size=batch_size,
+                query=ACTIVE_QUERY
+            ):
+                documents = build_documents(collection, batch, lookup)
+                future = executor.submit(upload, documents)
+                in_flight.append((collection, str(batch[-1]["_id"]), future))
+                _commit(in_flight, checkpoint, path, keep=workers * 2)
+            
+            _commit(in_flight, checkpoint, path, keep=0)
+            checkpoint["finished"].append(collection)
+            if path:
+                _save_checkpoint(path, checkpoint)
+            logger.info(f"Reindexed {checkpoint['counts'].get(collection, 0)} {collection}")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint["elapsed_seconds"] += time.perf_counter() - start
+        if path:
+            _save_checkpoint(path, checkpoint)
+    
+    if local:
+        engine.save(config.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl'))
+    elif alias:
+        swap_search_alias(alias, checkpoint["index_name"])
+    invalidate_query_cache()
+    
+    total = sum(checkpoint["counts"].values())
+    checkpoint["completed"] = True
+    checkpoint["restaurant_queries"] = lookup.queries
+    checkpoint["documents_per_second"] = total / checkpoint["elapsed_seconds"] if checkpoint["elapsed_seconds"] else None
+    try:
+        if local:
+            index_path = config.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl')
+            checkpoint["statistics"] = {"documents": len(engine), "storage_bytes": os.path.getsize(index_path)}
+        else:
+            checkpoint["statistics"] = get_index_statistics(checkpoint["index_name"])
+    except Exception as e:
+        logger.warning(f"Could not read the statistics of {checkpoint['index_name']}: {str(e)}")
+    if path:
+        _save_checkpoint(path, checkpoint)
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the search index from MongoDB")
+    parser.add_argument("--index", help="Target index (default: a new timestamped index)")
+    parser.add_argument("--alias", help="Alias to point at the new index when the upload finishes")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted reindex")
+    parser.add_argument("--batch-size", type=int, help="Documents per upload")
+    parser.add_argument("--workers", type=int, help="Parallel uploads")
+    parser.add_argument("--schema-version", type=int, choices=SCHEMA_VERSIONS,
+                        help="Schema of the new index (default: SEARCH_SCHEMA_VERSION)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    app = Flask('app')
+    app.config.from_object('app.config.Config')
+    init_search_service(app)
+    with app.app_context():
+        result = reindex(args.index, args.alias, args.resume, args.batch_size, args.workers,
+                         args.schema_version)
+        print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,175 @@
+from azure.search.documents import IndexDocumentsBatch
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class BufferedIndexer:
+    """
+    Queue of pending search index actions flushed in batches from a background thread.
+    
+    Actions are keyed by document id, so repeated updates of the same document
+    between two flushes are coalesced into one: consecutive merge-or-upload
+    actions are merged field by field and a delete replaces anything queued
+    before it.
+    
+    Args:
+        client_factory: Callable returning the SearchClient used to flush
+        batch_size: Flush as soon as this many documents are pending
+        flush_interval: Maximum seconds an action waits in the queue
+        max_retries: Attempts for a batch before its actions are dropped
+        on_flush: Optional callable run after each batch reaches the index
+    """
+    
+    def __init__(self, client_factory, batch_size=500, flush_interval=2.0, max_retries=3, on_flush=None):
+        self.client_factory = client_factory
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        
+        self._pending = {}  # doc id -> (action, document, attempts)
+        self._dropped = set()  # descartados tras agotar los reintentos, hasta que se vuelvan a encolar
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._client = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "flushed_documents": 0,
+            "failed_documents": 0,
+            "dropped_documents": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "total_flush_ms": 0.0,
+        }
+        
+        self._thread = threading.Thread(target=self._run, name="search-indexer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def merge_or_upload(self, documents):
+        """Queue merge-or-upload actions for the given documents."""
+        self._enqueue("merge_or_upload", documents)
+    
+    def delete(self, doc_ids):
+        """Queue delete actions for the given document ids."""
+        self._enqueue("delete", [{"id": doc_id} for doc_id in doc_ids])
+    
+    def _enqueue(self, action, documents):
+        with self._lock:
+            for document in documents:
+                doc_id = document["id"]
+                self._dropped.discard(doc_id)
+                self._stats["enqueued"] += 1
+                queued = self._pending.get(doc_id)
+                if queued is not None:
+                    self._stats["coalesced"] += 1
+                    if action == "merge_or_upload" and queued[0] == "merge_or_upload":
+                        document = {**queued[1], **document}
+                self._pending[doc_id] = (action, dict(document), 0)
+            depth = len(self._pending)
+        
+        if depth >= self.batch_size:
+            self._wakeup.set()
+    
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing search index queue: {str(e)}")
+    
+    def flush(self):
+        """Send every pending action now; returns the number of documents sent."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            # Los fallidos vuelven a la cola y se reintentan en el siguiente ciclo
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                self._send(dict(items[start:start + self.batch_size]))
+        return len(items)
+    
+    def _send(self, batch):
+        index_batch = IndexDocumentsBatch()
+        uploads = [document for action, document, _ in batch.values() if action == "merge_or_upload"]
+        deletes = [document for action, document, _ in batch.values() if action == "delete"]
+        if uploads:
+            index_batch.add_merge_or_upload_actions(uploads)
+        if deletes:
+            index_batch.add_delete_actions(deletes)
+        
+        start = time.perf_counter()
+        try:
+            if self._client is None:
+                self._client = self.client_factory()
+            results = self._client.index_documents(index_batch)
+            failed = {r.key for r in results if not r.succeeded}
+        except Exception as e:
+            logger.error(f"Error sending {len(batch)} documents to the search index: {str(e)}")
+            failed = set(batch)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["flushed_documents"] += len(batch) - len(failed)
+            self._stats["failed_documents"] += len(failed)
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"] or 0, elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+            
+            # Reintentar los fallidos salvo que ya haya una versión más nueva en cola
+            for doc_id in failed:
+                action, document, attempts = batch[doc_id]
+                queued = self._pending.get(doc_id)
+                if queued is not None:
+                    if action == "merge_or_upload" and queued[0] == "merge_or_upload":
+                        self._pending[doc_id] = (action, {**document, **queued[1]}, queued[2])
+                    continue
+                if attempts + 1 >= self.max_retries:
+                    self._stats["dropped_documents"] += 1
+                    self._dropped.add(doc_id)
+                    logger.error(f"Dropping search index action {action} for {doc_id}")
+                    continue
+                self._pending[doc_id] = (action, document, attempts + 1)
+        
+        if self.on_flush is not None and len(failed) < len(batch):
+            self.on_flush()
+    
+    def pending_ids(self):
+        """Ids of the documents still queued (not sent yet, or failed and due for retry)."""
+        with self._lock:
+            return set(self._pending)
+    
+    def dropped_ids(self):
+        """Ids of the documents dropped after their last failed attempt (until queued again)."""
+        with self._lock:
+            return set(self._dropped)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+        flushes = stats["flushes"]
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / flushes if flushes else None
+        return stats
+    
+    def close(self):
+        """Stop the background thread and flush what is left."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing search index queue on shutdown: {str(e)}")
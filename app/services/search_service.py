@@ -8,56 +8,356 @@ from azure.search.documents.indexes.models import (
     SearchFieldDataType
 )
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
 from flask import current_app, g
+from app.services.search_indexer import BufferedIndexer
+from app.services.local_search import LocalSearchEngine
+from app.services.cache import TTLCache
+from app.services.suggest_service import update_suggestions, remove_suggestions
+import base64
+import copy
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Azure Search acepta como máximo 1000 documentos por petición
+MAX_BATCH_SIZE = 1000
+
+# Clientes compartidos por proceso: uno por índice, todos sobre el mismo
+# transporte HTTP con keep-alive. Los clientes del SDK son thread-safe.
+_clients = {}
+_clients_pid = None
+_transport = None
+_clients_lock = threading.Lock()
+
+def _get_transport(config):
+    """Return the process-wide pooled HTTP transport (caller holds _clients_lock)."""
+    global _transport
+    if _transport is None:
+        pool_size = config.get('SEARCH_HTTP_POOL_SIZE', 20)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        _transport = RequestsTransport(
+            session=session,
+            session_owner=False,
+            connection_timeout=config.get('SEARCH_HTTP_CONNECTION_TIMEOUT', 5),
+            read_timeout=config.get('SEARCH_HTTP_READ_TIMEOUT', 30)
+        )
+    return _transport
+
+def _get_client(config, index_name=None, admin=False):
+    """Return the cached client for an index (or the admin client), building it once per process."""
+    global _clients, _clients_pid, _transport
+    key = ('admin', None) if admin else ('search', index_name or config['AZURE_SEARCH_INDEX_NAME'])
+    pid = os.getpid()
+    
+    client = _clients.get(key) if _clients_pid == pid else None
+    if client is not None:
+        return client
+    
+    with _clients_lock:
+        if _clients_pid != pid:
+            # Tras un fork no reutilizamos las conexiones del proceso padre
+            _clients = {}
+            _transport = None
+            _clients_pid = pid
+        
+        client = _clients.get(key)
+        if client is None:
+            endpoint = f"https://{config['AZURE_SEARCH_SERVICE_NAME']}.search.windows.net"
+            credential = AzureKeyCredential(config['AZURE_SEARCH_ADMIN_KEY'])
+            transport = _get_transport(config)
+            if admin:
+                client = SearchIndexClient(endpoint=endpoint, credential=credential, transport=transport)
+            else:
+                client = SearchClient(endpoint=endpoint, index_name=key[1],
+                                      credential=credential, transport=transport)
+            _clients[key] = client
+    return client
 
 def get_search_admin_client():
     """Return a handle to the Azure Search admin client."""
-    if 'search_admin_client' not in g:
-        service_name = current_app.config['AZURE_SEARCH_SERVICE_NAME']
-        admin_key = current_app.config['AZURE_SEARCH_ADMIN_KEY']
-        endpoint = f"https://{service_name}.search.windows.net"
-        credential = AzureKeyCredential(admin_key)
-        g.search_admin_client = SearchIndexClient(endpoint=endpoint, credential=credential)
-    return g.search_admin_client
-
-def get_search_client():
-    """Obtener el cliente de Azure Search."""
-    search_service = current_app.config['AZURE_SEARCH_SERVICE_NAME']
-    search_key = current_app.config['AZURE_SEARCH_ADMIN_KEY']
-    index_name = current_app.config['AZURE_SEARCH_INDEX_NAME']
-    
-    endpoint = f"https://{search_service}.search.windows.net"
-    credential = AzureKeyCredential(search_key)
-    
-    return SearchClient(endpoint=endpoint,
-                       index_name=index_name,
-                       credential=credential)
+    return _get_client(current_app.config, admin=True)
+
+def get_search_client(index_name=None):
+    """Obtener el cliente de Azure Search (compartido por proceso)."""
+    return _get_client(current_app.config, index_name)
+
+# Motor de búsqueda local (SEARCH_BACKEND = 'local'), uno por proceso.
+# Pensado para desarrollo, CI y benchmarks: cada proceso guarda sus cambios
+# en disco (aplicándolos sobre lo que hayan guardado los demás, ver
+# LocalSearchEngine.save) y recarga el fichero cuando otro proceso lo ha
+# actualizado.
+_local_engine = None
+_local_engine_checked_at = 0.0
+_local_engine_lock = threading.Lock()
+
+def _use_local_backend():
+    return current_app.config.get('SEARCH_BACKEND', 'azure') == 'local'
+
+def _index_file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def get_local_engine():
+    """Return the in-process search engine, loading it from disk on first use."""
+    global _local_engine, _local_engine_checked_at
+    path = current_app.config.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl')
+    
+    if _local_engine is None:
+        with _local_engine_lock:
+            if _local_engine is None:
+                engine = LocalSearchEngine.load(path)
+                engine.autosave(path, current_app.config.get('LOCAL_SEARCH_SAVE_INTERVAL', 30))
+                _local_engine = engine
+        return _local_engine
+    
+    # Como mucho una comprobación por segundo de si otro proceso guardó el índice
+    now = time.monotonic()
+    if now - _local_engine_checked_at > 1:
+        _local_engine_checked_at = now
+        mtime = _index_file_mtime(path)
+        if mtime is not None and mtime != _local_engine.file_mtime and not _local_engine.dirty:
+            with _local_engine_lock:
+                _local_engine.replace_with(LocalSearchEngine.load(path))
+                invalidate_query_cache()
+    return _local_engine
+
+def save_local_engine():
+    """Write the local index to disk now (e.g. at the end of a background job)."""
+    path = current_app.config.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl')
+    get_local_engine().save(path)
+
+# Cola de indexación en segundo plano (una por proceso)
+_indexer = None
+_indexer_pid = None
+_indexer_lock = threading.Lock()
+
+def get_indexer():
+    """Return this process' buffered indexer, or None when indexing is synchronous."""
+    global _indexer, _indexer_pid
+    if not current_app.config.get('SEARCH_INDEXER_ASYNC', True) or _use_local_backend():
+        return None
+    
+    pid = os.getpid()
+    if _indexer is None or _indexer_pid != pid:
+        with _indexer_lock:
+            if _indexer is None or _indexer_pid != pid:
+                config = current_app.config
+                _indexer = BufferedIndexer(
+                    lambda: _get_client(config),
+                    batch_size=min(config.get('SEARCH_INDEXER_BATCH_SIZE', 500), MAX_BATCH_SIZE),
+                    flush_interval=config.get('SEARCH_INDEXER_FLUSH_INTERVAL', 2.0),
+                    max_retries=config.get('SEARCH_INDEXER_MAX_RETRIES', 3),
+                    on_flush=invalidate_query_cache
+                )
+                _indexer_pid = pid
+    return _indexer
+
+def _upload(documents):
+    """Send documents to the index, through the background queue when enabled."""
+    invalidate_query_cache()
+    update_suggestions(documents)
+    if _use_local_backend():
+        get_local_engine().merge_or_upload(documents)
+        return
+    
+    documents = _adapt_documents(documents)
+    indexer = get_indexer()
+    if indexer is not None:
+        indexer.merge_or_upload(documents)
+        return
+    
+    search_client = get_search_client()
+    for start in range(0, len(documents), MAX_BATCH_SIZE):
+        search_client.merge_or_upload_documents(documents=documents[start:start + MAX_BATCH_SIZE])
+
+def flush_index_queue():
+    """Send every queued index action now (e.g. at the end of a background job)."""
+    if _use_local_backend():
+        save_local_engine()
+        return 0
+    
+    indexer = get_indexer()
+    return indexer.flush() if indexer is not None else 0
+
+def get_queued_document_ids():
+    """
+    Ids of documents the background indexer has not delivered (none without it).
+    
+    Includes the documents still queued and those dropped after their last
+    failed attempt, until they are queued again.
+    """
+    if _use_local_backend():
+        return set()
+    indexer = get_indexer()
+    return indexer.pending_ids() | indexer.dropped_ids() if indexer is not None else set()
+
+def get_indexer_stats():
+    """Return queue depth and flush latency counters of the background indexer."""
+    indexer = get_indexer()
+    return indexer.stats() if indexer is not None else {"enabled": False}
 
 def close_search_clients(e=None):
-    """Close the Azure Search clients."""
+    """Nothing to release per request: clients are shared by the whole process."""
     g.pop('search_admin_client', None)
     g.pop('search_client', None)
 
 def init_search_service(app):
-    """Initialize the Azure Search service."""
+    """
+    Check the Azure Search index at startup (or load the local index).
+    
+    Creates the index when it does not exist yet. AZURE_SEARCH_INDEX_NAME may
+    be an alias; the index it points at is the one checked, and its schema
+    version (which may differ from SEARCH_SCHEMA_VERSION during a migration)
+    is the one documents are written in.
+    """
     with app.app_context():
+        if _use_local_backend():
+            get_local_engine()
+            return
+        
         admin_client = get_search_admin_client()
         index_name = app.config['AZURE_SEARCH_INDEX_NAME']
         
-        # Check if index exists, create if not
         try:
-            admin_client.get_index(index_name)
+            index = _get_live_index(admin_client, index_name)
         except Exception as e:
-            # Index doesn't exist, create it
-            create_search_index(admin_client, index_name)
+            # Sin conexión no se puede comprobar el índice; la app arranca igualmente
+            logger.error(f"Could not check search index {index_name}: {str(e)}")
+            return
+        
+        # Check if index exists, create if not
+        if index is None:
+            index = create_search_index(admin_client, index_name)
+        else:
+            index = _add_missing_fields(admin_client, index, check_schema_version(index))
+        _set_live_index(index)
         
         app.teardown_appcontext(close_search_clients)
 
-def create_search_index(admin_client, index_name):
-    """Create the search index for menu and dish data."""
+# Índice en uso según init_search_service, su versión del esquema y campos
+# del esquema que le faltan (p. ej. content_digest en un índice creado antes
+# de existir); esos campos se quitan de los documentos antes de subirlos
+_live_index = None
+_live_schema_version = None
+_missing_fields = frozenset()
+
+def _set_live_index(index):
+    global _live_index, _live_schema_version, _missing_fields
+    present = {field.name for field in index.fields}
+    _live_index = index
+    _live_schema_version = index_schema_version(index) or get_configured_schema_version()
+    _missing_fields = frozenset(name for name in get_index_schema() if name not in present)
+    if _missing_fields:
+        logger.warning(f"Search index {index.name} lacks fields {', '.join(sorted(_missing_fields))}; "
+                       f"they are left out of uploaded documents")
+
+def _add_missing_fields(admin_client, index, schema_version):
+    """
+    Add the fields of its schema version an existing index lacks.
     
-    # Define the index fields
-    fields = [
+    Azure allows adding fields to an index in place, but not changing the
+    attributes (sortable, filterable...) of existing ones; those need a
+    rebuild with reindex_service.
+    
+    Returns:
+        The updated index, or the unchanged one if the update fails
+    """
+    present = {field.name for field in index.fields}
+    missing = [field for name, field in get_index_schema(schema_version).items() if name not in present]
+    if not missing:
+        return index
+    
+    index.fields.extend(missing)
+    try:
+        return admin_client.create_or_update_index(index)
+    except Exception as e:
+        logger.error(f"Could not add fields {', '.join(f.name for f in missing)} to search index "
+                     f"{index.name}: {str(e)}")
+        del index.fields[-len(missing):]
+        return index
+
+def get_live_index_field(name):
+    """
+    Definition of a field in the index checked at startup.
+    
+    Returns:
+        The SearchField, or None if the index lacks it or was not checked
+        (local backend, or init_search_service not run in this process)
+    """
+    if _live_index is None:
+        return None
+    return next((field for field in _live_index.fields if field.name == name), None)
+
+def _get_live_index(admin_client, index_name):
+    """The index behind a name or alias (a SearchIndex), or None if neither exists."""
+    try:
+        return admin_client.get_index(index_name)
+    except ResourceNotFoundError:
+        pass
+    
+    try:
+        target = resolve_search_alias(index_name)
+    except requests.RequestException:
+        # Servicio sin soporte de alias: el nombre no existe
+        target = None
+    return admin_client.get_index(target) if target else None
+
+def check_schema_version(index):
+    """
+    Schema version of an existing index, warning if it is not the configured one.
+    
+    Documents are written in the version of the index (see adapt_document),
+    so a mismatch does not stop the process; it usually means a migration
+    is half done (alias switched, SEARCH_SCHEMA_VERSION not updated yet).
+    
+    Returns:
+        The schema version of the index
+    """
+    version = index_schema_version(index) or get_configured_schema_version()
+    if version != get_configured_schema_version():
+        logger.warning(
+            f"Search index {index.name} uses schema version {version} but SEARCH_SCHEMA_VERSION is "
+            f"{get_configured_schema_version()}; writing documents in version {version}. Set "
+            f"SEARCH_SCHEMA_VERSION={version} or migrate the index with reindex_service "
+            f"--schema-version {get_configured_schema_version()}"
+        )
+    return version
+
+# Versiones del esquema del índice. La 1 es el esquema original (casi todo
+# filtrable y buscable, ubicación como campo complejo) y no se modifica: Azure
+# no cambia los atributos de un campo existente. La 2 solo activa los
+# atributos que usan las consultas, guarda la ubicación como GeographyPoint y
+# añade las facetas, el id ordenable (paginación por clave) y content_digest.
+# SEARCH_SCHEMA_VERSION es la versión de los índices nuevos; la app lee y
+# escribe en la del índice que encuentra al arrancar (init_search_service).
+SCHEMA_VERSIONS = (1, 2)
+LATEST_SCHEMA_VERSION = 2
+
+def get_configured_schema_version():
+    """Schema version for new indexes (SEARCH_SCHEMA_VERSION)."""
+    return int(current_app.config.get('SEARCH_SCHEMA_VERSION', 1))
+
+def get_schema_version():
+    """Schema version of the index the application reads and writes (the configured one if not checked)."""
+    return _live_schema_version or get_configured_schema_version()
+
+def _index_fields_v1():
+    return [
         SimpleField(name="id", type=SearchFieldDataType.String, key=True),
         SimpleField(name="type", type=SearchFieldDataType.String, filterable=True),  # 'restaurant', 'dish', 'menu'
         SimpleField(name="restaurant_id", type=SearchFieldDataType.String, filterable=True),
@@ -81,23 +381,209 @@ def create_search_index(admin_client, index_name):
             SimpleField(name="longitude", type=SearchFieldDataType.Double)
         ])
     ]
+
+def _index_fields_v2():
+    # Los campos ordenables también son filtrables: la paginación por clave
+    # filtra por el valor del último resultado (ver _keyset_filter)
+    return [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True, sortable=True),
+        SimpleField(name="type", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SimpleField(name="restaurant_id", type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="dish_id", type=SearchFieldDataType.String),
+        SimpleField(name="menu_id", type=SearchFieldDataType.String),
+        SearchableField(name="name", type=SearchFieldDataType.String, filterable=True, sortable=True),
+        SearchableField(name="description", type=SearchFieldDataType.String),
+        SearchableField(name="category", type=SearchFieldDataType.String),
+        SimpleField(name="price", type=SearchFieldDataType.Double, filterable=True, sortable=True, facetable=True),
+        SimpleField(name="date", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+        SimpleField(name="menu_type", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SearchableField(name="cuisine_type", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True, facetable=True),
+        SimpleField(name="restrictions", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True, facetable=True),
+        SearchableField(name="ingredients", type=SearchFieldDataType.Collection(SearchFieldDataType.String)),
+        SimpleField(name="is_promoted", type=SearchFieldDataType.Boolean, filterable=True, facetable=True),
+        SimpleField(name="promotion_level", type=SearchFieldDataType.Int32, filterable=True, sortable=True),
+        SimpleField(name="avg_rating", type=SearchFieldDataType.Double, filterable=True, sortable=True),
+        SimpleField(name="rating_count", type=SearchFieldDataType.Int32, filterable=True, sortable=True),
+        SimpleField(name="content_digest", type=SearchFieldDataType.String),
+        SimpleField(name="location", type=SearchFieldDataType.GeographyPoint, filterable=True, sortable=True)
+    ]
+
+def _index_fields(version=None):
+    """Fields of the search index for menu and dish data, for a schema version."""
+    version = version or get_schema_version()
+    if version == 1:
+        return _index_fields_v1()
+    if version == 2:
+        return _index_fields_v2()
+    raise ValueError(f"Unknown search schema version: {version}")
+
+def get_index_schema(version=None):
+    """Top-level fields of the index by name, as created by create_search_index."""
+    return _index_schema(version or get_schema_version())
+
+@functools.lru_cache(maxsize=None)
+def _index_schema(version):
+    return {field.name: field for field in _index_fields(version)}
+
+def index_schema_version(index):
+    """Schema version of an existing index (a SearchIndex from get_index), judged by its location field."""
+    for field in index.fields:
+        if field.name == "location":
+            return 2 if field.type == SearchFieldDataType.GeographyPoint else 1
+    return None
+
+def validate_select(select):
+    """
+    Check a field projection against the index schema.
+    
+    Args:
+        select: List of field names (None or empty selects every field)
+    
+    Returns:
+        The projection as a list, or None for every field
+    
+    Raises:
+        ValueError: If a field is not part of the index
+    """
+    if not select:
+        return None
+    schema = get_index_schema()
+    unknown = [field for field in select if field.split('/')[0] not in schema]
+    if unknown:
+        raise ValueError(f"Unknown search fields: {', '.join(unknown)}")
+    return list(select)
+
+def create_search_index(admin_client, index_name, schema_version=None):
+    """Create the search index for menu and dish data (default: SEARCH_SCHEMA_VERSION)."""
+    
+    # Define the index fields
+    fields = _index_fields(schema_version or get_configured_schema_version())
     
     # Create the index
     index = SearchIndex(name=index_name, fields=fields)
     admin_client.create_index(index)
     return index
 
-def index_restaurant(restaurant_data):
+def get_index_statistics(index_name=None):
     """
-    Index a restaurant document in Azure Search.
+    Document count and storage size of an index.
+    
+    Azure updates the statistics a few minutes after indexing, so right
+    after a bulk upload they can lag behind. With the local backend the
+    size is the one of the saved index file.
+    
+    Returns:
+        A dictionary with documents and storage_bytes
+    """
+    if _use_local_backend():
+        path = current_app.config.get('LOCAL_SEARCH_INDEX_PATH', 'instance/search_index.pkl')
+        return {
+            "documents": len(get_local_engine()),
+            "storage_bytes": os.path.getsize(path) if os.path.exists(path) else 0
+        }
+    
+    statistics = get_search_admin_client().get_index_statistics(
+        index_name or current_app.config['AZURE_SEARCH_INDEX_NAME']
+    )
+    return {"documents": statistics["document_count"], "storage_bytes": statistics["storage_size"]}
+
+# Los alias son una función en preview que el SDK fijado no expone
+SEARCH_ALIAS_API_VERSION = "2024-05-01-preview"
+
+def swap_search_alias(alias_name, index_name):
+    """
+    Point a search alias at another index, creating the alias if needed.
+    
+    Queries and writes sent to the alias (set AZURE_SEARCH_INDEX_NAME to the
+    alias name) move to the new index at once.
     
     Args:
-        restaurant_data: A dictionary containing restaurant data
+        alias_name: Name of the alias
+        index_name: Index the alias should resolve to
     """
-    search_client = get_search_client()
+    config = current_app.config
+    response = requests.put(
+        f"https://{config['AZURE_SEARCH_SERVICE_NAME']}.search.windows.net/aliases/{alias_name}",
+        params={"api-version": SEARCH_ALIAS_API_VERSION},
+        headers={"api-key": config['AZURE_SEARCH_ADMIN_KEY']},
+        json={"name": alias_name, "indexes": [index_name]},
+        timeout=config.get('SEARCH_HTTP_READ_TIMEOUT', 30)
+    )
+    response.raise_for_status()
+    return True
+
+def resolve_search_alias(alias_name):
+    """Index an alias currently points at, or None if the alias does not exist."""
+    config = current_app.config
+    response = requests.get(
+        f"https://{config['AZURE_SEARCH_SERVICE_NAME']}.search.windows.net/aliases/{alias_name}",
+        params={"api-version": SEARCH_ALIAS_API_VERSION},
+        headers={"api-key": config['AZURE_SEARCH_ADMIN_KEY']},
+        timeout=config.get('SEARCH_HTTP_READ_TIMEOUT', 30)
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    indexes = response.json().get("indexes") or []
+    return indexes[0] if indexes else None
+
+def document_digest(document):
+    """
+    Digest of a search document's content (every field but id and the digest).
     
-    # Prepare the document for indexing
-    document = {
+    Stored in the index as ``content_digest`` so the consistency check can
+    compare Mongo and the index without downloading whole documents.
+    """
+    content = {k: v for k, v in document.items() if k not in ("id", "content_digest")}
+    payload = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def _with_digest(document):
+    document["content_digest"] = document_digest(document)
+    return document
+
+def _location_field(restaurant_data):
+    """GeoJSON point of a restaurant (as stored in Mongo), or None without coordinates."""
+    coordinates = (restaurant_data.get('location') or {}).get('coordinates')
+    if not coordinates or len(coordinates) < 2:
+        return None
+    return {"type": "Point", "coordinates": [float(coordinates[0]), float(coordinates[1])]}
+
+def adapt_document(document, schema_version):
+    """
+    Convert a search document (always built in the latest schema) to an older schema.
+    
+    The digest is computed on the latest shape, so the consistency check
+    gives the same answer whatever the version of the index. Fields the
+    older schema does not have (e.g. content_digest in version 1) are dropped.
+    """
+    if schema_version >= LATEST_SCHEMA_VERSION:
+        return document
+    schema = get_index_schema(schema_version)
+    document = {k: v for k, v in document.items() if k in schema}
+    if document.get("location"):
+        longitude, latitude = document["location"]["coordinates"]
+        document["location"] = {"latitude": latitude, "longitude": longitude}
+    return document
+
+def _adapt_documents(documents, schema_version=None):
+    # Sin versión explícita los documentos van al índice en uso, al que le
+    # pueden faltar campos; con versión van a un índice nuevo (reindex_service)
+    missing = _missing_fields if schema_version is None else ()
+    schema_version = schema_version or get_schema_version()
+    if schema_version >= LATEST_SCHEMA_VERSION and not missing:
+        return documents
+    adapted = []
+    for document in documents:
+        document = adapt_document(document, schema_version)
+        if missing:
+            document = {k: v for k, v in document.items() if k not in missing}
+        adapted.append(document)
+    return adapted
+
+def _restaurant_document(restaurant_data):
+    """Build the search document for a restaurant."""
+    return _with_digest({
         "id": f"restaurant_{restaurant_data['_id']}",
         "type": "restaurant",
         "restaurant_id": str(restaurant_data['_id']),
@@ -107,27 +593,22 @@ def index_restaurant(restaurant_data):
         "avg_rating": restaurant_data.get('avg_rating', 0),
         "rating_count": restaurant_data.get('rating_count', 0),
         "price": float(restaurant_data.get('price_range', 0)),
-        "location": {
-            "latitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[1],
-            "longitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[0]
-        }
-    }
-    
-    # Index the document
-    search_client.upload_documents(documents=[document])
-    return True
+        "location": _location_field(restaurant_data)
+    })
 
-def index_dish(dish_data, restaurant_data=None):
+def index_restaurant(restaurant_data):
     """
-    Index a dish document in Azure Search.
+    Index a restaurant document in Azure Search.
     
     Args:
-        dish_data: A dictionary containing dish data
-        restaurant_data: Optional restaurant data for enriching the document
+        restaurant_data: A dictionary containing restaurant data
     """
-    search_client = get_search_client()
-    
-    # Prepare the document for indexing
+    # Index the document
+    _upload([_restaurant_document(restaurant_data)])
+    return True
+
+def _dish_document(dish_data, restaurant_data=None):
+    """Build the search document for a dish."""
     document = {
         "id": f"dish_{dish_data['_id']}",
         "type": "dish",
@@ -136,7 +617,7 @@ def index_dish(dish_data, restaurant_data=None):
         "name": dish_data['name'],
         "description": dish_data.get('description', ''),
         "category": dish_data.get('category', ''),
-        "price": float(dish_data.get('price', 0)),
+        "price": float(dish_data.get('price') or 0),
         "restrictions": dish_data.get('restrictions', []),
         "ingredients": dish_data.get('ingredients', []),
         "is_promoted": dish_data.get('is_promoted', False),
@@ -148,27 +629,24 @@ def index_dish(dish_data, restaurant_data=None):
     # Add restaurant data if available
     if restaurant_data:
         document["cuisine_type"] = restaurant_data.get('cuisine_type', [])
-        document["location"] = {
-            "latitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[1],
-            "longitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[0]
-        }
+        document["location"] = _location_field(restaurant_data)
     
-    # Index the document
-    search_client.upload_documents(documents=[document])
-    return True
+    return _with_digest(document)
 
-def index_menu(menu_data, restaurant_data=None, dishes_data=None):
+def index_dish(dish_data, restaurant_data=None):
     """
-    Index a menu document in Azure Search.
+    Index a dish document in Azure Search.
     
     Args:
-        menu_data: A dictionary containing menu data
+        dish_data: A dictionary containing dish data
         restaurant_data: Optional restaurant data for enriching the document
-        dishes_data: Optional list of dishes in the menu
     """
-    search_client = get_search_client()
-    
-    # Prepare the document for indexing
+    # Index the document
+    _upload([_dish_document(dish_data, restaurant_data)])
+    return True
+
+def _menu_document(menu_data, restaurant_data=None, dishes_data=None):
+    """Build the search document for a menu."""
     document = {
         "id": f"menu_{menu_data['_id']}",
         "type": "menu",
@@ -184,20 +662,296 @@ def index_menu(menu_data, restaurant_data=None, dishes_data=None):
     if restaurant_data:
         document["name"] = restaurant_data.get('name', '')
         document["cuisine_type"] = restaurant_data.get('cuisine_type', [])
-        document["location"] = {
-            "latitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[1],
-            "longitude": restaurant_data.get('location', {}).get('coordinates', [0, 0])[0]
-        }
+        document["location"] = _location_field(restaurant_data)
     
     # Add dishes data if available
     if dishes_data:
-        document["description"] = ", ".join([d.get('name', '') for d in dishes_data])
+        document["description"] = ", ".join([d.get('name') or '' for d in dishes_data])
     
+    return _with_digest(document)
+
+def index_menu(menu_data, restaurant_data=None, dishes_data=None):
+    """
+    Index a menu document in Azure Search.
+    
+    Args:
+        menu_data: A dictionary containing menu data
+        restaurant_data: Optional restaurant data for enriching the document
+        dishes_data: Optional list of dishes in the menu
+    """
     # Index the document
-    search_client.upload_documents(documents=[document])
+    _upload([_menu_document(menu_data, restaurant_data, dishes_data)])
+    return True
+
+def index_menu_with_dishes(menu_data, dishes_data, restaurant_data=None):
+    """
+    Index a menu and all its dishes with as few requests as possible.
+    
+    Args:
+        menu_data: A dictionary containing menu data
+        dishes_data: List of dishes of the menu (each with its '_id')
+        restaurant_data: Optional restaurant data for enriching the documents
+    """
+    documents = [_dish_document(dish, restaurant_data) for dish in dishes_data]
+    documents.append(_menu_document(menu_data, restaurant_data, dishes_data))
+    
+    _upload(documents)
     return True
 
-def search_restaurants(query_text="*", filters=None, sort=None, top=10, skip=0):
+def _execute_search(search_text, filter=None, order_by=None, top=50, skip=0,
+                    include_total_count=False, select=None, facets=None):
+    """
+    Run a query on the configured backend.
+    
+    Returns:
+        A tuple (list of results, total count or None, facets or None)
+    """
+    if _use_local_backend():
+        return get_local_engine().search(
+            search_text,
+            filter=filter,
+            order_by=order_by,
+            top=top,
+            skip=skip,
+            include_total_count=include_total_count,
+            select=select,
+            facets=facets
+        )
+    
+    search_client = get_search_client()
+    results = search_client.search(
+        search_text=search_text,
+        filter=filter,
+        order_by=order_by,
+        top=top,
+        skip=skip,
+        include_total_count=include_total_count,
+        select=select,
+        facets=facets
+    )
+    search_results = list(results)
+    return (
+        search_results,
+        results.get_count() if include_total_count else None,
+        results.get_facets() if facets else None
+    )
+
+# Campos devueltos por defecto en los listados de cada tipo
+LIST_VIEW_FIELDS = {
+    "restaurant": ["id", "type", "restaurant_id", "name", "description", "cuisine_type",
+                   "price", "avg_rating", "rating_count"],
+    "dish": ["id", "type", "dish_id", "restaurant_id", "name", "description", "category",
+             "price", "restrictions", "is_promoted", "avg_rating"],
+    "menu": ["id", "type", "menu_id", "restaurant_id", "name", "menu_type", "date",
+             "price", "restrictions"],
+}
+
+DEFAULT_RESULT_FIELDS = ["id", "type", "name", "description", "cuisine_type", "price", "restaurant_id"]
+
+# Tipos que se pueden usar para paginar por clave (los de fecha siguen con skip)
+KEYSET_FIELD_TYPES = (
+    SearchFieldDataType.String,
+    SearchFieldDataType.Double,
+    SearchFieldDataType.Int32,
+    SearchFieldDataType.Boolean,
+)
+
+def _parse_order_by(order_by):
+    """Turn ['field desc', ...] into [(field, descending), ...]."""
+    sort = []
+    for expression in order_by or []:
+        parts = expression.split()
+        sort.append((parts[0], len(parts) > 1 and parts[1].lower() == "desc"))
+    return sort
+
+def _odata_literal(value):
+    """Format a Python value as an OData literal."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return _odata_string(value)
+
+def _keyset_filter(sort, values):
+    """
+    Filter for the documents after ``values`` in ``sort`` order.
+    
+    Follows the service's null ordering: nulls first ascending, last descending.
+    """
+    clauses = []
+    for position, (field, descending) in enumerate(sort):
+        value = values[position]
+        equal = [f"{f} eq {_odata_literal(v)}" for (f, _), v in zip(sort[:position], values[:position])]
+        if value is None:
+            if descending:
+                continue
+            after = f"{field} ne null"
+        elif descending:
+            after = f"({field} lt {_odata_literal(value)} or {field} eq null)"
+        else:
+            after = f"{field} gt {_odata_literal(value)}"
+        clauses.append("(" + " and ".join(equal + [after]) + ")")
+    return " or ".join(clauses)
+
+class SearchResultIterator:
+    """
+    Lazy iterator over search results, fetched one page per request.
+    
+    Only the current page is kept in memory. When the results are sorted by
+    sortable string, numeric or boolean fields, pages continue from the last
+    document seen (an ``id`` tie-breaker is added to the sort) instead of
+    using ``skip``; relevance-ordered results fall back to ``skip``.
+    ``continuation_token`` resumes the iteration in another request.
+    
+    Args:
+        search_text: The text to search for
+        filter: Optional filter expression
+        order_by: Optional list of sort expressions
+        select: Fields to return, validated against the index schema
+        page_size: Results fetched per request
+        continuation_token: Token from a previous iterator of the same query
+        limit: Maximum number of results to return in total
+    """
+    
+    def __init__(self, search_text="*", filter=None, order_by=None, select=None,
+                 page_size=50, continuation_token=None, limit=None):
+        self.search_text = search_text
+        self.filter = filter
+        self.select = validate_select(select)
+        self.page_size = min(page_size, MAX_BATCH_SIZE)
+        self.limit = limit
+        
+        schema = get_index_schema()
+        self._sort = _parse_order_by(order_by)
+        for field, _ in self._sort:
+            if field != "search.score()" and not getattr(schema.get(field), "sortable", False):
+                raise ValueError(f"Search field is not sortable: {field}")
+        # El id desempata la paginación por clave; en el esquema 1 no es ordenable
+        self._keyset = bool(self._sort) and getattr(schema.get("id"), "sortable", False) and all(
+            field in schema and schema[field].type in KEYSET_FIELD_TYPES for field, _ in self._sort
+        )
+        if self._keyset and "id" not in [field for field, _ in self._sort]:
+            self._sort.append(("id", False))
+        
+        self._query_hash = hashlib.sha1(
+            json.dumps([search_text, filter, self._sort]).encode('utf-8')
+        ).hexdigest()[:12]
+        self._after = None
+        self._skip = 0
+        if continuation_token:
+            position = self._decode_token(continuation_token)
+            self._after = position.get("after")
+            self._skip = position.get("skip", 0)
+        self._returned = 0
+        self._exhausted = False
+        self.continuation_token = continuation_token
+    
+    def _decode_token(self, token):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid continuation token")
+        if not isinstance(position, dict) or position.get("q") != self._query_hash:
+            raise ValueError("Continuation token belongs to a different query")
+        return position
+    
+    def _encode_token(self, **position):
+        position["q"] = self._query_hash
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+    
+    def _fetch_page(self):
+        top = self.page_size
+        if self.limit is not None:
+            top = min(top, self.limit - self._returned)
+        if top <= 0:
+            self._exhausted = True
+            self.continuation_token = None
+            return []
+        
+        filter = self.filter
+        if self._keyset and self._after is not None:
+            after = _keyset_filter(self._sort, self._after)
+            filter = f"({filter}) and ({after})" if filter else after
+        
+        # Los campos de ordenación hacen falta para el siguiente cursor
+        fields = self.select
+        extra = []
+        if fields and self._keyset:
+            extra = [field for field, _ in self._sort if field not in fields]
+            fields = fields + extra
+        
+        results, _, _ = _execute_search(
+            self.search_text,
+            filter=filter,
+            order_by=[f"{field} {'desc' if descending else 'asc'}" for field, descending in self._sort] or None,
+            top=top,
+            skip=0 if self._keyset else self._skip,
+            select=fields
+        )
+        
+        if results and self._keyset:
+            last = results[-1]
+            self._after = [last.get(field) for field, _ in self._sort]
+        self._skip += len(results)
+        self._returned += len(results)
+        self._exhausted = len(results) < top or self._returned == self.limit
+        if self._exhausted:
+            self.continuation_token = None
+        elif self._keyset:
+            self.continuation_token = self._encode_token(after=self._after)
+        else:
+            self.continuation_token = self._encode_token(skip=self._skip)
+        
+        for result in results:
+            for field in extra:
+                result.pop(field, None)
+        return results
+    
+    def by_page(self):
+        """Yield the results one page (list) at a time."""
+        while not self._exhausted:
+            page = self._fetch_page()
+            if page:
+                yield page
+    
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+def iter_search(query_text="*", doc_type=None, filters=None, sort=None, select=None,
+                page_size=50, continuation_token=None, limit=None):
+    """
+    Search lazily, one page per request (see SearchResultIterator).
+    
+    Args:
+        query_text: The text to search for
+        doc_type: Optional document type ('restaurant', 'dish' or 'menu')
+        filters: Optional filter expressions
+        sort: Optional sort expressions
+        select: Fields to return (default: the list view fields of doc_type)
+        page_size: Results fetched per request
+        continuation_token: Token to resume a previous iteration
+        limit: Maximum number of results
+    
+    Returns:
+        A SearchResultIterator
+    """
+    if doc_type:
+        filters = f"type eq '{doc_type}' and ({filters})" if filters else f"type eq '{doc_type}'"
+        select = select or LIST_VIEW_FIELDS.get(doc_type)
+    return SearchResultIterator(
+        query_text,
+        filter=filters,
+        order_by=sort,
+        select=select,
+        page_size=page_size,
+        continuation_token=continuation_token,
+        limit=limit
+    )
+
+def search_restaurants(query_text="*", filters=None, sort=None, top=10, skip=0, select=None):
     """
     Search for restaurants based on a text query and filters.
     
@@ -207,39 +961,34 @@ def search_restaurants(query_text="*", filters=None, sort=None, top=10, skip=0):
         sort: Optional sort expressions
         top: Number of results to return
         skip: Number of results to skip
+        select: Fields to return (default: the list view fields)
     
     Returns:
         A list of search results
     """
-    search_client = get_search_client()
-    
     # Add type filter
     if filters:
-        filters = f"type eq 'restaurant' and {filters}"
+        filters = f"type eq 'restaurant' and ({filters})"
     else:
         filters = "type eq 'restaurant'"
     
     # Execute the search
-    results = search_client.search(
-        search_text=query_text,
+    search_results, total, _ = _execute_search(
+        query_text,
         filter=filters,
         order_by=sort,
         top=top,
         skip=skip,
-        include_total_count=True
+        include_total_count=True,
+        select=validate_select(select or LIST_VIEW_FIELDS["restaurant"])
     )
     
-    # Process the results
-    search_results = []
-    for result in results:
-        search_results.append(result)
-    
     return {
-        "total": results.get_count(),
+        "total": total,
         "results": search_results
     }
 
-def search_dishes(query_text="*", filters=None, sort=None, top=10, skip=0):
+def search_dishes(query_text="*", filters=None, sort=None, top=10, skip=0, select=None):
     """
     Search for dishes based on a text query and filters.
     
@@ -249,39 +998,34 @@ def search_dishes(query_text="*", filters=None, sort=None, top=10, skip=0):
         sort: Optional sort expressions
         top: Number of results to return
         skip: Number of results to skip
+        select: Fields to return (default: the list view fields)
     
     Returns:
         A list of search results
     """
-    search_client = get_search_client()
-    
     # Add type filter
     if filters:
-        filters = f"type eq 'dish' and {filters}"
+        filters = f"type eq 'dish' and ({filters})"
     else:
         filters = "type eq 'dish'"
     
     # Execute the search
-    results = search_client.search(
-        search_text=query_text,
+    search_results, total, _ = _execute_search(
+        query_text,
         filter=filters,
         order_by=sort,
         top=top,
         skip=skip,
-        include_total_count=True
+        include_total_count=True,
+        select=validate_select(select or LIST_VIEW_FIELDS["dish"])
     )
     
-    # Process the results
-    search_results = []
-    for result in results:
-        search_results.append(result)
-    
     return {
-        "total": results.get_count(),
+        "total": total,
         "results": search_results
     }
 
-def search_menus(query_text="*", filters=None, sort=None, top=10, skip=0):
+def search_menus(query_text="*", filters=None, sort=None, top=10, skip=0, select=None):
     """
     Search for menus based on a text query and filters.
     
@@ -291,38 +1035,164 @@ def search_menus(query_text="*", filters=None, sort=None, top=10, skip=0):
         sort: Optional sort expressions
         top: Number of results to return
         skip: Number of results to skip
+        select: Fields to return (default: the list view fields)
     
     Returns:
         A list of search results
     """
-    search_client = get_search_client()
-    
     # Add type filter
     if filters:
-        filters = f"type eq 'menu' and {filters}"
+        filters = f"type eq 'menu' and ({filters})"
     else:
         filters = "type eq 'menu'"
     
     # Execute the search
-    results = search_client.search(
-        search_text=query_text,
+    search_results, total, _ = _execute_search(
+        query_text,
         filter=filters,
         order_by=sort,
         top=top,
         skip=skip,
-        include_total_count=True
+        include_total_count=True,
+        select=validate_select(select or LIST_VIEW_FIELDS["menu"])
     )
     
-    # Process the results
-    search_results = []
-    for result in results:
-        search_results.append(result)
-    
     return {
-        "total": results.get_count(),
+        "total": total,
         "results": search_results
     }
 
+# Búsqueda unificada: una sola consulta para todos los tipos y sus facetas
+SEARCH_TYPES = ("restaurant", "dish", "menu")
+PRICE_FACET_BOUNDS = (10, 15, 20, 30)
+DEFAULT_FACETS = [
+    "type",
+    "cuisine_type,count:20",
+    "restrictions,count:20",
+    "price,values:" + "|".join(str(bound) for bound in PRICE_FACET_BOUNDS),
+    "menu_type",
+    "is_promoted",
+]
+
+def _odata_string(value):
+    """Quote a value as an OData string literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def build_facet_filter(cuisine_types=None, restrictions=None, menu_type=None,
+                       is_promoted=None, price_min=None, price_max=None):
+    """
+    Build the OData filter for the facet values selected by the user.
+    
+    Args:
+        cuisine_types: Cuisine types, any of them matches
+        restrictions: Dietary restrictions, all of them are required
+        menu_type: Menu type
+        is_promoted: Only promoted (True) or non promoted (False) documents
+        price_min: Minimum price (inclusive)
+        price_max: Maximum price (exclusive, like the price facet buckets)
+    
+    Returns:
+        The filter expression, or None when nothing is selected
+    """
+    clauses = []
+    if cuisine_types:
+        options = " or ".join(f"c eq {_odata_string(value)}" for value in cuisine_types)
+        clauses.append(f"cuisine_type/any(c: {options})")
+    for restriction in restrictions or []:
+        clauses.append(f"restrictions/any(r: r eq {_odata_string(restriction)})")
+    if menu_type:
+        clauses.append(f"menu_type eq {_odata_string(menu_type)}")
+    if is_promoted is not None:
+        clauses.append(f"is_promoted eq {'true' if is_promoted else 'false'}")
+    if price_min is not None:
+        clauses.append(f"price ge {float(price_min)}")
+    if price_max is not None:
+        clauses.append(f"price lt {float(price_max)}")
+    return " and ".join(clauses) or None
+
+def _available_facets(facets):
+    """
+    Keep the facet expressions whose field is facetable in the index in use.
+    
+    Indexes of schema version 1 have no facetable fields, and Azure rejects
+    the whole query if one facet is not facetable.
+    """
+    if _use_local_backend():
+        return list(facets)
+    available = []
+    for expression in facets:
+        name = expression.split(",")[0]
+        field = get_live_index_field(name) if _live_index is not None else get_index_schema().get(name)
+        if getattr(field, "facetable", False):
+            available.append(expression)
+    return available
+
+def search_all(query_text="*", filters=None, top=30, skip=0, facets=None, select=None):
+    """
+    Search restaurants, dishes and menus with a single query.
+    
+    One request returns the best matches of every type, the number of
+    matches per type and the facets for the search sidebar, instead of one
+    request per type. Results are ranked together, so ``top`` is shared by
+    all types; ``counts`` holds the per-type totals.
+    
+    Args:
+        query_text: The text to search for
+        filters: Optional filter expression (see build_facet_filter)
+        top: Number of results to return across all types
+        skip: Number of results to skip
+        facets: Facet expressions (default: DEFAULT_FACETS); those the index
+            cannot compute are left out
+        select: Fields to return (default: DEFAULT_RESULT_FIELDS)
+    
+    Returns:
+        A dict with total, counts per type, results grouped by type and facets.
+        Without a facetable ``type`` field the counts are those of the
+        returned results.
+    """
+    facets = list(facets or DEFAULT_FACETS)
+    if "type" not in facets:
+        facets.append("type")
+    facets = _available_facets(facets)
+    select = validate_select(select or DEFAULT_RESULT_FIELDS)
+    if "type" not in select:
+        select.append("type")
+    cache_key = ("all", normalize_query(query_text), filters, top, skip, tuple(facets), tuple(select))
+    
+    def run_search():
+        search_results, total, facet_results = _execute_search(
+            query_text,
+            filter=filters,
+            top=top,
+            skip=skip,
+            include_total_count=True,
+            facets=facets or None,
+            select=select
+        )
+        
+        grouped = {doc_type: [] for doc_type in SEARCH_TYPES}
+        for result in search_results:
+            grouped.setdefault(result.get("type"), []).append(result)
+        
+        facet_results = dict(facet_results or {})
+        counts = {doc_type: 0 for doc_type in SEARCH_TYPES}
+        if "type" in facets:
+            for bucket in facet_results.pop("type", []):
+                counts[bucket["value"]] = bucket["count"]
+        else:
+            for doc_type, results in grouped.items():
+                counts[doc_type] = len(results)
+        
+        return {
+            "total": total,
+            "counts": counts,
+            "results": grouped,
+            "facets": facet_results
+        }
+    
+    # Como en la caché de entidades: el llamador puede modificar el resultado
+    return copy.deepcopy(get_query_cache().get_or_load(cache_key, run_search))
+
 def delete_document(doc_id):
     """
     Delete a document from the search index.
@@ -330,34 +1200,95 @@ def delete_document(doc_id):
     Args:
         doc_id: The ID of the document to delete
     """
+    return delete_documents([doc_id])
+
+def delete_documents(doc_ids):
+    """
+    Delete several documents from the search index.
+    
+    Args:
+        doc_ids: The IDs of the documents to delete
+    """
+    invalidate_query_cache()
+    remove_suggestions(doc_ids)
+    if _use_local_backend():
+        get_local_engine().delete(doc_ids)
+        return True
+    
+    indexer = get_indexer()
+    if indexer is not None:
+        indexer.delete(doc_ids)
+        return True
+    
     search_client = get_search_client()
-    search_client.delete_documents(documents=[{"id": doc_id}])
+    for start in range(0, len(doc_ids), MAX_BATCH_SIZE):
+        search_client.delete_documents(documents=[{"id": doc_id} for doc_id in doc_ids[start:start + MAX_BATCH_SIZE]])
     return True
 
-def search_restaurants_and_dishes(query, limit=50):
+def index_documents(documents):
+    """
+    Index already built search documents (see the _*_document builders).
+    
+    Args:
+        documents: List of search documents
+    """
+    if documents:
+        _upload(documents)
+    return True
+
+def normalize_query(text):
+    """Normalize a query for cache keys: lowercase, no accents, single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+# Caché de resultados por proceso para las consultas más repetidas
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    """Return this process' search result cache."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = TTLCache(
+                    max_size=current_app.config.get('SEARCH_CACHE_MAX_SIZE', 1000),
+                    ttl=current_app.config.get('SEARCH_CACHE_TTL_SECONDS', 60)
+                )
+    return _query_cache
+
+def invalidate_query_cache():
+    """
+    Drop every cached search result of this process.
+    
+    Called whenever this process changes the index; other workers rely on
+    the TTL (SEARCH_CACHE_TTL_SECONDS) to pick up the change.
+    """
+    if _query_cache is not None:
+        _query_cache.clear()
+
+def get_query_cache_stats():
+    """Return hit ratio and estimated latency saved by the search result cache."""
+    return get_query_cache().stats()
+
+def search_restaurants_and_dishes(query, limit=50, select=None):
     """
     Buscar restaurantes y platos que coincidan con la consulta.
     
     Args:
         query (str): Texto a buscar
         limit (int): Número máximo de resultados
+        select (list): Campos a devolver
     
     Returns:
         list: Lista de resultados (restaurantes y platos)
     """
     try:
-        client = get_search_client()
-        
         # Realizar la búsqueda
-        results = client.search(
-            search_text=query,
-            select=["id", "type", "name", "description", "cuisine", "price", "restaurant_id"],
-            top=limit
-        )
-        
-        # Convertir resultados a lista
-        return list(results)
-        
+        results, _, _ = _execute_search(query, top=limit, select=validate_select(select or DEFAULT_RESULT_FIELDS))
+        return results
+    
     except Exception as e:
         print(f"Error en la búsqueda: {str(e)}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,382 @@
+import logging
+import math
+import threading
+import time
+
+from app.services.db_service import iter_collection_batches
+from app.services.local_search import fold_text, TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Sugerencias guardadas en cada nodo del trie
+TOP_K = 10
+
+# Longitud máxima (en caracteres normalizados) de una sugerencia en el trie
+MAX_PHRASE_LENGTH = 60
+
+def normalize_phrase(text):
+    """Accent-folded, lowercase words separated by single spaces."""
+    return " ".join(TOKEN_PATTERN.findall(fold_text(text or "")))
+
+def _popularity(record):
+    """Ranking weight of a restaurant or dish: rating weighted by number of ratings, plus promotion."""
+    rating = record.get("avg_rating") or 0
+    count = record.get("rating_count") or 0
+    weight = 1.0 + rating * math.log1p(count)
+    if record.get("is_promoted"):
+        weight += 1.0 + (record.get("promotion_level") or 0)
+    return weight
+
+def suggestions_for(doc_type, record):
+    """
+    Suggestions contributed by a restaurant or dish (search document or Mongo record).
+    
+    Returns:
+        A list of (kind, text, weight)
+    """
+    if doc_type == "restaurant":
+        contributions = [("restaurant", record.get("name"), _popularity(record))]
+        contributions += [("cuisine", cuisine, 1.0) for cuisine in record.get("cuisine_type") or []]
+    elif doc_type == "dish":
+        contributions = [("dish", record.get("name"), _popularity(record))]
+        contributions += [("ingredient", ingredient, 0.5) for ingredient in record.get("ingredients") or []]
+    else:
+        return []
+    return [(kind, text, weight) for kind, text, weight in contributions if text]
+
+class _Node:
+    __slots__ = ("children", "top", "terms")
+    
+    def __init__(self):
+        self.children = {}
+        self.top = []       # claves de las mejores frases bajo este nodo (todos sus tipos)
+        self.terms = None   # claves de las sugerencias que terminan aquí
+
+class SuggestionTrie:
+    """
+    Prefix index of suggestions ranked by popularity.
+    
+    Every suggestion (kind, normalized phrase) is reachable from the start of
+    each of its words, so 'valen' finds 'Paella valenciana'. Each node keeps
+    the keys of its best phrases, so a lookup is a walk down the prefix and a
+    slice, independent of how many suggestions share the prefix. Nodes keep
+    twice TOP_K distinct phrases, each with all of its kinds ('Paella' as a
+    dish and as an ingredient takes one slot), so that a small score decrease
+    can usually be handled by re-sorting the list instead of rebuilding it
+    from the children.
+    
+    Scores are the sum of the weights contributed by the restaurants and
+    dishes (``sources``) that mention the suggestion; updating or removing
+    a source subtracts its previous contributions.
+    """
+    
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.capacity = 2 * top_k
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self._terms = {}    # (kind, phrase) -> {"text", "kind", "score", "refs"}
+        self._sources = {}  # source id -> [(key, weight), ...]
+    
+    def __len__(self):
+        return len(self._terms)
+    
+    def set_source(self, source_id, contributions):
+        """Replace the suggestions contributed by a source (list of (kind, text, weight))."""
+        with self._lock:
+            changes = {}
+            for key, weight in self._sources.pop(source_id, []):
+                self._terms[key]["refs"] -= 1
+                changes[key] = changes.get(key, 0.0) - weight
+            created = []
+            for key, weight in self._add_source(source_id, contributions, created):
+                self._terms[key]["score"] -= weight
+                changes[key] = changes.get(key, 0.0) + weight
+            
+            # Los cambios se aplican de uno en uno: cada actualización de las
+            # listas supone que el resto de puntuaciones no se ha movido.
+            # Solo se reordenan las sugerencias cuya puntuación cambia de verdad.
+            for key in created:
+                self._promote(key)
+            for key, delta in changes.items():
+                term = self._terms[key]
+                term["score"] += delta
+                if term["refs"] <= 0:
+                    del self._terms[key]
+                    self._demote(key)
+                elif delta > 0:
+                    self._promote(key)
+                elif delta < 0:
+                    self._demote(key)
+    
+    def remove_source(self, source_id):
+        self.set_source(source_id, [])
+    
+    def load(self, sources):
+        """Bulk-add (source id, contributions) pairs, computing the top lists once at the end."""
+        with self._lock:
+            for source_id, contributions in sources:
+                self._add_source(source_id, contributions)
+            self._rebuild(self._root)
+    
+    def _add_source(self, source_id, contributions, created=None):
+        entries = []
+        for kind, text, weight in contributions:
+            text = str(text).strip()
+            phrase = normalize_phrase(text)[:MAX_PHRASE_LENGTH].strip()
+            if not phrase:
+                continue
+            key = (kind, phrase)
+            term = self._terms.get(key)
+            if term is None:
+                term = self._terms[key] = {"text": text, "kind": kind, "score": 0.0, "refs": 0}
+                self._insert(key)
+                if created is not None:
+                    created.append(key)
+            term["score"] += weight
+            term["refs"] += 1
+            entries.append((key, weight))
+        if entries:
+            self._sources[source_id] = entries
+        return entries
+    
+    def _rebuild(self, node):
+        """Recompute the top lists of a subtree from its terms (post-order)."""
+        candidates = set(node.terms or ())
+        for child in node.children.values():
+            self._rebuild(child)
+            candidates.update(child.top)
+        node.top = self._select(candidates)
+    
+    def _select(self, candidates):
+        """Keys of the best `capacity` phrases among candidates (every kind of each), best first."""
+        phrases = set()
+        top = []
+        for key in sorted(candidates, key=self._score, reverse=True):
+            if key[1] not in phrases:
+                if len(phrases) >= self.capacity:
+                    continue
+                phrases.add(key[1])
+            top.append(key)
+        return top
+    
+    def _phrase_scores(self, keys):
+        """Score of each phrase among keys: the best score of its kinds."""
+        scores = {}
+        for key in keys:
+            scores[key[1]] = max(scores.get(key[1], float("-inf")), self._score(key))
+        return scores
+    
+    def _paths(self, phrase):
+        """Node paths (root first) for every word start of the phrase, created on demand."""
+        starts = [0] + [i + 1 for i, char in enumerate(phrase) if char == " "]
+        for start in starts:
+            node = self._root
+            path = [node]
+            for char in phrase[start:]:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                path.append(node)
+            yield path
+    
+    def _insert(self, key):
+        for path in self._paths(key[1]):
+            terminal = path[-1]
+            if terminal.terms is None:
+                terminal.terms = set()
+            terminal.terms.add(key)
+    
+    def _score(self, key):
+        term = self._terms.get(key)
+        return term["score"] if term is not None else float("-inf")
+    
+    def _promote(self, key):
+        """Account for a higher score of key: insert it into the top lists along its paths."""
+        score = self._score(key)
+        for path in self._paths(key[1]):
+            # Si la frase entra en una lista, entra con todos sus tipos
+            kinds = [k for k in path[-1].terms if k[1] == key[1] and k in self._terms]
+            for node in path[1:]:
+                top = node.top
+                if key in top:
+                    top.sort(key=self._score, reverse=True)
+                    continue
+                phrase_scores = self._phrase_scores(top)
+                if (key[1] in phrase_scores or len(phrase_scores) < self.capacity
+                        or score > min(phrase_scores.values())):
+                    # Puede desplazar a la peor frase (con todos sus tipos)
+                    node.top = self._select(set(top).union(kinds))
+    
+    def _demote(self, key):
+        """Account for a lower score (or removal) of key: rebuild the affected top lists bottom-up."""
+        removed = key not in self._terms
+        paths = list(self._paths(key[1]))
+        # Los caminos de cada palabra comparten nodos ('pimiento pasta' pasa dos
+        # veces por 'p'): se recorren todos a la vez, de los más profundos a la
+        # raíz, para que cada lista se rehaga con las de sus hijos ya al día
+        nodes = {}
+        for path in paths:
+            if removed and path[-1].terms:
+                path[-1].terms.discard(key)
+            for depth, node in enumerate(path[1:], 1):
+                nodes[id(node)] = (depth, node)
+        for depth, node in sorted(nodes.values(), key=lambda item: item[0], reverse=True):
+            top = node.top
+            if key not in top:
+                continue
+            remaining = [k for k in top if k in self._terms]
+            phrase_scores = self._phrase_scores(remaining)
+            if len(self._phrase_scores(top)) < self.capacity:
+                # La lista contiene todo el subárbol: basta con reordenar
+                node.top = sorted(remaining, key=self._score, reverse=True)
+                continue
+            score = phrase_scores.pop(key[1], None)
+            if score is not None and score >= min(phrase_scores.values(), default=score):
+                # La frase sigue por encima de las demás de la lista
+                node.top = sorted(remaining, key=self._score, reverse=True)
+                continue
+            candidates = set(node.terms or ())
+            for child in node.children.values():
+                candidates.update(child.top)
+            candidates.intersection_update(self._terms)
+            node.top = self._select(candidates)
+        if removed:
+            for path in paths:
+                self._prune(path)
+    
+    def _prune(self, path):
+        """Drop nodes left without suggestions at the end of a path."""
+        for depth in range(len(path) - 1, 0, -1):
+            node = path[depth]
+            if node.children or node.terms:
+                break
+            parent = path[depth - 1]
+            for char, child in list(parent.children.items()):
+                if child is node:
+                    del parent.children[char]
+                    break
+    
+    def suggest(self, prefix, limit=TOP_K, kinds=None):
+        """
+        Best suggestions starting (at any word) with the prefix.
+        
+        Args:
+            prefix: Text typed by the user
+            limit: Maximum number of suggestions (at most TOP_K is meaningful)
+            kinds: Optional kinds to keep ('restaurant', 'dish', 'cuisine', 'ingredient')
+        
+        Returns:
+            A list of {"text", "type", "score"}
+        """
+        phrase = normalize_phrase(prefix)
+        if prefix[-1:].isspace() and phrase:
+            phrase += " "
+        if not phrase:
+            return []
+        with self._lock:
+            node = self._root
+            for char in phrase:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            results = []
+            seen = set()
+            for key in node.top:
+                term = self._terms[key]
+                if (kinds and term["kind"] not in kinds) or key[1] in seen:
+                    continue
+                # 'Paella' como plato y como ingrediente se sugiere una sola vez
+                seen.add(key[1])
+                results.append({"text": term["text"], "type": term["kind"], "score": round(term["score"], 3)})
+                if len(results) >= limit:
+                    break
+            return results
+    
+    def stats(self):
+        with self._lock:
+            return {"suggestions": len(self._terms), "sources": len(self._sources)}
+
+# Trie por proceso: se construye desde MongoDB en segundo plano al arrancar y
+# se reconstruye cada SUGGEST_REBUILD_SECONDS para recoger los cambios hechos
+# por otros workers; los cambios de este proceso se aplican al momento.
+_trie = None
+_trie_lock = threading.Lock()
+_loaded_at = None
+
+_SOURCES = (
+    ("restaurants", "restaurant", {"name": 1, "cuisine_type": 1, "avg_rating": 1, "rating_count": 1}),
+    ("dishes", "dish", {"name": 1, "ingredients": 1, "avg_rating": 1, "rating_count": 1,
+                        "is_promoted": 1, "promotion_level": 1}),
+)
+
+def _iter_sources(batch_size):
+    for collection, doc_type, projection in _SOURCES:
+        for batch in iter_collection_batches(collection, batch_size=batch_size,
+                                             query={"active": {"$ne": False}}, projection=projection):
+            for record in batch:
+                yield f"{doc_type}_{record['_id']}", suggestions_for(doc_type, record)
+
+def build_trie(batch_size=1000):
+    """Build a SuggestionTrie from the active restaurants and dishes in MongoDB."""
+    trie = SuggestionTrie()
+    trie.load(_iter_sources(batch_size))
+    return trie
+
+def _load(app):
+    global _trie, _loaded_at
+    with app.app_context():
+        start = time.perf_counter()
+        try:
+            trie = build_trie()
+        except Exception as e:
+            logger.error(f"Error building suggestions: {str(e)}")
+            return
+        with _trie_lock:
+            _trie = trie
+            _loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(trie)} suggestions in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def _run(app, interval):
+    while True:
+        _load(app)
+        time.sleep(interval)
+
+def init_suggest_service(app):
+    """Build the suggestions in a background thread and rebuild them periodically."""
+    interval = app.config.get('SUGGEST_REBUILD_SECONDS', 600)
+    threading.Thread(target=_run, args=(app, interval), name="suggest-loader", daemon=True).start()
+
+def suggest(prefix, limit=TOP_K, kinds=None):
+    """Suggestions for a prefix; empty until the first build has finished."""
+    trie = _trie
+    if trie is None:
+        return []
+    return trie.suggest(prefix, limit, kinds)
+
+def update_suggestions(documents):
+    """Apply indexed restaurant and dish documents to this process' suggestions (if loaded)."""
+    trie = _trie
+    if trie is None:
+        return
+    for document in documents:
+        if document.get("type") in ("restaurant", "dish"):
+            trie.set_source(document["id"], suggestions_for(document["type"], document))
+
+def remove_suggestions(doc_ids):
+    """Forget the suggestions of deleted documents (if loaded)."""
+    trie = _trie
+    if trie is None:
+        return
+    for doc_id in doc_ids:
+        trie.remove_source(doc_id)
+
+def get_suggest_stats():
+    trie = _trie
+    if trie is None:
+        return {"loaded": False}
+    stats = trie.stats()
+    stats["loaded"] = True
+    stats["age_seconds"] = time.monotonic() - _loaded_at
+    return stats
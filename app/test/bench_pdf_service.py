@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+from app.services.pdf_service import parse_menu_text, iter_pdf_pages
+
+# Uso: python -m app.test.bench_pdf_service <carpeta con PDFs o .txt> [repeticiones]
+
+def load_corpus(corpus_dir):
+    """Load every menu of the corpus as text (PDFs are extracted once, outside the timing)."""
+    corpus = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, file_name)
+        if file_name.endswith('.txt'):
+            with open(path, encoding='utf-8') as f:
+                corpus.append(f.read())
+        elif file_name.endswith('.pdf'):
+            with open(path, 'rb') as f:
+                corpus.append("".join(iter_pdf_pages(f, max_pages=1000, max_seconds=600, max_chars=10 ** 9)))
+    return corpus
+
+def bench_parse(corpus, repeat=5):
+    """Measure parse_menu_text throughput over the corpus."""
+    total_bytes = sum(len(text.encode('utf-8')) for text in corpus)
+    total_lines = sum(text.count('\n') + 1 for text in corpus)
+    
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            parse_menu_text(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    print(f"Menús: {len(corpus)}  Líneas: {total_lines}  Tamaño: {total_bytes / 1024:.0f} KiB")
+    print(f"Mejor tiempo: {best * 1000:.1f} ms")
+    print(f"Rendimiento: {len(corpus) / best:.0f} menús/s, "
+          f"{total_lines / best:.0f} líneas/s, {total_bytes / best / 1024 / 1024:.2f} MiB/s")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python -m app.test.bench_pdf_service <carpeta> [repeticiones]")
+        sys.exit(1)
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    bench_parse(load_corpus(sys.argv[1]), repeat)
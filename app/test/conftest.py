@@ -0,0 +1,29 @@
+from flask import Flask
+import pytest
+
+from app.services import db_service
+
+@pytest.fixture
+def app(tmp_path):
+    """Application context with the test configuration (local search backend)."""
+    app = Flask('app')
+    app.config.from_object('app.config.Config')
+    app.config.update(
+        TESTING=True,
+        SEARCH_BACKEND='local',
+        LOCAL_SEARCH_INDEX_PATH=str(tmp_path / "search_index.pkl"),
+        SEARCH_INDEXER_ASYNC=False,
+        INGESTION_ASYNC=False
+    )
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def db(app, monkeypatch):
+    """In-memory MongoDB (mongomock) used by every db_service function."""
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().lacuchara
+    monkeypatch.setattr(db_service, "get_db", lambda: database)
+    # La caché de entidades es por proceso: cada test empieza sin ella
+    monkeypatch.setattr(db_service, "_entity_cache", None)
+    return database
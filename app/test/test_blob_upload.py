@@ -0,0 +1,62 @@
+import io
+from types import SimpleNamespace
+
+from app.services import blob_service
+
+class RecordingBlobClient:
+    blob_name = "r1_abc.pdf"
+    
+    def __init__(self):
+        self.calls = []
+    
+    def upload_blob(self, data, **kwargs):
+        self.calls.append((data, kwargs))
+
+def test_upload_streams_the_whole_file_in_parallel_blocks(app):
+    app.config.update(BLOB_UPLOAD_STREAMING=True, BLOB_UPLOAD_MAX_CONCURRENCY=6)
+    stream = io.BytesIO(b"%PDF-1.4" + b"x" * 1000)
+    # Otro lector (la extracción) dejó el cursor en mitad del fichero
+    stream.seek(500)
+    upload = SimpleNamespace(stream=stream, filename="carta.pdf")
+    client = RecordingBlobClient()
+    
+    blob_service._upload_stream(client, upload, {"content_sha256": "abc"})
+    
+    [(data, kwargs)] = client.calls
+    assert data is stream
+    assert stream.tell() == 0
+    assert kwargs["length"] == 1008
+    assert kwargs["max_concurrency"] == 6
+    assert kwargs["overwrite"] is True
+    assert kwargs["metadata"] == {"content_sha256": "abc"}
+    assert kwargs["content_settings"].content_type == "application/pdf"
+
+def test_upload_without_streaming_uses_the_sdk_defaults(app):
+    app.config.update(BLOB_UPLOAD_STREAMING=False)
+    client = RecordingBlobClient()
+    
+    blob_service._upload_stream(client, io.BytesIO(b"%PDF-1.4"))
+    
+    [(_, kwargs)] = client.calls
+    assert "max_concurrency" not in kwargs
+    assert kwargs["length"] == 8
+
+def test_blob_service_uses_the_configured_block_size(app, monkeypatch):
+    app.config.update(AZURE_STORAGE_CONNECTION_STRING="UseDevelopmentStorage=true",
+                      BLOB_UPLOAD_CHUNK_SIZE=1024 * 1024)
+    created = []
+    monkeypatch.setattr(blob_service.BlobServiceClient, "from_connection_string",
+                        lambda conn_str, **kwargs: created.append(kwargs) or object())
+    
+    first = blob_service.get_blob_service()
+    
+    assert blob_service.get_blob_service() is first
+    assert created == [{"max_block_size": 1024 * 1024, "max_single_put_size": 1024 * 1024}]
+
+def test_content_hash_rewinds_the_stream():
+    stream = io.BytesIO(b"%PDF-1.4 carta")
+    
+    digest = blob_service.compute_content_hash(stream, chunk_size=4)
+    
+    assert digest == blob_service.compute_content_hash(io.BytesIO(b"%PDF-1.4 carta"))
+    assert stream.tell() == 0
@@ -0,0 +1,163 @@
+import time
+
+from bson import ObjectId
+from flask import g
+
+from app.services import db_service
+from app.services.cache import TTLCache, approximate_size
+
+def test_get_or_load_hit():
+    cache = TTLCache(max_size=10, ttl=60)
+    calls = []
+    
+    def loader():
+        calls.append(1)
+        return {"name": "Casa Pepe"}
+    
+    assert cache.get_or_load("a", loader) == {"name": "Casa Pepe"}
+    assert cache.get_or_load("a", loader) == {"name": "Casa Pepe"}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["loads"] == 1
+
+def test_get_or_load_refresh_replaces_value():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.get_or_load("a", lambda: 2, refresh=True) == 2
+    assert cache.get("a") == 2
+
+def test_delete_invalidates_entry():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert cache.get_or_load("a", lambda: 2) == 2
+    assert cache.stats()["invalidations"] == 1
+
+def test_entries_expire():
+    cache = TTLCache(max_size=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_keeps_memory_accounting():
+    cache = TTLCache(max_size=2, ttl=60, sizeof=approximate_size)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y")
+    cache.get("a")
+    cache.set("c", "z")
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 100
+    assert cache.stats()["memory_bytes"] == approximate_size("x" * 100) + approximate_size("z")
+
+def test_load_raced_by_delete_is_not_stored():
+    cache = TTLCache(max_size=10, ttl=60)
+    
+    def loader():
+        # Una escritura invalida la clave mientras la lectura está en curso
+        cache.delete("a")
+        return "stale"
+    
+    assert cache.get_or_load("a", loader) == "stale"
+    assert cache.get("a") is None
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
+    assert cache.get("a") == "fresh"
+
+def test_load_raced_by_clear_is_not_stored():
+    cache = TTLCache(max_size=10, ttl=60)
+    
+    def loader():
+        cache.clear()
+        return "stale"
+    
+    cache.get_or_load("a", loader)
+    assert cache.get("a") is None
+
+def test_delete_of_other_key_does_not_drop_load():
+    cache = TTLCache(max_size=10, ttl=60)
+    
+    def loader():
+        cache.delete("b")
+        return 1
+    
+    cache.get_or_load("a", loader)
+    assert cache.get("a") == 1
+
+def test_failed_load_is_not_left_in_flight():
+    cache = TTLCache(max_size=10, ttl=60)
+    
+    def loader():
+        raise RuntimeError("mongo down")
+    
+    try:
+        cache.get_or_load("a", loader)
+    except RuntimeError:
+        pass
+    assert cache._loading == {}
+    assert cache.get_or_load("a", lambda: 1) == 1
+
+def _new_request():
+    g.pop('entity_memo', None)
+
+def test_entity_reads_go_through_cache(db):
+    restaurant_id = db_service.create_restaurant({"name": "Casa Pepe"})
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Pepe"
+    
+    # Escritura de otro worker: esta caché no se entera hasta que caduque
+    db.restaurants.update_one({"_id": ObjectId(restaurant_id)}, {"$set": {"name": "Casa Juan"}})
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Pepe"
+    
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id, fresh=True)["name"] == "Casa Juan"
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Juan"
+
+def test_entity_cache_forgets_own_writes(db):
+    restaurant_id = db_service.create_restaurant({"name": "Casa Pepe"})
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Pepe"
+    db_service.update_restaurant(restaurant_id, {"name": "Casa Juan"})
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Juan"
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Juan"
+
+def test_entity_cache_returns_copies(db):
+    restaurant_id = db_service.create_restaurant({"name": "Casa Pepe"})
+    db_service.get_restaurant(restaurant_id)["name"] = "mutated"
+    _new_request()
+    assert db_service.get_restaurant(restaurant_id)["name"] == "Casa Pepe"
+
+def test_get_many_or_load_only_loads_missing_keys():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    calls = []
+    
+    def loader(keys):
+        calls.append(list(keys))
+        return {key: key.upper() for key in keys}
+    
+    assert cache.get_many_or_load(["a", "b", "c", "b"], loader) == {"a": 1, "b": "B", "c": "C"}
+    assert calls == [["b", "c"]]
+    assert cache.get_many_or_load(["b", "c"], loader) == {"b": "B", "c": "C"}
+    assert len(calls) == 1
+
+def test_get_many_or_load_does_not_cache_left_out_keys():
+    cache = TTLCache(max_size=10, ttl=60)
+    assert cache.get_many_or_load(["a", "b"], lambda keys: {"a": 1}) == {"a": 1}
+    assert cache.get("b") is None
+    assert cache._loading == {}
+
+def test_get_many_or_load_raced_by_delete():
+    cache = TTLCache(max_size=10, ttl=60)
+    
+    def loader(keys):
+        cache.delete("a")
+        return {"a": "stale", "b": "fresh"}
+    
+    assert cache.get_many_or_load(["a", "b"], loader) == {"a": "stale", "b": "fresh"}
+    assert cache.get("a") is None
+    assert cache.get("b") == "fresh"
@@ -0,0 +1,66 @@
+from azure.search.documents.indexes.models import SearchIndex
+from bson.objectid import ObjectId
+import pytest
+
+from app.services import consistency_service, search_service
+from app.services.local_search import LocalSearchEngine
+from app.services.reindex_service import RestaurantLookup, build_documents
+
+@pytest.fixture
+def index(app, db, monkeypatch):
+    """Local v2 index built from Mongo, as reindex_service would."""
+    app.config["SEARCH_SCHEMA_VERSION"] = 2
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    engine = LocalSearchEngine()
+    monkeypatch.setattr(search_service, "_local_engine", engine)
+    
+    restaurant_id = ObjectId()
+    db.restaurants.insert_one({"_id": restaurant_id, "name": "Casa Pepe", "cuisine_type": ["española"]})
+    db.dishes.insert_many([{"_id": ObjectId(), "name": f"Plato {i}", "restaurant_id": str(restaurant_id),
+                            "price": 8.0 + i} for i in range(5)])
+    lookup = RestaurantLookup()
+    for collection in ("restaurants", "dishes"):
+        engine.upload(build_documents(collection, list(db[collection].find()), lookup))
+    return engine
+
+def _drift(reports):
+    return {collection: (report["missing"], report["stale"], report["orphaned"])
+            for collection, report in reports.items()}
+
+def test_index_built_from_mongo_has_no_drift(index):
+    reports = consistency_service.check_consistency(collections=("restaurants", "dishes"))
+    
+    assert _drift(reports) == {"restaurants": (0, 0, 0), "dishes": (0, 0, 0)}
+    assert reports["dishes"]["checked"] == 5
+
+def test_drift_is_reported_and_repaired(index, db):
+    dishes = list(db.dishes.find().sort("_id", 1))
+    db.dishes.update_one({"_id": dishes[0]["_id"]}, {"$set": {"price": 20.0}})
+    db.dishes.update_one({"_id": dishes[1]["_id"]}, {"$set": {"active": False}})
+    index.delete([f"dish_{dishes[2]['_id']}"])
+    index.merge_or_upload([{"id": "dish_gone", "type": "dish", "name": "Fantasma"}])
+    
+    reports = consistency_service.check_consistency(collections=("dishes",))
+    
+    report = reports["dishes"]
+    assert _drift(reports) == {"dishes": (1, 1, 2)}
+    assert report["samples"]["stale"] == [f"dish_{dishes[0]['_id']}"]
+    assert report["samples"]["missing"] == [f"dish_{dishes[2]['_id']}"]
+    assert set(report["samples"]["orphaned"]) == {"dish_gone", f"dish_{dishes[1]['_id']}"}
+    assert report["repaired"] == 0
+    
+    repaired = consistency_service.check_consistency(repair=True, collections=("dishes",))
+    assert repaired["dishes"]["repaired"] == 4
+    assert index.get_document(f"dish_{dishes[0]['_id']}")["price"] == 20.0
+    assert index.get_document("dish_gone") is None
+    assert _drift(consistency_service.check_consistency(collections=("dishes",))) == {"dishes": (0, 0, 0)}
+
+def test_v1_index_is_rejected(app, monkeypatch):
+    monkeypatch.setattr(search_service, "_live_index", None)
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    monkeypatch.setattr(search_service, "_missing_fields", frozenset())
+    search_service._set_live_index(SearchIndex(name="lacuchara-index", fields=search_service._index_fields(1)))
+    
+    with pytest.raises(RuntimeError, match="--schema-version 2"):
+        consistency_service.check_consistency()
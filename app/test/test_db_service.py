@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from app.services import db_service
+
+class FakeMongoClient:
+    created = []
+    
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self.closed = False
+        FakeMongoClient.created.append(self)
+    
+    def __getitem__(self, name):
+        return ("database", name, self)
+    
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_client(app, monkeypatch):
+    FakeMongoClient.created = []
+    monkeypatch.setattr(db_service, "MongoClient", FakeMongoClient)
+    monkeypatch.setattr(db_service, "_client", None)
+    monkeypatch.setattr(db_service, "_client_pid", None)
+    app.config.update(MONGO_URI="mongodb://example", MONGO_DB_NAME="lacuchara", MONGO_MAX_POOL_SIZE=7)
+    return app
+
+def test_one_pooled_client_per_process(fake_client):
+    client = db_service.get_client()
+    
+    assert db_service.get_client() is client
+    assert db_service.get_db() == ("database", "lacuchara", client)
+    assert len(FakeMongoClient.created) == 1
+    assert client.options["maxPoolSize"] == 7
+    assert client.options["connect"] is False
+
+def test_forked_child_opens_its_own_client(fake_client, monkeypatch):
+    parent = db_service.get_client()
+    
+    # Aunque no se ejecute el hook de register_at_fork, el pid delata al hijo
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    child = db_service.get_client()
+    
+    assert child is not parent
+    assert parent.closed is False
+    assert db_service._client_pid == -1
+
+def test_shutdown_closes_the_client_of_this_process(fake_client):
+    client = db_service.get_client()
+    
+    db_service.shutdown_client()
+    
+    assert client.closed is True
+    assert db_service.get_client() is not client
+
+def test_create_dishes_inserts_all_in_order(db):
+    dishes = [{"name": "Gazpacho"}, {"name": "Tortilla"}, {"name": "Flan"}]
+    
+    dish_ids = db_service.create_dishes(dishes)
+    
+    stored = list(db.dishes.find().sort("_id", 1))
+    assert [str(dish["_id"]) for dish in stored] == dish_ids
+    assert [dish["name"] for dish in stored] == ["Gazpacho", "Tortilla", "Flan"]
+    assert dish_ids == [str(dish["_id"]) for dish in dishes]
+    assert len({dish["created_at"] for dish in stored}) == 1
+    assert db_service.create_dishes([]) == []
+
+def _walk(fetch):
+    """Ids of every page of a keyset listing, following next_cursor."""
+    ids, after = [], None
+    while True:
+        page = fetch(after)
+        ids.append([item["_id"] for item in page["items"]])
+        after = page["next_cursor"]
+        if after is None:
+            return ids
+
+@pytest.fixture
+def restaurants(db):
+    ratings = [4.5, None, 3.0, 4.5, "missing", 4.5, None, 3.0, 5.0, "missing"]
+    documents = []
+    for i, rating in enumerate(ratings):
+        document = {"name": ["Bodega", "Asador", "Casa Pepe"][i % 3], "active": True}
+        if rating != "missing":
+            document["avg_rating"] = rating
+        documents.append(document)
+    db.restaurants.insert_many(documents)
+    return documents
+
+def test_rating_pages_keep_ties_and_nulls_in_mongo_order(restaurants):
+    pages = _walk(lambda after: db_service.get_restaurants_page(sort="rating", limit=3, after=after))
+    
+    # Descendente: nulos y ausentes al final; el _id desempata
+    rated = sorted((r for r in restaurants if r.get("avg_rating") is not None),
+                   key=lambda r: (r["avg_rating"], r["_id"]), reverse=True)
+    unrated = sorted((r for r in restaurants if r.get("avg_rating") is None), key=lambda r: r["_id"], reverse=True)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == [r["_id"] for r in rated + unrated]
+
+def test_name_pages_follow_the_filter(restaurants, db):
+    db.restaurants.update_one({"_id": restaurants[0]["_id"]}, {"$set": {"active": False}})
+    
+    pages = _walk(lambda after: db_service.get_restaurants_page({"active": True}, sort="name", limit=4, after=after))
+    
+    expected = sorted((r for r in restaurants[1:]), key=lambda r: (r["name"], r["_id"]))
+    assert sum(pages, []) == [r["_id"] for r in expected]
+
+def test_tokens_are_bound_to_their_sort(restaurants):
+    token = db_service.get_restaurants_page(sort="rating", limit=3)["next_cursor"]
+    
+    with pytest.raises(ValueError):
+        db_service.get_restaurants_page(sort="name", limit=3, after=token)
+    with pytest.raises(ValueError):
+        db_service.get_restaurants_page(sort="name", limit=3, after="garbage")
+    with pytest.raises(ValueError):
+        db_service.get_restaurants_page(sort="distance")
+    with pytest.raises(ValueError):
+        db_service.get_restaurants_page(limit=0)
+
+def test_admin_listing_returns_cursor_pages(app, restaurants):
+    from app.routes.admin_routes import admin_bp
+    app.register_blueprint(admin_bp)
+    client = app.test_client()
+    
+    first = client.get('/admin/restaurants?limit=6&sort=rating').get_json()
+    second = client.get(f"/admin/restaurants?limit=6&sort=rating&cursor={first['next_cursor']}").get_json()
+    
+    assert len(first["items"]) == 6 and len(second["items"]) == 4
+    assert second["next_cursor"] is None
+    assert client.get('/admin/restaurants?cursor=garbage').status_code == 400
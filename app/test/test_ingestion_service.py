@@ -0,0 +1,216 @@
+import datetime
+import io
+import time
+
+import pytest
+
+from app.services import blob_service, db_service, ingestion_service, pdf_service, search_service
+
+EXTRACTED_MENU = {
+    "menu_restrictions": ["vegetariano"],
+    "dishes": [
+        {"name": "Gazpacho", "price": 6.5, "category": "Entrantes"},
+        {"name": "Tortilla", "price": 8.0, "category": "Principales"},
+    ]
+}
+
+class FakePdf(io.BytesIO):
+    closed_count = 0
+    
+    def close(self):
+        FakePdf.closed_count += 1
+        super().close()
+
+@pytest.fixture
+def ingestion(app, db, monkeypatch):
+    """Inline ingestion (INGESTION_ASYNC off) with a fake blob download and PDF extraction."""
+    downloads = []
+    extractions = []
+    
+    def open_pdf(pdf_url):
+        downloads.append(pdf_url)
+        return FakePdf(b"%PDF-1.4")
+    
+    def extract_menu_from_pdf(pdf_file):
+        extractions.append(pdf_file)
+        return EXTRACTED_MENU
+    
+    monkeypatch.setattr(ingestion_service, "open_pdf", open_pdf)
+    monkeypatch.setattr(pdf_service, "extract_menu_from_pdf", extract_menu_from_pdf)
+    restaurant_id = db_service.create_restaurant({"name": "Casa Pepe", "cuisine_type": ["española"]})
+    return {"restaurant_id": restaurant_id, "downloads": downloads, "extractions": extractions}
+
+def _enqueue(restaurant_id, content_hash="abc", menu_date="2026-10-18"):
+    return ingestion_service.enqueue_menu_ingestion(
+        restaurant_id, f"https://blob/{restaurant_id}_{content_hash}.pdf", content_hash,
+        menu_type="daily", menu_date=menu_date, price=12.0
+    )
+
+def test_ingestion_creates_menu_and_dishes(ingestion, db):
+    job_id = _enqueue(ingestion["restaurant_id"])
+    job = db_service.get_ingestion_job(job_id)
+    assert job["status"] == "done"
+    assert db.menus.count_documents({}) == 1
+    assert db.dishes.count_documents({"ingestion_job_id": job_id}) == 2
+
+def test_reupload_of_same_pdf_reuses_job(ingestion, db):
+    first = _enqueue(ingestion["restaurant_id"])
+    second = _enqueue(ingestion["restaurant_id"])
+    assert first == second
+    assert db.ingestion_jobs.count_documents({}) == 1
+    assert db.menus.count_documents({}) == 1
+    assert db.dishes.count_documents({}) == 2
+
+def test_reupload_for_another_date_creates_menu(ingestion, db):
+    first = _enqueue(ingestion["restaurant_id"], menu_date="2026-10-18")
+    second = _enqueue(ingestion["restaurant_id"], menu_date="2026-10-19")
+    assert first != second
+    assert db.menus.count_documents({}) == 2
+    # La extracción del mismo contenido se reutiliza: un solo análisis y una descarga
+    assert len(ingestion["extractions"]) == 1
+    assert len(ingestion["downloads"]) == 1
+
+def test_reupload_after_menu_deleted_creates_menu(ingestion, db):
+    first = _enqueue(ingestion["restaurant_id"])
+    db_service.delete_menu(db_service.get_ingestion_job(first)["result"]["menu_id"])
+    second = _enqueue(ingestion["restaurant_id"])
+    assert first != second
+    assert db.menus.count_documents({"active": {"$ne": False}}) == 1
+
+def test_reupload_after_failed_job_creates_job(ingestion, db):
+    first = _enqueue(ingestion["restaurant_id"])
+    db.ingestion_jobs.update_one({}, {"$set": {"status": "failed"}})
+    second = _enqueue(ingestion["restaurant_id"])
+    assert first != second
+
+def test_cached_extraction_skips_download(app, db):
+    pdf_service.save_menu_extraction("abc", pdf_service.PARSER_VERSION, EXTRACTED_MENU)
+    
+    def open_pdf_file():
+        raise AssertionError("the PDF must not be downloaded on a cache hit")
+    
+    assert pdf_service.extract_menu_cached("abc", open_pdf_file) == EXTRACTED_MENU
+
+def test_extraction_miss_closes_pdf(app, db, monkeypatch):
+    monkeypatch.setattr(pdf_service, "extract_menu_from_pdf", lambda pdf_file: EXTRACTED_MENU)
+    FakePdf.closed_count = 0
+    assert pdf_service.extract_menu_cached("abc", lambda: FakePdf(b"%PDF-1.4")) == EXTRACTED_MENU
+    assert FakePdf.closed_count == 1
+    assert db_service.get_menu_extraction("abc", pdf_service.PARSER_VERSION) == EXTRACTED_MENU
+
+class FakeBlobClient:
+    def __init__(self, deleted, name):
+        self.deleted = deleted
+        self.name = name
+    
+    def delete_blob(self):
+        self.deleted.append(self.name)
+
+class FakeBlobService:
+    def __init__(self):
+        self.deleted = []
+    
+    def get_container_client(self, container_name):
+        return self
+    
+    def get_blob_client(self, blob_name):
+        return FakeBlobClient(self.deleted, blob_name)
+
+def test_shared_blob_is_kept_while_a_menu_uses_it(app, db, monkeypatch):
+    blobs = FakeBlobService()
+    monkeypatch.setattr(blob_service, "get_blob_service", lambda: blobs)
+    pdf_url = "https://blob/container/r1_abc.pdf"
+    db_service.add_menu_catalog_entry("r1_abc.pdf", pdf_url, "r1")
+    first = db_service.create_menu({"restaurant_id": "r1", "pdf_url": pdf_url, "active": True})
+    second = db_service.create_menu({"restaurant_id": "r1", "pdf_url": pdf_url, "active": True})
+    
+    db_service.delete_menu(first)
+    assert blob_service.delete_pdf(pdf_url) is False
+    assert blobs.deleted == []
+    assert db_service.get_menu_catalog_entry("r1_abc.pdf") is not None
+    
+    db_service.delete_menu(second)
+    assert blob_service.delete_pdf(pdf_url) is True
+    assert blobs.deleted == ["r1_abc.pdf"]
+    assert db_service.get_menu_catalog_entry("r1_abc.pdf") is None
+
+def test_blob_of_pending_job_is_kept(app, db, monkeypatch):
+    blobs = FakeBlobService()
+    monkeypatch.setattr(blob_service, "get_blob_service", lambda: blobs)
+    pdf_url = "https://blob/container/r1_abc.pdf"
+    db_service.create_ingestion_job({"restaurant_id": "r1", "pdf_url": pdf_url, "content_hash": "abc"})
+    assert blob_service.delete_pdf(pdf_url) is False
+    assert blobs.deleted == []
+
+def _running_job(db, started_ago, heartbeat_ago=None):
+    now = datetime.datetime.utcnow()
+    job = {"status": "running", "attempts": 1, "started_at": now - datetime.timedelta(seconds=started_ago)}
+    if heartbeat_ago is not None:
+        job["heartbeat_at"] = now - datetime.timedelta(seconds=heartbeat_ago)
+    return db.ingestion_jobs.insert_one(job).inserted_id
+
+def test_requeue_only_jobs_without_recent_heartbeat(app, db):
+    alive = _running_job(db, started_ago=3600, heartbeat_ago=5)
+    dead = _running_job(db, started_ago=3600, heartbeat_ago=600)
+    legacy = _running_job(db, started_ago=3600)
+    recent = _running_job(db, started_ago=5)
+    assert db_service.requeue_stale_ingestion_jobs(older_than_seconds=180) == 2
+    statuses = {job["_id"]: job["status"] for job in db.ingestion_jobs.find()}
+    assert statuses == {alive: "running", dead: "queued", legacy: "queued", recent: "running"}
+
+def test_heartbeat_belongs_to_one_attempt(app, db):
+    job_id = str(_running_job(db, started_ago=0, heartbeat_ago=0))
+    assert db_service.renew_ingestion_job_heartbeat(job_id, 1)
+    assert not db_service.renew_ingestion_job_heartbeat(job_id, 2)
+    db.ingestion_jobs.update_one({}, {"$set": {"status": "done"}})
+    assert not db_service.renew_ingestion_job_heartbeat(job_id, 1)
+
+def test_long_job_keeps_heartbeat(ingestion, db, monkeypatch):
+    app = ingestion_service.current_app._get_current_object()
+    app.config["INGESTION_HEARTBEAT_SECONDS"] = 0.02
+    ingest_menu = ingestion_service.ingest_menu
+    
+    def slow_ingest_menu(job):
+        time.sleep(0.2)
+        # Más tiempo que el margen sin latido: recuperar no debe reencolarlo
+        assert db_service.requeue_stale_ingestion_jobs(older_than_seconds=0.1) == 0
+        return ingest_menu(job)
+    
+    monkeypatch.setattr(ingestion_service, "ingest_menu", slow_ingest_menu)
+    job_id = _enqueue(ingestion["restaurant_id"])
+    assert db_service.get_ingestion_job(job_id)["status"] == "done"
+
+def test_job_is_retried_when_documents_do_not_reach_index(ingestion, db, monkeypatch):
+    undelivered = {"ids": None}
+    
+    def get_queued_document_ids():
+        if undelivered["ids"] is None:
+            # Primer intento: el indexador se queda con el menú
+            return {f"menu_{menu['_id']}" for menu in db.menus.find()}
+        return set()
+    
+    monkeypatch.setattr(ingestion_service, "get_queued_document_ids", get_queued_document_ids)
+    job_id = _enqueue(ingestion["restaurant_id"])
+    job = db_service.get_ingestion_job(job_id)
+    assert job["status"] == "queued"
+    assert "did not reach the index" in job["error"]
+    menu_id = job["output"]["menu_id"]
+    
+    undelivered["ids"] = set()
+    db.ingestion_jobs.update_one({}, {"$set": {"next_attempt_at": datetime.datetime.utcnow()}})
+    assert ingestion_service._process_job(job_id) == (job_id, "done")
+    assert db_service.get_ingestion_job(job_id)["result"]["menu_id"] == menu_id
+    assert db.menus.count_documents({}) == 1
+    assert db.dishes.count_documents({}) == 2
+
+def test_menu_and_dishes_are_indexed_in_one_batch(ingestion, db, monkeypatch):
+    uploads = []
+    monkeypatch.setattr(search_service, "_upload", uploads.append)
+    job_id = _enqueue(ingestion["restaurant_id"])
+    
+    [documents] = uploads
+    menu_id = db_service.get_ingestion_job(job_id)["result"]["menu_id"]
+    dish_ids = [str(dish["_id"]) for dish in db.dishes.find().sort("_id", 1)]
+    assert [doc["id"] for doc in documents] == [f"dish_{dish_id}" for dish_id in dish_ids] + [f"menu_{menu_id}"]
+    assert documents[-1]["description"] == "Gazpacho, Tortilla"
+    assert documents[0]["cuisine_type"] == ["española"]
@@ -0,0 +1,97 @@
+import os
+
+from app.services.local_search import LocalSearchEngine, analyze
+
+DOCUMENTS = [
+    {"id": "dish_1", "type": "dish", "restaurant_id": "r1", "name": "Paella valenciana",
+     "ingredients": ["arroz", "pollo", "judías"], "price": 14.0, "restrictions": []},
+    {"id": "dish_2", "type": "dish", "restaurant_id": "r1", "name": "Paellas de marisco",
+     "ingredients": ["arroz", "gambas"], "price": 18.5, "restrictions": ["sin lactosa"]},
+    {"id": "dish_3", "type": "dish", "restaurant_id": "r2", "name": "Gazpacho",
+     "ingredients": ["tomate", "pepino"], "price": 6.0, "restrictions": ["vegano"]},
+    {"id": "dish_4", "type": "dish", "restaurant_id": "r2", "name": "Tarta de queso",
+     "ingredients": ["queso"], "price": None, "restrictions": []},
+    {"id": "restaurant_r1", "type": "restaurant", "restaurant_id": "r1", "name": "Casa Pepe",
+     "cuisine_type": ["española", "arroces"]},
+]
+
+def _engine():
+    engine = LocalSearchEngine()
+    engine.merge_or_upload(DOCUMENTS)
+    return engine
+
+def _ids(results):
+    return [document["id"] for document in results]
+
+def test_terms_are_folded_and_singularized():
+    assert analyze("Menús de las Paellas") == ["menu", "paella"]
+    results, _, _ = _engine().search("PAELLA", include_total_count=True)
+    assert set(_ids(results)) == {"dish_1", "dish_2"}
+
+def test_single_term_and_multi_term_rankings_agree():
+    engine = _engine()
+    single, count, _ = engine.search("arroz", filter="type eq 'dish'", include_total_count=True)
+    # Con order_by se toma el camino general, que puntúa igual
+    general, _, _ = engine.search("arroz", filter="type eq 'dish'", order_by=["search.score() desc"])
+    assert count == 2
+    assert _ids(single) == _ids(general)
+    assert [d["@search.score"] for d in single] == [d["@search.score"] for d in general]
+
+def test_filters():
+    engine = _engine()
+    results, _, _ = engine.search("*", filter="type eq 'dish' and price le 14 and restaurant_id ne 'r9'")
+    assert set(_ids(results)) == {"dish_1", "dish_3"}
+    results, _, _ = engine.search("*", filter="search.in(restaurant_id, 'r2') and restrictions/any(r: r eq 'vegano')")
+    assert _ids(results) == ["dish_3"]
+    results, _, _ = engine.search("*", filter="not (type eq 'dish')")
+    assert _ids(results) == ["restaurant_r1"]
+
+def test_order_by_puts_nulls_like_azure():
+    engine = _engine()
+    ascending, _, _ = engine.search("*", filter="type eq 'dish'", order_by=["price asc"])
+    descending, _, _ = engine.search("*", filter="type eq 'dish'", order_by=["price desc"])
+    assert _ids(ascending) == ["dish_4", "dish_3", "dish_1", "dish_2"]
+    assert _ids(descending) == ["dish_2", "dish_1", "dish_3", "dish_4"]
+    page, _, _ = engine.search("*", filter="type eq 'dish'", order_by=["price asc"], skip=1, top=2,
+                               select=["id", "price"])
+    assert [(d["id"], d["price"]) for d in page] == [("dish_3", 6.0), ("dish_1", 14.0)]
+
+def test_facets():
+    _, _, facets = _engine().search(
+        "*", filter="type eq 'dish'", facets=["restaurant_id,count:5", "price,values:10|15", "ingredients"]
+    )
+    assert facets["restaurant_id"] == [{"value": "r1", "count": 2}, {"value": "r2", "count": 2}]
+    assert facets["price"] == [{"count": 1, "to": 10.0}, {"count": 1, "from": 10.0, "to": 15.0},
+                               {"count": 1, "from": 15.0}]
+    assert {"value": "arroz", "count": 2} in facets["ingredients"]
+
+def test_merge_keeps_fields_and_reindexes_text():
+    engine = _engine()
+    engine.merge_or_upload([{"id": "dish_3", "name": "Salmorejo"}])
+    assert engine.get_document("dish_3")["price"] == 6.0
+    assert _ids(engine.search("salmorejo")[0]) == ["dish_3"]
+    assert engine.search("gazpacho")[0] == []
+    
+    engine.upload([{"id": "dish_3", "type": "dish", "name": "Salmorejo"}])
+    assert "price" not in engine.get_document("dish_3")
+    engine.delete(["dish_3"])
+    assert engine.get_document("dish_3") is None
+    assert len(engine) == 4
+
+def test_save_applies_local_changes_on_top_of_another_process(tmp_path):
+    path = str(tmp_path / "index.pkl")
+    first = _engine()
+    first.save(path)
+    second = LocalSearchEngine.load(path)
+    
+    second.merge_or_upload([{"id": "dish_9", "type": "dish", "name": "Flan"}])
+    second.save(path)
+    # Fuerza un mtime distinto aunque los dos guardados caigan en el mismo tick
+    os.utime(path, (1, 1))
+    first.delete(["dish_1"])
+    first.save(path)
+    
+    merged = LocalSearchEngine.load(path)
+    assert merged.get_document("dish_9")["name"] == "Flan"
+    assert merged.get_document("dish_1") is None
+    assert _ids(merged.search("flan")[0]) == ["dish_9"]
@@ -0,0 +1,132 @@
+import datetime
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import blob_service, db_service
+
+class FakeBlobClient:
+    def __init__(self, container, blob_name):
+        self.container = container
+        self.blob_name = blob_name
+        self.url = f"https://storage.test/menus/{blob_name}"
+    
+    def upload_blob(self, stream, **kwargs):
+        self.container.blobs[self.blob_name] = stream.read()
+    
+    def delete_blob(self):
+        del self.container.blobs[self.blob_name]
+
+class FakeContainerClient:
+    def __init__(self):
+        self.blobs = {}
+    
+    def get_blob_client(self, blob_name):
+        return FakeBlobClient(self, blob_name)
+    
+    def list_blobs(self, *args, **kwargs):
+        raise AssertionError("the container must not be listed")
+
+class FakeBlobService:
+    def __init__(self):
+        self.container = FakeContainerClient()
+    
+    def get_container_client(self, name):
+        return self.container
+
+@pytest.fixture
+def storage(db, monkeypatch):
+    service = FakeBlobService()
+    monkeypatch.setattr(blob_service, "get_blob_service", lambda: service)
+    return service.container
+
+def test_list_pdf_files_pages_the_catalog_by_blob_name(db):
+    for name in ["c.pdf", "a.pdf", "e.pdf", "b.pdf", "d.pdf"]:
+        db_service.add_menu_catalog_entry(name, f"https://storage.test/menus/{name}", "r1")
+    
+    assert blob_service.list_pdf_files() == ["a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"]
+    assert blob_service.list_pdf_files(skip=0, limit=2) == ["a.pdf", "b.pdf"]
+    assert blob_service.list_pdf_files(skip=4, limit=2) == ["e.pdf"]
+    assert db_service.count_menu_catalog() == 5
+
+def test_upload_and_delete_keep_the_catalog_in_sync(storage):
+    url = blob_service.upload_pdf(io.BytesIO(b"%PDF-1.4 menu"), "r1", display_name="Carta")
+    blob_name = url.rsplit('/', 1)[-1]
+    
+    assert list(storage.blobs) == [blob_name]
+    assert blob_service.list_pdf_files() == [blob_name]
+    
+    # El mismo contenido reutiliza el blob y la entrada del catálogo
+    assert blob_service.upload_pdf(io.BytesIO(b"%PDF-1.4 menu"), "r1") == url
+    assert blob_service.list_pdf_files() == [blob_name]
+    
+    assert blob_service.delete_pdf(url) is True
+    assert storage.blobs == {}
+    assert blob_service.list_pdf_files() == []
+
+def test_delete_keeps_a_blob_still_used_by_a_menu(storage, db):
+    url = blob_service.upload_pdf(io.BytesIO(b"%PDF-1.4 shared"), "r1")
+    db.menus.insert_one({"restaurant_id": "r1", "pdf_url": url, "active": True})
+    
+    assert blob_service.delete_pdf(url) is False
+    assert blob_service.list_pdf_files() == [url.rsplit('/', 1)[-1]]
+
+def test_dashboard_reads_one_page_of_the_catalog(app, db, monkeypatch):
+    from app.routes import restaurant_routes
+    
+    for i in range(12):
+        db_service.add_menu_catalog_entry(f"menu_{i:02d}.pdf", f"https://storage.test/menus/menu_{i:02d}.pdf", "r1")
+    
+    captured = {}
+    monkeypatch.setattr(restaurant_routes, "render_template", lambda template, **context: captured.update(context))
+    
+    with app.test_request_context('/restaurant/?page=2'):
+        restaurant_routes.index()
+    
+    assert captured["total"] == 12
+    assert captured["restaurant_pdfs"] == ["menu_10.pdf", "menu_11.pdf"]
+
+def test_catalog_pages_follow_the_cursors_newest_first(db):
+    base = datetime.datetime(2024, 5, 1)
+    # Varias subidas en el mismo instante: el _id desempata
+    for i in range(8):
+        db_service.add_menu_catalog_entry(f"menu_{i}.pdf", f"https://storage.test/menus/menu_{i}.pdf", "r1",
+                                          uploaded_at=base + datetime.timedelta(minutes=i // 3))
+    expected = [entry["blob_name"] for entry in
+                db.menu_catalog.find().sort([("uploaded_at", -1), ("_id", -1)])]
+    
+    pages = [db_service.get_menu_catalog_page(per_page=3)]
+    while pages[-1]["next_cursor"]:
+        pages.append(db_service.get_menu_catalog_page(per_page=3, after=pages[-1]["next_cursor"]))
+    
+    names = [[entry["blob_name"] for entry in page["entries"]] for page in pages]
+    assert sum(names, []) == expected
+    assert [len(page) for page in names] == [3, 3, 2]
+    assert pages[0]["prev_cursor"] is None
+    
+    previous = db_service.get_menu_catalog_page(per_page=3, before=pages[2]["prev_cursor"])
+    assert [entry["blob_name"] for entry in previous["entries"]] == names[1]
+    assert previous["next_cursor"] and previous["prev_cursor"]
+    
+    # Saltar a un número de página usa offset
+    jumped = db_service.get_menu_catalog_page(per_page=3, skip=3)
+    assert [entry["blob_name"] for entry in jumped["entries"]] == names[1]
+
+def test_backfill_registers_existing_blobs_once(storage, db):
+    created = datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)
+    storage.list_blobs = lambda: [
+        SimpleNamespace(name="r1_abc.pdf", creation_time=created),
+        SimpleNamespace(name="notes.txt", creation_time=created),
+    ]
+    db_service.add_menu_catalog_entry("r1_abc.pdf", "https://storage.test/menus/r1_abc.pdf", "r1",
+                                      display_name="Carta de verano")
+    
+    assert blob_service.backfill_menu_catalog() == 1
+    assert db_service.get_menu_catalog_entry("r1_abc.pdf")["display_name"] == "Carta de verano"
+    
+    storage.list_blobs = lambda: [SimpleNamespace(name="r2_def.pdf", creation_time=created)]
+    blob_service.backfill_menu_catalog()
+    entry = db_service.get_menu_catalog_entry("r2_def.pdf")
+    assert entry["restaurant_id"] == "r2"
+    assert entry["uploaded_at"] == datetime.datetime(2024, 1, 2)
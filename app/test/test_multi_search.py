@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import async_search_service, search_service
+from app.services.async_search_service import multi_search, section_query
+
+@pytest.fixture
+def searches(app, monkeypatch):
+    """Count the queries that reach the search backend."""
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    calls = []
+    
+    def execute_search(search_text, filter=None, **kwargs):
+        calls.append((search_text, filter))
+        return [{"id": "dish_1", "type": "dish", "name": "Gazpacho"}], 1, None
+    
+    monkeypatch.setattr(async_search_service, "_execute_search", execute_search)
+    return calls
+
+def _queries(text="Gazpacho"):
+    return {doc_type: section_query(doc_type, text) for doc_type in ("restaurant", "dish")}
+
+def test_repeated_sections_come_from_cache(searches):
+    first = multi_search(_queries())
+    assert len(searches) == 2
+    # Misma consulta normalizada: mayúsculas, acentos y espacios no cuentan
+    second = multi_search(_queries("  gazpachó "))
+    assert len(searches) == 2
+    assert second == first
+
+def test_only_missing_sections_are_queried(searches):
+    multi_search({"dish": section_query("dish", "Gazpacho")})
+    multi_search(_queries())
+    assert searches == [("Gazpacho", "type eq 'dish'"), ("Gazpacho", "type eq 'restaurant'")]
+
+def test_cached_results_are_copies(searches):
+    multi_search(_queries())["dish"]["results"].clear()
+    assert multi_search(_queries())["dish"]["results"]
+
+def test_index_writes_invalidate_cached_sections(searches):
+    multi_search(_queries())
+    search_service.invalidate_query_cache()
+    multi_search(_queries())
+    assert len(searches) == 4
+
+def test_failed_sections_are_not_cached(app, monkeypatch):
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    calls = []
+    
+    def run_queries(config, queries, timeout):
+        calls.append(set(queries))
+        return {name: {"error": "timeout"} if name == "dish" else {"results": [], "total": 0, "facets": None}
+                for name in queries}
+    
+    monkeypatch.setattr(async_search_service, "_run_queries", run_queries)
+    assert multi_search(_queries())["dish"] == {"error": "timeout"}
+    multi_search(_queries())
+    assert calls == [{"restaurant", "dish"}, {"dish"}]
+
+@pytest.fixture
+def slow_backend(app, monkeypatch):
+    """Azure path with a fake async query that takes the time given in its search text."""
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    monkeypatch.setattr(async_search_service, "_use_local_backend", lambda: False)
+    
+    async def search_async(config, search_text="*", **kwargs):
+        if search_text == "boom":
+            raise RuntimeError("service unavailable")
+        await asyncio.sleep(float(search_text))
+        return {"results": [{"id": search_text}], "total": 1, "facets": None}
+    
+    monkeypatch.setattr(async_search_service, "search_async", search_async)
+
+def test_queries_run_concurrently_with_a_timeout_each(slow_backend):
+    start = time.perf_counter()
+    results = multi_search({
+        "restaurant": {"search_text": "0.2"},
+        "dish": {"search_text": "0.2"},
+        "menu": {"search_text": "5"},
+    }, timeout=0.5)
+    elapsed = time.perf_counter() - start
+    
+    assert results["restaurant"]["results"] == [{"id": "0.2"}]
+    assert results["dish"]["results"] == [{"id": "0.2"}]
+    assert results["menu"] == {"error": "timeout"}
+    # Cuesta lo que la consulta más lenta (acotada por el timeout), no la suma
+    assert elapsed < 1.0
+
+def test_a_failing_query_does_not_fail_the_others(slow_backend):
+    results = multi_search({"restaurant": {"search_text": "boom"}, "dish": {"search_text": "0"}}, timeout=1)
+    
+    assert results["restaurant"] == {"error": "service unavailable"}
+    assert results["dish"]["total"] == 1
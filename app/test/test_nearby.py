@@ -0,0 +1,123 @@
+import math
+
+from bson.objectid import ObjectId
+import pytest
+
+from app.services import db_service
+
+ORIGIN = (40.4168, -3.7038)
+
+class GeoNearCollection:
+    """Restaurants collection whose aggregate runs the $geoNear pipeline of find_restaurants_near."""
+    
+    def __init__(self, collection):
+        self.collection = collection
+        self.pipelines = []
+    
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+    
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        geo_near, limit, project = pipeline[0]["$geoNear"], pipeline[1]["$limit"], pipeline[2]["$project"]
+        lon, lat = geo_near["near"]["coordinates"]
+        items = []
+        for document in self.collection.find(geo_near["query"]):
+            distance = _meters(lat, lon, *reversed(document["location"]["coordinates"]))
+            if geo_near["minDistance"] <= distance <= geo_near["maxDistance"]:
+                items.append(dict(document, distance=distance))
+        # Mongo no garantiza el orden de los empatados; aquí se barajan por _id descendente
+        items.sort(key=lambda item: item["_id"], reverse=True)
+        items.sort(key=lambda item: item["distance"])
+        return [{field: item[field] for field in ("_id",) + tuple(project) if field in item} for item in items[:limit]]
+
+def _meters(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+def _restaurant(name, lat, lon, **extra):
+    return dict({"_id": ObjectId(), "name": name, "location": {"type": "Point", "coordinates": [lon, lat]}}, **extra)
+
+@pytest.fixture
+def restaurants(db, monkeypatch):
+    """Restaurants around ORIGIN; three share a building and one is beyond the maximum radius."""
+    lat, lon = ORIGIN
+    documents = [
+        _restaurant("Casa Pepe", lat + 0.001, lon, cuisine_type=["española"], price_range=2, avg_rating=4.5),
+        _restaurant("Bodega", lat + 0.003, lon, cuisine_type=["española"], price_range=3, avg_rating=3.5),
+        _restaurant("Sushi Go", lat + 0.003, lon, cuisine_type=["japonesa"], price_range=3, avg_rating=4.0),
+        _restaurant("Asador", lat + 0.003, lon, cuisine_type=["española"], price_range=4, avg_rating=4.8),
+        _restaurant("Cerrado", lat + 0.002, lon, active=False),
+        _restaurant("Trattoria", lat + 0.02, lon, cuisine_type=["italiana"], price_range=2),
+        _restaurant("Lejano", lat + 1, lon, cuisine_type=["española"], price_range=1),
+    ]
+    db.restaurants.insert_many(documents)
+    collection = GeoNearCollection(db.restaurants)
+    monkeypatch.setattr(db, "restaurants", collection, raising=False)
+    return documents
+
+def _walk(**kwargs):
+    pages, after = [], None
+    while True:
+        page = db_service.find_restaurants_near(*ORIGIN, after=after, **kwargs)
+        pages.append(page["items"])
+        after = page["next_cursor"]
+        if after is None:
+            return pages
+
+def test_pages_follow_distance_without_repeating_ties(restaurants):
+    pages = _walk(limit=2)
+    
+    names = [[item["name"] for item in page] for page in pages]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert names[0][0] == "Casa Pepe" and names[-1] == ["Trattoria"]
+    assert sorted(sum(names[:2], [])[1:]) == ["Asador", "Bodega", "Sushi Go"]
+    assert all(item["distance_km"] == round(item["distance_km"], 3) for page in pages for item in page)
+    assert pages[0][0]["distance_km"] == pytest.approx(0.111, abs=0.001)
+    assert "distance" not in pages[0][0]
+
+def test_a_page_made_only_of_ties_keeps_the_previous_ones_excluded(restaurants):
+    pages = _walk(limit=1, radius_km=1)
+    
+    names = [page[0]["name"] for page in pages]
+    assert len(names) == 4 and len(set(names)) == 4
+    assert names[0] == "Casa Pepe"
+
+def test_filters_and_radius_are_applied_by_geo_near(restaurants, db):
+    near = db_service.find_restaurants_near(*ORIGIN, filters=db_service.nearby_filters(["española"], max_price=3))
+    
+    assert [item["name"] for item in near["items"]] == ["Casa Pepe", "Bodega"]
+    assert db.restaurants.pipelines[-1][0]["$geoNear"]["maxDistance"] == 5000
+    wide = db_service.find_restaurants_near(*ORIGIN, radius_km=500)
+    assert "Lejano" not in [item["name"] for item in wide["items"]]
+    assert db.restaurants.pipelines[-1][0]["$geoNear"]["maxDistance"] == 50000
+
+def test_invalid_arguments_and_tokens_are_rejected(restaurants):
+    token = db_service.find_restaurants_near(*ORIGIN, limit=1)["next_cursor"]
+    
+    with pytest.raises(ValueError):
+        db_service.find_restaurants_near(91, 0)
+    with pytest.raises(ValueError):
+        db_service.find_restaurants_near(*ORIGIN, radius_km=0)
+    with pytest.raises(ValueError):
+        db_service.find_restaurants_near(*ORIGIN, limit=0)
+    with pytest.raises(ValueError):
+        db_service.find_restaurants_near(ORIGIN[0] + 1, ORIGIN[1], limit=1, after=token)
+    with pytest.raises(ValueError):
+        db_service.find_restaurants_near(*ORIGIN, limit=1, radius_km=2, after=token)
+
+def test_nearby_endpoint(app, restaurants):
+    from app.routes.customer_routes import customer_bp
+    app.register_blueprint(customer_bp)
+    client = app.test_client()
+    
+    first = client.get(f"/api/restaurants/near?lat={ORIGIN[0]}&lon={ORIGIN[1]}&limit=3").get_json()
+    second = client.get(f"/api/restaurants/near?lat={ORIGIN[0]}&lon={ORIGIN[1]}&limit=3"
+                        f"&cursor={first['next_cursor']}").get_json()
+    
+    assert [len(first["items"]), len(second["items"])] == [3, 2]
+    assert isinstance(first["items"][0]["_id"], str)
+    assert client.get('/api/restaurants/near?lat=40').status_code == 400
+    assert client.get(f"/api/restaurants/near?lat={ORIGIN[0]}&lon={ORIGIN[1]}&cursor=x").status_code == 400
@@ -0,0 +1,177 @@
+import io
+import re
+
+from pdfminer.high_level import extract_text
+
+from app.services.pdf_service import (
+    extract_menu_from_pdf, extract_text_from_pdf, iter_pdf_pages, parse_menu_text
+)
+
+def _text_stream(lines, x=72, y=720):
+    commands = ["BT", "/F1 12 Tf", f"{x} {y} Td", "14 TL"]
+    for line in lines:
+        escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        commands.append(f"({escaped}) Tj T*")
+    commands.append("ET")
+    return "\n".join(commands).encode("latin-1")
+
+def make_pdf(pages):
+    """
+    Build a minimal PDF. Each page is a dict with ``lines`` drawn on the page
+    and optionally ``figure_lines`` drawn inside a form XObject (an LTFigure
+    for pdfminer).
+    """
+    objects = {}
+    font_id = 3
+    objects[font_id] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    next_id = 4
+    page_ids = []
+    for page in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        content = _text_stream(page.get("lines", []))
+        xobjects = b""
+        if page.get("figure_lines"):
+            form_id = next_id
+            next_id += 1
+            form = _text_stream(page["figure_lines"], y=400)
+            objects[form_id] = (
+                b"<< /Type /XObject /Subtype /Form /BBox [0 0 612 792] "
+                b"/Resources << /Font << /F1 3 0 R >> >> /Length " + str(len(form)).encode() + b" >>\nstream\n"
+                + form + b"\nendstream"
+            )
+            xobjects = b" /XObject << /Fm1 " + str(form_id).encode() + b" 0 R >>"
+            content += b"\n/Fm1 Do\n"
+        objects[content_id] = b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream"
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents " + str(content_id).encode()
+            + b" 0 R /Resources << /Font << /F1 3 0 R >>" + xobjects + b" >> >>"
+        )
+        page_ids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = b" ".join(str(page_id).encode() + b" 0 R" for page_id in page_ids)
+    objects[2] = b"<< /Type /Pages /Kids [" + kids + b"] /Count " + str(len(page_ids)).encode() + b" >>"
+    
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = output.tell()
+        output.write(str(object_id).encode() + b" 0 obj\n" + objects[object_id] + b"\nendobj\n")
+    xref = output.tell()
+    size = max(objects) + 1
+    output.write(b"xref\n0 " + str(size).encode() + b"\n0000000000 65535 f \n")
+    for object_id in range(1, size):
+        output.write(b"%010d 00000 n \n" % offsets[object_id])
+    output.write(b"trailer\n<< /Size " + str(size).encode() + b" /Root 1 0 R >>\nstartxref\n"
+                 + str(xref).encode() + b"\n%%EOF\n")
+    output.seek(0)
+    return output
+
+MENU_PAGES = [
+    {"lines": ["ENTRANTES", "Gazpacho 6,50 EUR", "Croquetas 8,00 EUR"],
+     "figure_lines": ["Pimientos de padron 5,50 EUR"]},
+    {"lines": ["PRINCIPALES", "Tortilla 9,00 EUR", "Opciones vegetarianas"]},
+]
+
+def test_text_matches_pdfminer_extract_text():
+    pdf_file = make_pdf(MENU_PAGES)
+    expected = extract_text(make_pdf(MENU_PAGES))
+    assert extract_text_from_pdf(pdf_file) == expected
+
+def test_text_inside_figures_is_extracted():
+    text = extract_text_from_pdf(make_pdf(MENU_PAGES))
+    assert "Pimientos de padron" in text
+    assert "Gazpacho" in text
+
+def test_one_text_per_page():
+    pages = list(iter_pdf_pages(make_pdf(MENU_PAGES)))
+    assert len(pages) == 2
+    assert "Tortilla" in pages[1] and "Tortilla" not in pages[0]
+    assert all(page.endswith("\f") for page in pages)
+
+def test_max_pages():
+    pages = list(iter_pdf_pages(make_pdf(MENU_PAGES), max_pages=1))
+    assert len(pages) == 1
+
+def test_page_char_budget_drops_page():
+    pages = list(iter_pdf_pages(make_pdf(MENU_PAGES), max_page_chars=10))
+    assert pages == []
+
+def test_menu_from_pdf_includes_figure_dishes():
+    menu = extract_menu_from_pdf(make_pdf(MENU_PAGES))
+    names = [dish["name"] for dish in menu["dishes"]]
+    assert "Pimientos de padron" in names
+    assert "Tortilla" in names
+    assert menu["menu_restrictions"] == ["vegetarian"]
+
+def test_parse_menu_text_matches_text_and_pages():
+    pages = list(iter_pdf_pages(make_pdf(MENU_PAGES)))
+    assert parse_menu_text(pages) == parse_menu_text("".join(pages))
+
+def _baseline_parse(text):
+    """The multi-pass parser replaced by parse_menu_text, kept as a reference."""
+    price_pattern = r"(\d+[.,]\d{2})[\s€$]"
+    restriction_patterns = {
+        "vegetarian": r"vegetari[ao]n[ao]?s?",
+        "vegan": r"vegan[ao]?s?",
+        "gluten-free": r"(sin gluten|gluten[ -]free)",
+        "lactose-free": r"(sin lactosa|lactose[ -]free)"
+    }
+    menu = {"dishes": [], "menu_restrictions": []}
+    for restriction, pattern in restriction_patterns.items():
+        if re.search(pattern, text, re.IGNORECASE):
+            menu["menu_restrictions"].append(restriction)
+    lines = text.split('\n')
+    current_category = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.isupper() or (len(line) < 30 and not re.search(price_pattern, line)):
+            current_category = line
+            continue
+        dish_match = re.search(r"(.*?)(\d+[.,]\d{2})[\s€$]", line)
+        if dish_match:
+            menu["dishes"].append({
+                "name": dish_match.group(1).strip(),
+                "price": float(dish_match.group(2).replace(',', '.')),
+                "category": current_category
+            })
+    if not menu["dishes"]:
+        for line in lines:
+            line = line.strip()
+            if not line or len(line) < 3 or re.match(r"^[\d\s,.;:!?]+$", line):
+                continue
+            menu["dishes"].append({"name": line, "price": None, "category": None})
+    return menu
+
+PARSER_SAMPLES = [
+    "ENTRANTES\nCroquetas caseras 8,50 €\nEnsalada vegana de temporada 9.00€\n"
+    "Platos principales\nPaella valenciana para dos 24,00 $\nOpciones SIN GLUTEN disponibles\n",
+    "Carta de vinos\nTinto de la casa\nBlanco verdejo\n12\n...\nDisponible sin lactosa y vegetariano",
+    "POSTRES\nTarta de queso 5,50 € Flan 4,00 €\nUna linea muy larga sin precio que no es una categoria\n",
+    "",
+]
+
+def test_parse_menu_text_matches_the_baseline_parser():
+    for text in PARSER_SAMPLES:
+        assert parse_menu_text(text) == _baseline_parse(text)
+
+def test_parse_menu_text_joins_lines_split_between_pages():
+    pages = ["ENTRANTES\nCroquetas ca", "seras 8,50 €\n"]
+    assert parse_menu_text(pages)["dishes"] == [
+        {"name": "Croquetas caseras", "price": 8.5, "category": "ENTRANTES"}
+    ]
+
+def test_parse_menu_text_stops_after_idle_pages():
+    read = []
+
+    def pages():
+        for text in ["Croquetas caseras 8,50 €\n", "Alergenos\n", "Condiciones\n", "Flan de huevo 4,00 €\n"]:
+            read.append(text)
+            yield text
+
+    menu = parse_menu_text(pages(), max_idle_pages=2)
+    assert [dish["name"] for dish in menu["dishes"]] == ["Croquetas caseras"]
+    assert len(read) == 3
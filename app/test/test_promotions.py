@@ -0,0 +1,80 @@
+import datetime
+
+from bson.objectid import ObjectId
+import pytest
+
+from app.services import db_service, promotion_service, search_service
+from app.services.local_search import LocalSearchEngine
+
+NOW = datetime.datetime.utcnow()
+
+@pytest.fixture
+def dishes(app, db, monkeypatch):
+    monkeypatch.setattr(search_service, "_local_engine", LocalSearchEngine())
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    restaurant_id = ObjectId()
+    db.restaurants.insert_one({"_id": restaurant_id, "name": "Casa Pepe"})
+    ids = [ObjectId() for _ in range(6)]
+    db.dishes.insert_many([{"_id": dish_id, "name": f"Plato {i}", "restaurant_id": str(restaurant_id),
+                            "is_promoted": False, "promotion_level": 0} for i, dish_id in enumerate(ids)])
+    return [str(dish_id) for dish_id in ids]
+
+def _promotion(dish_id, level, start, end, **extra):
+    return db_service.create_promotion(dict({"dish_id": dish_id, "level": level, "is_active": True,
+                                             "start_date": start, "end_date": end}, **extra))
+
+def _dish(db, dish_id):
+    return db.dishes.find_one({"_id": ObjectId(dish_id)})
+
+def test_expired_promotions_are_deactivated_in_batches(dishes, db):
+    past = NOW - datetime.timedelta(days=10)
+    for dish_id in dishes[:5]:
+        _promotion(dish_id, 2, past, NOW - datetime.timedelta(days=1))
+    # Otra promoción del mismo plato sigue en curso: conserva su nivel
+    _promotion(dishes[0], 1, past, NOW + datetime.timedelta(days=1))
+    
+    count, dish_ids = db_service.deactivate_expired_promotions(batch_size=2, now=NOW)
+    
+    assert count == 5
+    assert dish_ids == set(dishes[:5])
+    assert db.promotions.count_documents({"is_active": True}) == 1
+    assert (_dish(db, dishes[0])["is_promoted"], _dish(db, dishes[0])["promotion_level"]) == (True, 1)
+    assert all(not _dish(db, dish_id)["is_promoted"] for dish_id in dishes[1:5])
+    assert db_service.deactivate_expired_promotions(batch_size=2, now=NOW) == (0, set())
+
+def test_scheduled_promotions_start_on_their_start_date(dishes, db):
+    start = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    _promotion(dishes[0], 3, start, start + datetime.timedelta(days=7))
+    assert not _dish(db, dishes[0])["is_promoted"]
+    
+    assert db_service.activate_started_promotions(now=start - datetime.timedelta(minutes=1)) == (0, set())
+    assert db_service.activate_started_promotions(now=start) == (1, {dishes[0]})
+    assert (_dish(db, dishes[0])["is_promoted"], _dish(db, dishes[0])["promotion_level"]) == (True, 3)
+
+def test_schedule_reindexes_changed_dishes_and_retries_undelivered_ones(dishes, db, monkeypatch):
+    now = datetime.datetime.utcnow()
+    for dish_id in dishes[:2]:
+        _promotion(dish_id, 2, now - datetime.timedelta(days=3), now - datetime.timedelta(days=1))
+    db.dishes.update_many({}, {"$set": {"is_promoted": True}})
+    undelivered = {f"dish_{dishes[1]}"}
+    monkeypatch.setattr(promotion_service, "get_queued_document_ids", lambda: undelivered)
+    
+    result = promotion_service.run_promotion_schedule()
+    
+    assert (result["deactivated"], result["reindexed"], result["reindex_pending"]) == (2, 1, 1)
+    assert search_service.get_local_engine().get_document(f"dish_{dishes[0]}")["is_promoted"] is False
+    assert db_service.get_pending_dish_reindex() == {dishes[1]}
+    
+    undelivered.clear()
+    result = promotion_service.run_promotion_schedule()
+    assert (result["deactivated"], result["reindexed"], result["reindex_pending"]) == (0, 1, 0)
+    assert db_service.get_pending_dish_reindex() == set()
+
+def test_lease_has_a_single_owner_until_it_expires(db):
+    assert db_service.acquire_lease("promotion-scheduler", "web-1", 60)
+    assert not db_service.acquire_lease("promotion-scheduler", "web-2", 60)
+    assert db_service.acquire_lease("promotion-scheduler", "web-1", 60)
+    
+    db.leases.update_one({"_id": "promotion-scheduler"},
+                         {"$set": {"expires_at": datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}})
+    assert db_service.acquire_lease("promotion-scheduler", "web-2", 60)
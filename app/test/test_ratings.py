@@ -0,0 +1,88 @@
+import datetime
+
+from bson import ObjectId
+
+from app.services import db_service
+
+def _restaurant(db):
+    return db_service.create_restaurant({"name": "Casa Pepe"})
+
+def _stored(db, restaurant_id):
+    return db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
+
+def _rate(restaurant_id, value):
+    return db_service.create_rating({"restaurant_id": restaurant_id, "dish_id": None, "rating_value": value})
+
+def test_ratings_update_aggregates(db):
+    restaurant_id = _restaurant(db)
+    _rate(restaurant_id, 4)
+    _rate(restaurant_id, 5)
+    _rate(restaurant_id, 2.4)
+    restaurant = _stored(db, restaurant_id)
+    assert restaurant["rating_count"] == 3
+    assert restaurant["rating_sum"] == 11.4
+    assert abs(restaurant["avg_rating"] - 3.8) < 1e-9
+    assert restaurant["rating_histogram"] == {"1": 0, "2": 1, "3": 0, "4": 1, "5": 1}
+    assert db.ratings.count_documents({"applied": True}) == 3
+
+def test_reconcile_fixes_drift(db):
+    restaurant_id = _restaurant(db)
+    _rate(restaurant_id, 4)
+    _rate(restaurant_id, 2)
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    db.restaurants.update_one({"_id": ObjectId(restaurant_id)},
+                              {"$set": {"rating_count": 7, "avg_rating": 1, "updated_at": long_ago}})
+    report = db_service.reconcile_rating_aggregates()
+    assert report["restaurants"]["corrected"] == 1
+    restaurant = _stored(db, restaurant_id)
+    assert restaurant["rating_count"] == 2
+    assert restaurant["avg_rating"] == 3
+
+def test_reconcile_during_rating_does_not_count_it_twice(db, monkeypatch):
+    restaurant_id = _restaurant(db)
+    _rate(restaurant_id, 4)
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    db.restaurants.update_one({"_id": ObjectId(restaurant_id)}, {"$set": {"updated_at": long_ago}})
+    
+    add_rating = db_service._add_rating
+    
+    def reconcile_then_add(*args):
+        # La valoración ya está insertada pero su $inc aún no se ha aplicado
+        db_service.reconcile_rating_aggregates()
+        add_rating(*args)
+    
+    monkeypatch.setattr(db_service, "_add_rating", reconcile_then_add)
+    _rate(restaurant_id, 2)
+    restaurant = _stored(db, restaurant_id)
+    assert restaurant["rating_count"] == 2
+    assert restaurant["rating_sum"] == 6
+
+def test_reconcile_counts_old_unapplied_ratings(db):
+    restaurant_id = _restaurant(db)
+    _rate(restaurant_id, 4)
+    # Proceso caído entre el insert y el $inc
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    db.ratings.insert_one({"restaurant_id": restaurant_id, "dish_id": None, "rating_value": 2,
+                           "active": True, "applied": False, "created_at": long_ago})
+    db.restaurants.update_one({"_id": ObjectId(restaurant_id)}, {"$set": {"updated_at": long_ago}})
+    db_service.reconcile_rating_aggregates()
+    assert _stored(db, restaurant_id)["rating_count"] == 2
+    assert db.ratings.count_documents({"applied": False}) == 0
+
+def test_reconcile_skips_recently_updated_documents(db):
+    restaurant_id = _restaurant(db)
+    _rate(restaurant_id, 4)
+    db.restaurants.update_one({"_id": ObjectId(restaurant_id)}, {"$set": {"rating_count": 7}})
+    report = db_service.reconcile_rating_aggregates()
+    assert report["restaurants"]["skipped"] == 1
+    assert _stored(db, restaurant_id)["rating_count"] == 7
+
+def test_first_rating_of_legacy_document_is_recomputed(db):
+    restaurant_id = _restaurant(db)
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    db.ratings.insert_one({"restaurant_id": restaurant_id, "dish_id": None, "rating_value": 5,
+                           "active": True, "created_at": long_ago})
+    _rate(restaurant_id, 3)
+    restaurant = _stored(db, restaurant_id)
+    assert restaurant["rating_count"] == 2
+    assert restaurant["avg_rating"] == 4
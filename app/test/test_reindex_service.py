@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+import pytest
+
+from app.services import reindex_service
+
+class FakeSearchClient:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.documents = {}
+        self.requests = 0
+    
+    def upload_documents(self, documents):
+        self.requests += 1
+        if self.fail_after is not None and self.requests > self.fail_after:
+            raise ConnectionError("search service unavailable")
+        for document in documents:
+            self.documents[document["id"]] = document
+        return [SimpleNamespace(key=document["id"], succeeded=True) for document in documents]
+
+class FakeAdminClient:
+    def get_index(self, name):
+        raise LookupError(name)
+
+@pytest.fixture
+def azure(app, db, tmp_path, monkeypatch):
+    """Reindex against fake Azure clients; returns the calls made to the service."""
+    app.config.update(REINDEX_CHECKPOINT_PATH=str(tmp_path / "checkpoint.json"), AZURE_SEARCH_INDEX_NAME="lacuchara")
+    service = SimpleNamespace(client=FakeSearchClient(), created=[], swaps=[])
+    monkeypatch.setattr(reindex_service, "_use_local_backend", lambda: False)
+    monkeypatch.setattr(reindex_service, "get_search_admin_client", FakeAdminClient)
+    monkeypatch.setattr(reindex_service, "create_search_index",
+                        lambda admin, name, version: service.created.append((name, version)))
+    monkeypatch.setattr(reindex_service, "get_search_client", lambda name: service.client)
+    monkeypatch.setattr(reindex_service, "swap_search_alias", lambda alias, name: service.swaps.append((alias, name)))
+    monkeypatch.setattr(reindex_service, "resolve_search_alias", lambda alias: "lacuchara-old")
+    monkeypatch.setattr(reindex_service, "get_index_statistics", lambda name=None: {"document_count": 0})
+    monkeypatch.setattr(reindex_service.time, "sleep", lambda seconds: None)
+    
+    restaurants = [{"_id": ObjectId(), "name": f"Restaurante {i}", "cuisine_type": ["española"]} for i in range(3)]
+    db.restaurants.insert_many(restaurants + [{"_id": ObjectId(), "name": "Cerrado", "active": False}])
+    dishes = [{"_id": ObjectId(), "name": f"Plato {i}", "restaurant_id": str(restaurants[i % 3]["_id"]), "price": 9.5}
+              for i in range(10)]
+    db.dishes.insert_many(dishes)
+    db.menus.insert_one({"_id": ObjectId(), "restaurant_id": str(restaurants[0]["_id"]), "menu_type": "daily",
+                         "dishes": [str(dish["_id"]) for dish in dishes[:2]]})
+    return service
+
+def test_reindex_uploads_enriched_documents_and_swaps_the_alias(azure):
+    result = reindex_service.reindex(alias="lacuchara-live", batch_size=3, workers=2, schema_version=2)
+    
+    documents = azure.client.documents
+    assert result["completed"] is True
+    assert result["counts"] == {"restaurants": 3, "dishes": 10, "menus": 1}
+    assert len(documents) == 14
+    assert not any(document.get("name") == "Cerrado" for document in documents.values())
+    dish = next(document for document in documents.values() if document["type"] == "dish")
+    assert dish["cuisine_type"] == ["española"]
+    menu = next(document for document in documents.values() if document["type"] == "menu")
+    assert menu["description"] == "Plato 0, Plato 1"
+    # Los restaurantes ya reindexados no se vuelven a consultar
+    assert result["restaurant_queries"] == 0
+    assert azure.created == [(result["index_name"], 2)]
+    assert azure.swaps == [("lacuchara-live", result["index_name"])]
+    assert result["previous_statistics"]["index_name"] == "lacuchara-old"
+
+def test_interrupted_reindex_resumes_after_the_last_uploaded_batch(azure):
+    # Restaurantes en 1 lote; falla el tercer lote de platos
+    azure.client.fail_after = 3
+    with pytest.raises(RuntimeError):
+        reindex_service.reindex(alias="lacuchara-live", batch_size=4, workers=1)
+    
+    checkpoint = reindex_service._load_checkpoint(reindex_service.current_app.config["REINDEX_CHECKPOINT_PATH"])
+    assert checkpoint["finished"] == ["restaurants"]
+    assert checkpoint["counts"] == {"restaurants": 3, "dishes": 8}
+    assert azure.swaps == []
+    
+    uploaded = set(azure.client.documents)
+    azure.client = FakeSearchClient()
+    result = reindex_service.reindex(resume=True, batch_size=4, workers=1)
+    
+    assert result["index_name"] == checkpoint["index_name"]
+    assert result["counts"] == {"restaurants": 3, "dishes": 10, "menus": 1}
+    # Solo se sube lo que faltaba, y con el alias del primer intento
+    assert len(azure.client.documents) == 3
+    assert uploaded.isdisjoint(azure.client.documents)
+    assert azure.swaps == [("lacuchara-live", result["index_name"])]
+    
+    assert reindex_service.reindex(resume=True)["completed"] is True
+    assert len(azure.swaps) == 1
+
+def test_local_reindex_rebuilds_the_index_file(app, azure, monkeypatch):
+    monkeypatch.setattr(reindex_service, "_use_local_backend", lambda: True)
+    
+    result = reindex_service.reindex(batch_size=4)
+    
+    assert result["statistics"]["documents"] == 14
+    assert azure.client.documents == {}
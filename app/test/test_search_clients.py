@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from app.services import search_service
+
+@pytest.fixture
+def azure(app, monkeypatch):
+    app.config.update(
+        SEARCH_BACKEND='azure',
+        AZURE_SEARCH_SERVICE_NAME='lacuchara-test',
+        AZURE_SEARCH_ADMIN_KEY='not-a-real-key',
+        AZURE_SEARCH_INDEX_NAME='restaurants',
+        SEARCH_HTTP_POOL_SIZE=8
+    )
+    monkeypatch.setattr(search_service, "_clients", {})
+    monkeypatch.setattr(search_service, "_clients_pid", None)
+    monkeypatch.setattr(search_service, "_transport", None)
+    return app
+
+def test_clients_are_reused_per_index(azure):
+    client = search_service.get_search_client()
+    
+    assert search_service.get_search_client() is client
+    assert search_service.get_search_client('restaurants') is client
+    assert client._index_name == 'restaurants'
+    
+    other = search_service.get_search_client('restaurants-v2')
+    assert other is not client
+    assert other._index_name == 'restaurants-v2'
+
+def test_clients_share_one_pooled_transport(azure):
+    search_service.get_search_client()
+    search_service.get_search_client('restaurants-v2')
+    search_service.get_search_admin_client()
+    
+    transport = search_service._transport
+    adapter = transport.session.get_adapter('https://lacuchara-test.search.windows.net')
+    assert adapter._pool_maxsize == 8
+    assert len(search_service._clients) == 3
+    # Ningún cliente cierra la sesión compartida al terminar
+    assert transport._session_owner is False
+
+def test_forked_process_builds_its_own_clients(azure, monkeypatch):
+    parent = search_service.get_search_client()
+    parent_transport = search_service._transport
+    
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    child = search_service.get_search_client()
+    
+    assert child is not parent
+    assert search_service._transport is not parent_transport
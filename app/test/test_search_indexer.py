@@ -0,0 +1,117 @@
+import threading
+
+from app.services.search_indexer import BufferedIndexer
+
+class FakeResult:
+    def __init__(self, key, succeeded):
+        self.key = key
+        self.succeeded = succeeded
+
+class FakeSearchClient:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.batches = []
+    
+    def index_documents(self, batch):
+        actions = [(action.action_type, action.additional_properties) for action in batch.actions]
+        self.batches.append(actions)
+        return [FakeResult(document["id"], document["id"] not in self.failing) for _, document in actions]
+
+def _indexer(client, **kwargs):
+    kwargs.setdefault("flush_interval", 3600)
+    return BufferedIndexer(lambda: client, **kwargs)
+
+def test_dropped_documents_are_reported_until_queued_again():
+    client = FakeSearchClient(failing={"dish_1"})
+    indexer = _indexer(client, max_retries=1)
+    indexer.merge_or_upload([{"id": "dish_1", "name": "Gazpacho"}, {"id": "dish_2", "name": "Tortilla"}])
+    indexer.flush()
+    assert indexer.pending_ids() == set()
+    assert indexer.dropped_ids() == {"dish_1"}
+    
+    indexer.merge_or_upload([{"id": "dish_1", "name": "Gazpacho"}])
+    assert indexer.dropped_ids() == set()
+    assert indexer.pending_ids() == {"dish_1"}
+    indexer.close()
+
+def test_failed_documents_stay_queued_until_retries_run_out():
+    client = FakeSearchClient(failing={"dish_1"})
+    indexer = _indexer(client, max_retries=2)
+    indexer.merge_or_upload([{"id": "dish_1", "name": "Gazpacho"}])
+    indexer.flush()
+    assert indexer.pending_ids() == {"dish_1"}
+    indexer.flush()
+    assert indexer.pending_ids() == set()
+    assert indexer.dropped_ids() == {"dish_1"}
+    assert indexer.stats()["dropped_documents"] == 1
+    indexer.close()
+
+def test_updates_of_a_document_are_coalesced():
+    client = FakeSearchClient()
+    indexer = _indexer(client)
+    indexer.merge_or_upload([{"id": "dish_1", "name": "Gazpacho", "price": 6.0}])
+    indexer.merge_or_upload([{"id": "dish_1", "price": 6.5}])
+    indexer.merge_or_upload([{"id": "dish_2", "name": "Tortilla"}])
+    indexer.delete(["dish_2"])
+    assert indexer.flush() == 2
+    assert sorted(client.batches[0], key=lambda action: action[1]["id"]) == [
+        ("mergeOrUpload", {"id": "dish_1", "name": "Gazpacho", "price": 6.5}),
+        ("delete", {"id": "dish_2"}),
+    ]
+    stats = indexer.stats()
+    assert stats["enqueued"] == 4
+    assert stats["coalesced"] == 2
+    assert stats["flushed_documents"] == 2
+    indexer.close()
+
+def test_flush_sends_batches_of_batch_size():
+    client = FakeSearchClient()
+    indexer = _indexer(client, batch_size=2)
+    # Sin el hilo de fondo, que se adelantaría al llenarse la cola
+    indexer.close()
+    indexer.merge_or_upload([{"id": f"dish_{i}"} for i in range(5)])
+    assert indexer.flush() == 5
+    assert [len(batch) for batch in client.batches] == [2, 2, 1]
+
+def test_full_queue_is_flushed_by_the_background_thread():
+    client = FakeSearchClient()
+    flushed = threading.Event()
+    indexer = _indexer(client, batch_size=2, on_flush=flushed.set)
+    indexer.merge_or_upload([{"id": "dish_1"}, {"id": "dish_2"}])
+    assert flushed.wait(5)
+    assert indexer.pending_ids() == set()
+    indexer.close()
+
+def test_failed_update_is_merged_under_a_newer_queued_version():
+    client = FakeSearchClient(failing={"dish_1"})
+    indexer = _indexer(client, max_retries=1)
+    indexer.merge_or_upload([{"id": "dish_1", "name": "Gazpacho", "price": 6.0}])
+    send = indexer._send
+    
+    def send_and_update(batch):
+        # Mientras el lote viaja llega una actualización más nueva del precio
+        indexer.merge_or_upload([{"id": "dish_1", "price": 7.0}])
+        send(batch)
+    
+    indexer._send = send_and_update
+    indexer.flush()
+    indexer._send = send
+    assert indexer.dropped_ids() == set()
+    
+    client.failing = set()
+    indexer.flush()
+    assert client.batches[-1] == [("mergeOrUpload", {"id": "dish_1", "name": "Gazpacho", "price": 7.0})]
+    indexer.close()
+
+def test_request_error_requeues_the_whole_batch():
+    class BrokenClient:
+        def index_documents(self, batch):
+            raise ConnectionError("search service unavailable")
+    
+    indexer = BufferedIndexer(BrokenClient, flush_interval=3600, max_retries=2)
+    indexer.merge_or_upload([{"id": "dish_1"}, {"id": "dish_2"}])
+    indexer.flush()
+    assert indexer.pending_ids() == {"dish_1", "dish_2"}
+    assert indexer.stats()["failed_documents"] == 2
+    indexer.close()
+    assert indexer.dropped_ids() == {"dish_1", "dish_2"}
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from app.services import search_service
+from app.services.local_search import LocalSearchEngine
+
+@pytest.fixture
+def engine(app, monkeypatch):
+    """Local backend with the v2 schema (sortable id) and 40 dishes with repeated and missing values."""
+    app.config["SEARCH_SCHEMA_VERSION"] = 2
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    engine = LocalSearchEngine()
+    monkeypatch.setattr(search_service, "_local_engine", engine)
+    rng = random.Random(7)
+    engine.merge_or_upload([
+        {"id": f"dish_{i:02d}", "type": "dish", "name": f"Plato {i}", "restaurant_id": "r1",
+         "price": rng.choice([None, 5.0, 7.5, 7.5, 12.0]), "avg_rating": rng.choice([None, 3.5, 4.0, 4.0, 4.5])}
+        for i in range(40)
+    ])
+    engine.merge_or_upload([{"id": "restaurant_r1", "type": "restaurant", "name": "Casa Pepe", "price": 20.0}])
+    return engine
+
+def _expected(engine, field, descending):
+    dishes = [engine.get_document(f"dish_{i:02d}") for i in range(40)]
+    # Como el servicio: nulos al principio en ascendente y al final en descendente; el id desempata
+    present = sorted((d for d in dishes if d[field] is not None), key=lambda d: (d[field], d["id"]))
+    if descending:
+        present = sorted(present, key=lambda d: d[field], reverse=True)
+    missing = [d for d in dishes if d[field] is None]
+    ordered = present + missing if descending else missing + present
+    return [d["id"] for d in ordered]
+
+@pytest.mark.parametrize("sort", ["price asc", "price desc", "avg_rating asc", "avg_rating desc"])
+def test_keyset_pages_visit_every_document_once_in_order(engine, sort):
+    field, direction = sort.split()
+    iterator = search_service.iter_search(doc_type="dish", sort=[sort], page_size=7)
+    assert iterator._keyset
+    
+    pages = list(iterator.by_page())
+    
+    assert [len(page) for page in pages] == [7, 7, 7, 7, 7, 5]
+    assert [d["id"] for page in pages for d in page] == _expected(engine, field, direction == "desc")
+
+def test_continuation_token_resumes_in_a_new_iterator(engine):
+    first = search_service.iter_search(doc_type="dish", sort=["price desc"], page_size=10)
+    page = next(first.by_page())
+    token = first.continuation_token
+    
+    rest = search_service.iter_search(doc_type="dish", sort=["price desc"], page_size=10, continuation_token=token)
+    
+    assert [d["id"] for d in page + list(rest)] == _expected(engine, "price", True)
+    assert rest.continuation_token is None
+
+def test_continuation_token_of_another_query_is_rejected(engine):
+    first = search_service.iter_search(doc_type="dish", sort=["price desc"], page_size=10)
+    next(first.by_page())
+    
+    with pytest.raises(ValueError):
+        search_service.iter_search(doc_type="dish", sort=["price asc"], continuation_token=first.continuation_token)
+    with pytest.raises(ValueError):
+        search_service.iter_search(doc_type="dish", continuation_token="not-a-token")
+
+def test_projection_drops_the_sort_fields_it_did_not_ask_for(engine):
+    results = list(search_service.iter_search(doc_type="dish", sort=["price asc"], select=["id", "name"],
+                                              page_size=15, limit=20))
+    
+    assert len(results) == 20
+    assert all(set(result) == {"id", "name", "@search.score"} for result in results)
+
+def test_relevance_order_pages_with_skip(engine):
+    iterator = search_service.iter_search("plato", doc_type="dish", page_size=15)
+    
+    results = list(iterator)
+    
+    assert not iterator._keyset
+    assert len({d["id"] for d in results}) == 40
+
+def test_invalid_fields_are_rejected(engine):
+    with pytest.raises(ValueError):
+        search_service.iter_search(doc_type="dish", select=["id", "secret"])
+    with pytest.raises(ValueError):
+        search_service.iter_search(doc_type="dish", sort=["description asc"])
@@ -0,0 +1,179 @@
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents.indexes.models import SearchIndex
+import pytest
+
+from app.services import search_service
+
+def _live_index(monkeypatch, version):
+    monkeypatch.setattr(search_service, "_live_index", None)
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    monkeypatch.setattr(search_service, "_missing_fields", frozenset())
+    search_service._set_live_index(SearchIndex(name="lacuchara-index", fields=search_service._index_fields(version)))
+
+@pytest.fixture
+def azure_backend(app, monkeypatch):
+    """Pretend the Azure backend is in use; queries go to a fake _execute_search."""
+    monkeypatch.setattr(search_service, "_use_local_backend", lambda: False)
+    monkeypatch.setattr(search_service, "_query_cache", None)
+    calls = []
+    
+    def execute_search(search_text, filter=None, order_by=None, top=50, skip=0,
+                       include_total_count=False, select=None, facets=None):
+        calls.append({"facets": facets, "order_by": order_by, "filter": filter, "skip": skip})
+        results = [{"id": "dish_1", "type": "dish"}, {"id": "dish_2", "type": "dish"},
+                   {"id": "restaurant_1", "type": "restaurant"}]
+        facet_results = {name.split(",")[0]: [] for name in facets} if facets else None
+        if facets and "type" in facets:
+            facet_results["type"] = [{"value": "dish", "count": 40}, {"value": "restaurant", "count": 7}]
+        return results, 47, facet_results
+    
+    monkeypatch.setattr(search_service, "_execute_search", execute_search)
+    return calls
+
+def test_schema_v1_matches_original_index():
+    schema = search_service.get_index_schema(1)
+    assert not schema["id"].sortable
+    assert not schema["id"].filterable
+    assert "content_digest" not in schema
+    assert not any(field.facetable for field in schema.values())
+
+def test_schema_v2_has_facets_and_sortable_id():
+    schema = search_service.get_index_schema(2)
+    assert schema["id"].sortable and schema["id"].filterable
+    assert "content_digest" in schema
+    assert schema["type"].facetable
+
+def test_adapt_document_to_v1_drops_unknown_fields():
+    document = {
+        "id": "restaurant_1",
+        "type": "restaurant",
+        "name": "Casa Pepe",
+        "content_digest": "abc",
+        "location": {"type": "Point", "coordinates": [-3.7, 40.4]}
+    }
+    adapted = search_service.adapt_document(document, 1)
+    assert "content_digest" not in adapted
+    assert adapted["location"] == {"latitude": 40.4, "longitude": -3.7}
+    assert document["content_digest"] == "abc"
+    assert search_service.adapt_document(document, 2) is document
+
+def test_search_all_on_v1_index_sends_no_facets(app, azure_backend, monkeypatch):
+    _live_index(monkeypatch, 1)
+    search = search_service.search_all("paella")
+    assert azure_backend[0]["facets"] is None
+    assert search["facets"] == {}
+    # Sin faceta de tipo los contadores salen de los resultados devueltos
+    assert search["counts"] == {"restaurant": 1, "dish": 2, "menu": 0}
+    assert search["total"] == 47
+
+def test_search_all_on_v2_index_sends_default_facets(app, azure_backend, monkeypatch):
+    _live_index(monkeypatch, 2)
+    search = search_service.search_all("paella")
+    assert azure_backend[0]["facets"] == search_service.DEFAULT_FACETS
+    assert search["counts"] == {"restaurant": 7, "dish": 40, "menu": 0}
+    assert "type" not in search["facets"]
+    assert "cuisine_type" in search["facets"]
+
+def test_search_all_keeps_only_facetable_fields(app, azure_backend, monkeypatch):
+    _live_index(monkeypatch, 2)
+    search_service.search_all("paella", facets=["cuisine_type", "ingredients", "name"])
+    assert azure_backend[0]["facets"] == ["cuisine_type", "type"]
+
+def test_search_all_without_checked_index_uses_configured_schema(app, azure_backend, monkeypatch):
+    monkeypatch.setattr(search_service, "_live_index", None)
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    app.config["SEARCH_SCHEMA_VERSION"] = 1
+    search_service.search_all("paella")
+    assert azure_backend[0]["facets"] is None
+
+def test_iter_search_on_v1_index_pages_with_skip(app, azure_backend, monkeypatch):
+    _live_index(monkeypatch, 1)
+    app.config["SEARCH_SCHEMA_VERSION"] = 1
+    results = search_service.iter_search("*", sort=["name asc"], page_size=3, limit=6)
+    assert len(list(results)) == 6
+    assert azure_backend[0]["order_by"] == ["name asc"]
+    assert [call["skip"] for call in azure_backend] == [0, 3]
+    assert all(call["filter"] is None for call in azure_backend)
+
+def test_iter_search_on_v2_index_pages_by_key(app, azure_backend, monkeypatch):
+    _live_index(monkeypatch, 2)
+    app.config["SEARCH_SCHEMA_VERSION"] = 2
+    results = search_service.iter_search("*", sort=["name asc"], page_size=3, limit=6)
+    assert len(list(results)) == 6
+    assert azure_backend[0]["order_by"] == ["name asc", "id asc"]
+    assert [call["skip"] for call in azure_backend] == [0, 0]
+    assert azure_backend[1]["filter"] is not None
+
+class FakeAdminClient:
+    def __init__(self, index=None):
+        self.index = index
+        self.created = []
+        self.updated = []
+    
+    def get_index(self, name):
+        if self.index is None:
+            raise ResourceNotFoundError("index not found")
+        return self.index
+    
+    def create_index(self, index):
+        self.created.append(index)
+        return index
+    
+    def create_or_update_index(self, index):
+        self.updated.append(index)
+        return index
+
+@pytest.fixture
+def startup(app, monkeypatch):
+    """Run init_search_service against a fake Azure admin client."""
+    app.config["SEARCH_BACKEND"] = "azure"
+    monkeypatch.setattr(search_service, "_live_index", None)
+    monkeypatch.setattr(search_service, "_live_schema_version", None)
+    monkeypatch.setattr(search_service, "_missing_fields", frozenset())
+    monkeypatch.setattr(search_service, "resolve_search_alias", lambda name: None)
+    
+    def run(index, configured_version):
+        client = FakeAdminClient(index)
+        monkeypatch.setattr(search_service, "get_search_admin_client", lambda: client)
+        app.config["SEARCH_SCHEMA_VERSION"] = configured_version
+        search_service.init_search_service(app)
+        return client
+    return run
+
+def _restaurant_document():
+    return search_service._restaurant_document({
+        "_id": "r1",
+        "name": "Casa Pepe",
+        "location": {"type": "Point", "coordinates": [-3.7, 40.4]}
+    })
+
+def test_startup_on_newer_index_writes_its_version(startup, caplog):
+    index = SearchIndex(name="lacuchara-v2", fields=search_service._index_fields(2))
+    with caplog.at_level("WARNING"):
+        startup(index, configured_version=1)
+    assert "schema version 2" in caplog.text
+    assert search_service.get_schema_version() == 2
+    document = _restaurant_document()
+    assert search_service._adapt_documents([document]) == [document]
+
+def test_startup_on_older_index_adapts_documents(startup):
+    index = SearchIndex(name="lacuchara-v1", fields=search_service._index_fields(1))
+    client = startup(index, configured_version=2)
+    assert search_service.get_schema_version() == 1
+    # No se le añaden campos de la versión configurada
+    assert client.updated == []
+    adapted = search_service._adapt_documents([_restaurant_document()])[0]
+    assert adapted["location"] == {"latitude": 40.4, "longitude": -3.7}
+    assert "content_digest" not in adapted
+
+def test_startup_creates_missing_index_with_configured_version(startup):
+    client = startup(None, configured_version=2)
+    assert len(client.created) == 1
+    assert search_service.index_schema_version(client.created[0]) == 2
+    assert search_service.get_schema_version() == 2
+
+def test_startup_adds_missing_fields_of_live_version(startup):
+    fields = [field for field in search_service._index_fields(2) if field.name != "content_digest"]
+    client = startup(SearchIndex(name="lacuchara-v2", fields=fields), configured_version=1)
+    assert [field.name for field in client.updated[0].fields][-1] == "content_digest"
+    assert search_service._missing_fields == frozenset()
@@ -0,0 +1,54 @@
+import random
+
+from app.services.suggest_service import SuggestionTrie, normalize_phrase
+
+WORDS = ["paella", "pasta", "pan", "pato", "valenciana", "pollo", "pimiento", "queso"]
+KINDS = ["restaurant", "dish", "cuisine", "ingredient"]
+
+def brute_force(trie, prefix, limit):
+    """Best phrase scores for a prefix computed from every suggestion of the trie."""
+    phrase = normalize_phrase(prefix)
+    best = {}
+    for (kind, text), term in trie._terms.items():
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == " "]
+        if any(text[start:].startswith(phrase) for start in starts):
+            best[text] = max(best.get(text, float("-inf")), term["score"])
+    return [round(score, 3) for score in sorted(best.values(), reverse=True)[:limit]]
+
+def test_a_phrase_with_several_kinds_takes_one_slot():
+    trie = SuggestionTrie(top_k=2)
+    trie.load([
+        ("dish_1", [("dish", "Paella", 9.0), ("ingredient", "Paella", 8.0)]),
+        ("restaurant_1", [("restaurant", "Paella", 7.0), ("cuisine", "Paella", 6.0)]),
+        ("dish_2", [("dish", "Pasta", 2.0)]),
+        ("dish_3", [("dish", "Pan", 1.0)]),
+    ])
+    
+    assert [s["text"] for s in trie.suggest("pa", limit=4)] == ["Paella", "Pasta", "Pan"]
+    assert [s["type"] for s in trie.suggest("pa", kinds=["cuisine"])] == ["cuisine"]
+    
+    # Otra fuente sube 'Pan' por encima de 'Pasta' sin desplazar los tipos de 'Paella'
+    trie.set_source("dish_4", [("ingredient", "Pan", 3.0)])
+    assert [s["text"] for s in trie.suggest("pa", limit=4)] == ["Paella", "Pan", "Pasta"]
+
+def test_updates_match_a_brute_force_ranking():
+    for seed in range(40):
+        rng = random.Random(seed)
+        trie = SuggestionTrie(top_k=rng.choice([1, 2, 3]))
+        
+        def contributions():
+            return [
+                (rng.choice(KINDS), " ".join(rng.sample(WORDS, rng.randint(1, 2))), rng.choice([0.5, 1, 2, 3, 5]))
+                for _ in range(rng.randint(0, 4))
+            ]
+        
+        trie.load([(f"source_{i}", contributions()) for i in range(15)])
+        for _ in range(60):
+            source_id = f"source_{rng.randrange(25)}"
+            if rng.random() < 0.2:
+                trie.remove_source(source_id)
+            else:
+                trie.set_source(source_id, contributions())
+            for prefix in ["p", "pa", "pas", "po", "v", "q"]:
+                scores = [s["score"] for s in trie.suggest(prefix, limit=trie.top_k)]
+                assert scores == brute_force(trie, prefix, trie.top_k), (seed, prefix)